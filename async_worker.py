@@ -1,5 +1,161 @@
-from PyQt6.QtCore import QThread, pyqtSignal
+import os
+import time
+import queue
+import itertools
+import threading
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
 import audio_processor
+import catalog
+import profiler
+from transcribe_client import TranscriptionClient, ServerError
+
+
+class TaskError(Exception):
+    """タスクが失敗したときに、そのままGUIに表示するメッセージを持つ例外"""
+
+
+class TaskCancelled(Exception):
+    """キャンセルされたタスクが、段階の区切りで止まったときの例外"""
+
+
+def _check_cancelled(is_cancelled):
+    if is_cancelled():
+        raise TaskCancelled()
+
+
+def run_task(task_type, kwargs, progress=None, is_cancelled=None):
+    """
+    録音・文字起こしなどのタスクを1件実行する（呼び出したスレッドで実行される）
+    :param task_type: "record", "transcribe", "record_and_transcribe", "stream", "preload" または "peaks"
+    :param kwargs: 必要な引数 (filename, duration, model, 録音する audio_device など)
+                   server_url を指定すると、文字起こしとモデルの読み込みは文字起こしサーバーで行う
+    :param progress: 途中経過を受け取る関数 (省略可)
+    :param is_cancelled: キャンセルされたら True を返す関数 (省略可)
+    :return: タスクの結果 (メッセージの文字列、文字起こし結果の辞書、または波形の PeakPyramid)
+    :raises TaskError: タスクが失敗したとき
+    :raises TaskCancelled: キャンセルされて途中で止まったとき (段階の途中では止まらず、次の段階の前で止まる)
+    """
+    if progress is None:
+        progress = lambda value: None
+    if is_cancelled is None:
+        is_cancelled = lambda: False
+
+    if task_type == "record":
+        # 録音処理を実行
+        filename = kwargs.get('filename')
+        duration = kwargs.get('duration', 10)
+
+        if not audio_processor.record_audio(filename, duration=duration,
+                                            audio_device=kwargs.get('audio_device', ':0')):
+            raise TaskError("録音に失敗しました（FFmpegエラーなど）")
+        return f"録音が完了しました: {filename}"
+
+    elif task_type == "transcribe":
+        # 文字起こし処理を実行
+        filename = kwargs.get('filename')
+        model = kwargs.get('model')
+
+        if not os.path.exists(filename):
+            raise TaskError("エラー: ファイルが見つかりません")
+
+        # 結果は辞書 (text, cache など) で返す
+        if kwargs.get('server_url'):
+            try:
+                result = TranscriptionClient(kwargs['server_url']).transcribe_file(filename, model)
+            except ServerError as e:
+                raise TaskError(f"サーバーエラー: {e}")
+        else:
+            result = audio_processor.transcribe_file(filename, model)
+        result['filename'] = filename
+        catalog.record_result(filename, result, model)
+        return result
+
+    elif task_type == "record_and_transcribe":
+        # 録音した音声をファイルを経由せずに文字起こしする (filename を指定するとWAVも保存する)
+        filename = kwargs.get('filename')
+        duration = kwargs.get('duration', 10)
+        model = kwargs.get('model')
+
+        # 録音はこのプロセスで行う。文字起こしはサーバーを使う設定なら音声データをサーバーに送る
+        audio, writer = audio_processor.record_to_array(duration, audio_device=kwargs.get('audio_device', ':0'),
+                                                        output_file=filename)
+        if audio is None:
+            raise TaskError("録音に失敗しました（FFmpegエラーなど）")
+        try:
+            # 録音中にキャンセルされたら文字起こしはしない (保存した録音は残す)
+            _check_cancelled(is_cancelled)
+            if kwargs.get('server_url'):
+                try:
+                    result = TranscriptionClient(kwargs['server_url']).transcribe_pcm(audio, model)
+                except ServerError as e:
+                    raise TaskError(f"サーバーエラー: {e}")
+            else:
+                result = audio_processor.transcribe_array(audio, model)
+                result['text'] = result.get('text', '').strip()
+                result['cache'] = 'off'
+        finally:
+            if writer is not None:
+                writer.join()
+        result['filename'] = filename
+        catalog.record_result(filename, result, model)
+        return result
+
+    elif task_type == "stream":
+        # 録音しながら窓ごとに文字起こしし、途中経過を通知する
+        filename = kwargs.get('filename')
+        duration = kwargs.get('duration', 10)
+        model = kwargs.get('model')
+
+        full_text = ""
+        segments = []
+        for partial in audio_processor.stream_transcribe(
+            kwargs.get('audio_device', ':0'), model, duration=duration, output_file=filename
+        ):
+            full_text = partial['full_text']
+            # 窓は前の窓と重なっているので、カタログには新しく加わった部分だけを登録する
+            if partial['new_text']:
+                segments.append({'start': partial['new_start'], 'end': partial['end'], 'text': partial['new_text']})
+            progress(full_text)
+            if is_cancelled():
+                break
+        result = {'text': full_text, 'segments': segments, 'cache': 'off', 'filename': filename}
+        catalog.record_result(filename, result, model)
+        # キャンセルで止めた場合も、そこまでの結果は途中経過として通知済み
+        _check_cancelled(is_cancelled)
+        return result
+
+    elif task_type == "preload":
+        # 録音・文字起こしで使うライブラリとモデルを事前に読み込んで常駐させる
+        model = kwargs.get('model')
+
+        if kwargs.get('server_url'):
+            # モデルはサーバーに常駐させる (このプロセスでは読み込まない)
+            try:
+                TranscriptionClient(kwargs['server_url']).preload(model)
+            except ServerError as e:
+                raise TaskError(f"サーバーでのモデルの読み込みに失敗しました: {e}")
+            return f"モデル準備完了 (サーバー): {model}"
+
+        audio_processor.warm_up()
+        _check_cancelled(is_cancelled)
+        if not audio_processor.get_engine().preload(model):
+            raise TaskError(f"モデルの読み込みに失敗しました: {model}")
+        return f"モデル準備完了: {model}"
+
+    elif task_type == "peaks":
+        # 波形表示用のピラミッドを読み込む (なければ作ってサイドカーに保存する)
+        import waveform
+
+        filename = kwargs.get('filename')
+        if not os.path.exists(filename):
+            raise TaskError("エラー: ファイルが見つかりません")
+        pyramid = waveform.load_peaks(filename)
+        if pyramid is None:
+            raise TaskError(f"波形を読み込めません: {filename}")
+        return pyramid
+
+    raise TaskError(f"不明なタスクです: {task_type}")
+
 
 class AudioWorker(QThread):
     """
@@ -9,44 +165,271 @@ class AudioWorker(QThread):
     finished_signal = pyqtSignal(object)
     # エラーが起きたときに通知するシグナル
     error_signal = pyqtSignal(str)
+    # ライブ文字起こしの途中経過を通知するシグナル (それまでの全文)
+    partial_signal = pyqtSignal(str)
 
     def __init__(self, task_type, **kwargs):
         """
-        :param task_type: "record" または "transcribe"
+        :param task_type: "record", "transcribe", "record_and_transcribe", "stream", "preload" または "peaks"
         :param kwargs: 必要な引数 (filename, duration, model など)
         """
         super().__init__()
         self.task_type = task_type
         self.kwargs = kwargs
+        # 完了後に、各処理段階の計測結果 (profiler の記録のリスト) が入る
+        self.profile = []
 
     def run(self):
         """
         start() が呼ばれると、この run() の中身が別スレッドで実行されます
         """
         try:
-            if self.task_type == "record":
-                # 録音処理を実行
-                filename = self.kwargs.get('filename')
-                duration = self.kwargs.get('duration', 10)
-                
-                success = audio_processor.record_audio(filename, duration=duration)
-                
-                if success:
-                    self.finished_signal.emit(f"録音が完了しました: {filename}")
-                else:
-                    self.error_signal.emit("録音に失敗しました（FFmpegエラーなど）")
-
-            elif self.task_type == "transcribe":
-                # 文字起こし処理を実行
-                filename = self.kwargs.get('filename')
-                model = self.kwargs.get('model')
-                
-                text = audio_processor.transcribe_audio(filename, model)
-                
-                if "エラー" in text:
-                    self.error_signal.emit(text)
+            with profiler.collect(task=self.task_type) as self.profile:
+                result = run_task(self.task_type, self.kwargs, progress=self.partial_signal.emit)
+            self.finished_signal.emit(result)
+        except TaskError as e:
+            self.error_signal.emit(str(e))
+        except Exception as e:
+            self.error_signal.emit(f"予期せぬエラー: {e}")
+
+
+class ProcessEngineSignals(QObject):
+    """
+    ProcessEngine (別プロセスでの推論) の出来事を Qt のシグナルでGUIに伝える
+    ProcessEngine(on_event=signals.event_signal.emit) のように渡す
+    """
+    # (種類, 内容)。種類は 'started', 'progress', 'crashed', 'restarted', 'gave_up'
+    event_signal = pyqtSignal(str, str)
+
+
+class IngestSignals(QObject):
+    """
+    FolderIngest (フォルダ監視) の結果を Qt のシグナルでGUIに伝える
+    FolderIngest(on_result=signals.result_signal.emit) のように渡す
+    """
+    # (ファイルパス, 結果の辞書 または エラーメッセージ)
+    result_signal = pyqtSignal(str, object)
+
+
+class Job:
+    """スケジューラに投入された1件の仕事"""
+
+    def __init__(self, job_id, task_type, priority, kwargs):
+        self.job_id = job_id
+        self.task_type = task_type
+        self.priority = priority
+        self.kwargs = kwargs
+        self.status = "queued"   # queued / running / finished / error / cancelled
+        self.cancel_event = threading.Event()
+        self.profile = []        # 各処理段階の計測結果 (profiler の記録のリスト)
+
+
+class _JobThread(QThread):
+    """スケジューラのキューから仕事を取り出して実行し続けるスレッド"""
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    def run(self):
+        while True:
+            _, _, job = self.scheduler._queue.get()
+            if job is None:
+                break
+            with self.scheduler._lock:
+                self.scheduler._busy += 1
+            try:
+                self.scheduler._run_job(job)
+            finally:
+                with self.scheduler._lock:
+                    self.scheduler._busy -= 1
+
+
+class JobScheduler(QObject):
+    """
+    録音・文字起こしの仕事を優先度付きキューに入れ、決まった数のスレッドで順に実行するクラス
+    優先度が urgent_priority 以下の仕事 (録音など) は、すべてのスレッドが使用中なら待たせずに追加のスレッドで実行する。
+    シグナルはすべてジョブIDつきで通知される
+    """
+    # 実行を始めたとき (ジョブID)
+    job_started = pyqtSignal(int)
+    # 途中経過 (ジョブID, 途中経過)
+    job_progress = pyqtSignal(int, object)
+    # 完了したとき (ジョブID, 結果)
+    job_finished = pyqtSignal(int, object)
+    # 失敗したとき (ジョブID, エラーメッセージ)
+    job_error = pyqtSignal(int, str)
+    # キャンセルされたとき (ジョブID)
+    job_cancelled = pyqtSignal(int)
+    # 実行が終わったとき、完了・失敗の通知より先に (ジョブID, 計測結果のリスト)
+    job_timings = pyqtSignal(int, object)
+
+    def __init__(self, max_workers=2, max_queue=32, urgent_priority=0):
+        """
+        :param max_workers: 同時に実行する仕事の数 (急ぎの仕事の追加のスレッドは数えない)
+        :param max_queue: 待機できる仕事の数の上限
+        :param urgent_priority: この値以下の優先度の仕事は、スレッドが空くのを待たずに実行する
+        """
+        super().__init__()
+        self._queue = queue.PriorityQueue(maxsize=max_queue)
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.urgent_priority = urgent_priority
+        self._busy = 0          # 仕事を実行中の常駐スレッドの数
+        self._extra = set()     # 急ぎの仕事のために追加したスレッド
+        self._stopping = False  # shutdown() の後は新しい仕事を受け付けない
+        self._threads = [_JobThread(self) for _ in range(max(1, int(max_workers)))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, task_type, priority=10, **kwargs):
+        """
+        仕事をキューに入れる
+        :param task_type: "record", "transcribe", "record_and_transcribe", "stream", "preload" または "peaks"
+        :param priority: 小さいほど先に実行される
+        :param kwargs: タスクに渡す引数
+        :return: ジョブID。キューが満杯か、shutdown() した後なら None
+        """
+        job = Job(next(self._ids), task_type, priority, kwargs)
+        with self._lock:
+            if self._stopping:
+                return None
+            self._jobs[job.job_id] = job
+            urgent = priority <= self.urgent_priority and self._busy >= len(self._threads)
+        if urgent:
+            # 長い文字起こしでスレッドが埋まっていても、録音などはすぐに始める
+            thread = threading.Thread(target=self._run_extra, args=(job,), name=f"job-{job.job_id}", daemon=True)
+            with self._lock:
+                self._extra.add(thread)
+            thread.start()
+            return job.job_id
+        try:
+            self._queue.put_nowait((priority, job.job_id, job))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.job_id]
+            return None
+        return job.job_id
+
+    def cancel(self, job_id):
+        """
+        仕事をキャンセルする。待機中ならそのまま捨て、実行中なら次の段階に進む前に止める
+        (最後の段階まで進んでいた仕事は止めずに完了させ、job_finished で通知する)
+        :return: キャンセルを受け付けたらTrue
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def cancel_all(self):
+        with self._lock:
+            job_ids = list(self._jobs)
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def status(self, job_id):
+        """ジョブの状態を返す。もう管理していないジョブなら None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.status if job is not None else None
+
+    def pending_count(self):
+        """待機中と実行中の仕事の数"""
+        with self._lock:
+            return len(self._jobs)
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        待機中の仕事をキャンセルし、実行中の仕事には次の段階の前で止まるよう合図してから、スレッドを止める
+        何度呼んでもよい (GUI を止めないよう wait=False で合図だけして、is_stopped() で終わりを確かめられる)
+        :param wait: True ならスレッドが止まるまで待つ
+        :param timeout: 待つ最大時間（秒）。None なら止まるまで待つ
+        :return: すべてのスレッドが止まっていれば True
+        """
+        self.cancel_all()
+        with self._lock:
+            first, self._stopping = not self._stopping, True
+        if first:
+            for _ in self._threads:
+                # 終了の合図は優先度を最低にして、残っている仕事の後に取り出されるようにする
+                self._queue.put((float('inf'), float('inf'), None))
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in self._threads:
+                if deadline is None:
+                    thread.wait()
                 else:
-                    self.finished_signal.emit(text)
+                    thread.wait(max(0, int((deadline - time.monotonic()) * 1000)))
+            with self._lock:
+                extra = list(self._extra)
+            for thread in extra:
+                thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return self.is_stopped()
 
-        except Exception as e:
-            self.error_signal.emit(f"予期せぬエラー: {e}")
\ No newline at end of file
+    def is_stopped(self):
+        """shutdown() の後、実行中の仕事がすべて終わってスレッドが止まったか"""
+        with self._lock:
+            extra = list(self._extra)
+        return (self._stopping and all(thread.isFinished() for thread in self._threads)
+                and not any(thread.is_alive() for thread in extra))
+
+    def _run_extra(self, job):
+        try:
+            self._run_job(job)
+        finally:
+            with self._lock:
+                self._extra.discard(threading.current_thread())
+
+    def _run_job(self, job):
+        try:
+            if job.cancel_event.is_set():
+                job.status = "cancelled"
+                self.job_cancelled.emit(job.job_id)
+                return
+
+            job.status = "running"
+            self.job_started.emit(job.job_id)
+            try:
+                with profiler.collect(job_id=job.job_id, task=job.task_type) as job.profile:
+                    result = run_task(
+                        job.task_type, job.kwargs,
+                        progress=lambda value: self.job_progress.emit(job.job_id, value),
+                        is_cancelled=job.cancel_event.is_set,
+                    )
+            except TaskCancelled:
+                job.status = "cancelled"
+                self.job_timings.emit(job.job_id, job.profile)
+                self.job_cancelled.emit(job.job_id)
+                return
+            except TaskError as e:
+                job.status = "error"
+                self.job_timings.emit(job.job_id, job.profile)
+                self.job_error.emit(job.job_id, str(e))
+                return
+            except Exception as e:
+                job.status = "error"
+                self.job_timings.emit(job.job_id, job.profile)
+                self.job_error.emit(job.job_id, f"予期せぬエラー: {e}")
+                return
+
+            self.job_timings.emit(job.job_id, job.profile)
+            # 止まらずに最後まで実行した仕事は、キャンセルを受け付けていても完了として通知する
+            job.status = "finished"
+            self.job_finished.emit(job.job_id, result)
+        finally:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+
+
+class AsyncBridgeSignals(QObject):
+    """
+    audio_processor.aio.AsyncBridge の続きを GUI スレッドで実行するためのシグナル
+    call_signal.connect(lambda func: func()) としてから AsyncBridge(signals.call_signal.emit) のように渡す
+    (別スレッドから emit するとキュー接続になり、GUI スレッドで呼ばれる)
+    """
+    # GUI スレッドで呼ぶ関数
+    call_signal = pyqtSignal(object)
@@ -0,0 +1,396 @@
+# 録音の保存形式 (ブロック単位で圧縮した PCM と、ブロック位置の索引)
+# 使い方:
+#   python audio_archive.py migrate *.wav            # WAV を .apcm に変換 (-before/-after の複製は参照に置き換える)
+#   python audio_archive.py migrate recordings --delete
+#   python audio_archive.py bench output.wav         # 任意区間の読み込み時間を WAV と比べる
+#
+# ファイルの構成 (.apcm, 数値はすべてリトルエンディアン):
+#   ヘッダ     magic 'APCM', バージョン, チャンネル数, サンプリングレート, ビット数,
+#              1ブロックのフレーム数, 総フレーム数, ブロック数, 索引の位置
+#   ブロック   16bit PCM を、前のサンプルとの差分 → 上位・下位バイトに分けて並べる → zlib 圧縮 したもの
+#              ブロックごとに独立しているので、必要なブロックだけを読んで展開できる
+#   索引       ブロックごとの (ファイル内の位置, 圧縮後のバイト数)
+#
+# スライスは音声をコピーせず、元のファイルと区間だけを書いた小さな JSON (.clip) として保存する
+import os
+import sys
+import json
+import glob
+import time
+import zlib
+import struct
+import argparse
+import threading
+import numpy as np
+
+MAGIC = b'APCM'
+VERSION = 1
+ARCHIVE_EXT = ".apcm"
+CLIP_EXT = ".clip"
+DEFAULT_BLOCK_SEC = 1.0
+_HEADER = struct.Struct('<4sHHIHIQIQ')
+_INDEX_ENTRY = np.dtype([('offset', '<u8'), ('size', '<u4')])
+
+# ==========================================
+# ブロックの圧縮・展開
+# ==========================================
+def encode_block(pcm, level=6):
+    """
+    (フレーム数, チャンネル数) の int16 配列を1ブロック分のバイト列にする
+    差分を取ると音声の値は小さくなり、上位バイトがほとんど 0 か 0xFF になるので zlib がよく効く
+    """
+    pcm = np.ascontiguousarray(pcm, dtype='<i2')
+    delta = np.diff(pcm, axis=0, prepend=np.zeros((1, pcm.shape[1]), dtype='<i2'))
+    planes = delta.view(np.uint8).reshape(-1, 2).T
+    return zlib.compress(planes.tobytes(), level)
+
+def decode_block(data, frames, channels):
+    """encode_block() の逆変換"""
+    planes = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(2, frames * channels)
+    delta = np.ascontiguousarray(planes.T).view('<i2').reshape(frames, channels)
+    # 差分の累積和は int16 の範囲で折り返すので、差分を取ったときの折り返しと打ち消し合う
+    return np.cumsum(delta, axis=0, dtype=np.int16)
+
+
+# ==========================================
+# 書き込み
+# ==========================================
+class ArchiveWriter:
+    """PCM を少しずつ受け取り、ブロックごとに圧縮して .apcm に書き込む"""
+
+    def __init__(self, path, rate, channels=1, block_frames=None, level=6):
+        self.path = path
+        self.rate = rate
+        self.channels = channels
+        self.block_frames = int(block_frames or rate * DEFAULT_BLOCK_SEC)
+        self.level = level
+        self.total_frames = 0
+        self._index = []
+        self._pending = np.zeros((0, channels), dtype='<i2')
+        self._tmp_path = path + ".tmp"
+        self._f = open(self._tmp_path, 'wb')
+        self._f.write(b'\0' * _HEADER.size)
+
+    def write(self, pcm):
+        """(フレーム数, チャンネル数) の int16 配列を追加する"""
+        pcm = np.asarray(pcm, dtype='<i2').reshape(-1, self.channels)
+        if len(self._pending):
+            pcm = np.concatenate((self._pending, pcm))
+        full = len(pcm) - len(pcm) % self.block_frames
+        for start in range(0, full, self.block_frames):
+            self._write_block(pcm[start:start + self.block_frames])
+        self._pending = pcm[full:].copy()
+
+    def _write_block(self, block):
+        data = encode_block(block, self.level)
+        self._index.append((self._f.tell(), len(data)))
+        self._f.write(data)
+        self.total_frames += len(block)
+
+    def close(self):
+        """残りを書き、索引とヘッダを書いてファイルを完成させる"""
+        if len(self._pending):
+            self._write_block(self._pending)
+            self._pending = self._pending[:0]
+        index_offset = self._f.tell()
+        self._f.write(np.array(self._index, dtype=_INDEX_ENTRY).tobytes())
+        self._f.seek(0)
+        self._f.write(_HEADER.pack(MAGIC, VERSION, self.channels, self.rate, 16, self.block_frames,
+                                   self.total_frames, len(self._index), index_offset))
+        self._f.close()
+        # 書き終わるまでは元の名前にしないので、途中で落ちても壊れたファイルは残らない
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_archive(path, pcm, rate, block_frames=None, level=6):
+    """(フレーム数, チャンネル数) または1次元の int16 配列を .apcm に保存する"""
+    pcm = np.asarray(pcm)
+    channels = pcm.shape[1] if pcm.ndim == 2 else 1
+    with ArchiveWriter(path, rate, channels, block_frames, level) as writer:
+        # 大きな配列でも一時配列が大きくならないよう、ブロック数十個分ずつ渡す
+        step = writer.block_frames * 32
+        for start in range(0, len(pcm), step):
+            writer.write(pcm[start:start + step])
+    return path
+
+
+# ==========================================
+# 読み込み
+# ==========================================
+class ArchiveReader:
+    """.apcm を開き、索引を使って任意の区間だけを展開する"""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, 'rb')
+        self._lock = threading.Lock()
+        header = self._f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"アーカイブではありません: {path}")
+        (magic, version, self.channels, self.rate, bits, self.block_frames,
+         self.frames, n_blocks, index_offset) = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"アーカイブではありません: {path}")
+        if version != VERSION or bits != 16:
+            raise ValueError(f"未対応のアーカイブです (version={version}, bits={bits})")
+        self._f.seek(index_offset)
+        self.index = np.frombuffer(self._f.read(n_blocks * _INDEX_ENTRY.itemsize), dtype=_INDEX_ENTRY)
+
+    @property
+    def duration(self):
+        return self.frames / self.rate
+
+    def read(self, start=0, end=None):
+        """
+        フレーム [start, end) を読み込む
+        :return: (フレーム数, チャンネル数) の int16 配列
+        """
+        end = self.frames if end is None else min(end, self.frames)
+        start = min(max(start, 0), end)
+        out = np.empty((end - start, self.channels), dtype=np.int16)
+        if end == start:
+            return out
+        first, last = start // self.block_frames, (end - 1) // self.block_frames
+        pos = 0
+        for block in range(first, last + 1):
+            offset, size = self.index[block]
+            with self._lock:
+                self._f.seek(int(offset))
+                data = self._f.read(int(size))
+            block_start = block * self.block_frames
+            n = min(self.block_frames, self.frames - block_start)
+            pcm = decode_block(data, n, self.channels)
+            lo, hi = max(start - block_start, 0), min(end - block_start, n)
+            out[pos:pos + hi - lo] = pcm[lo:hi]
+            pos += hi - lo
+        return out
+
+    def read_time(self, start_sec, end_sec=None):
+        """秒で指定した区間を読み込む"""
+        end = None if end_sec is None else int(round(end_sec * self.rate))
+        return self.read(int(round(start_sec * self.rate)), end)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+# ==========================================
+# スライスの参照
+# ==========================================
+def _frame_count(source):
+    """元のファイル (.apcm / .wav / .clip) のフレーム数"""
+    if source.endswith(ARCHIVE_EXT):
+        with ArchiveReader(source) as reader:
+            return reader.frames
+    if source.endswith(CLIP_EXT):
+        _, start, end = read_clip_info(source)
+        return end - start
+    import audio_processor
+    _, channels, _, bits, _, data_size = audio_processor.read_wav_header(source)
+    return data_size // (channels * bits // 8)
+
+def write_clip(path, source, start_frame, end_frame):
+    """
+    音声をコピーせず、元のファイルの区間だけを記録した .clip を作る
+    元のファイルのバイト数・更新時刻・フレーム数も記録し、読むときに書き換えられていないか確かめる
+    :param source: 元のファイル (.apcm / .wav / .clip)。.clip からの相対パスで記録する
+    """
+    source_rel = os.path.relpath(os.path.abspath(source), os.path.dirname(os.path.abspath(path)))
+    stat = os.stat(source)
+    info = {'source': source_rel, 'start': int(start_frame), 'end': int(end_frame),
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'frames': _frame_count(source)}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False)
+    return path
+
+def read_clip_info(path):
+    """
+    .clip を読み、(元のファイルの絶対パス, 開始フレーム, 終了フレーム) を返す
+    元の WAV が移行済みで消えていれば、同じ名前の .apcm を指す
+    元のファイルが作ったときと違えば (録音で上書きされたなど) ValueError を送出する
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    source = os.path.join(os.path.dirname(os.path.abspath(path)), info['source'])
+    # 古い .clip には元のファイルの記録がないので確かめない
+    checked = 'size' in info
+    if os.path.exists(source):
+        stat = os.stat(source)
+        if checked and (stat.st_size, stat.st_mtime_ns) != (info['size'], info['mtime_ns']):
+            raise ValueError(f"参照先の音声が書き換えられています: {source} ({path})")
+    else:
+        migrated = os.path.splitext(source)[0] + ARCHIVE_EXT
+        if os.path.exists(migrated):
+            # 移行するとバイト数・更新時刻は変わるので、フレーム数で確かめる (移行は音声が一致したときだけ行う)
+            if checked and _frame_count(migrated) != info['frames']:
+                raise ValueError(f"参照先の音声が書き換えられています: {migrated} ({path})")
+            source = migrated
+    return source, info['start'], info['end']
+
+
+# ==========================================
+# 既存の WAV の移行
+# ==========================================
+def _read_int16_wav(path):
+    import audio_processor
+    pcm, rate, _ = audio_processor.read_wav_pcm(path)
+    if pcm.dtype != np.int16:
+        raise ValueError(f"16bit PCM 以外の WAV は移行できません ({pcm.dtype})")
+    return pcm, rate
+
+def _find_slice_source(path):
+    """xxx-before.wav / xxx-after.wav なら、元の音声 (移行済みの xxx.apcm があればそちら) を返す"""
+    base, ext = os.path.splitext(path)
+    for suffix in ("-before", "-after"):
+        if base.endswith(suffix):
+            original = base[:-len(suffix)]
+            for candidate in (original + ARCHIVE_EXT, original + ext):
+                if os.path.exists(candidate):
+                    return candidate, suffix
+    return None, None
+
+def migrate_wav(path, delete=False):
+    """
+    WAV を .apcm に変換する。slice_audio が作った -before/-after の複製は、元の音声と一致すれば .clip にする
+    変換後に読み直して元と完全に一致することを確かめてから、delete=True なら WAV を消す
+    :return: (作ったファイルのパス, 変換前のバイト数, 変換後のバイト数)
+    """
+    pcm, rate = _read_int16_wav(path)
+    base = os.path.splitext(path)[0]
+    size = os.path.getsize(path)
+
+    target = None
+    source, suffix = _find_slice_source(path)
+    if source is not None:
+        if source.endswith(ARCHIVE_EXT):
+            with ArchiveReader(source) as reader:
+                original = reader.read()
+        else:
+            original = _read_int16_wav(source)[0]
+        start = 0 if suffix == "-before" else len(original) - len(pcm)
+        if original.shape[1] == pcm.shape[1] and start >= 0 and np.array_equal(original[start:start + len(pcm)], pcm):
+            target = write_clip(base + CLIP_EXT, source, start, start + len(pcm))
+
+    if target is None:
+        target = write_archive(base + ARCHIVE_EXT, pcm, rate)
+        with ArchiveReader(target) as reader:
+            if not np.array_equal(reader.read(), pcm):
+                os.remove(target)
+                raise ValueError(f"変換結果が元の音声と一致しません: {path}")
+    if delete:
+        del pcm
+        os.remove(path)
+    return target, size, os.path.getsize(target)
+
+def migrate(paths, delete=False):
+    """
+    複数の WAV を移行する
+    :param paths: WAV ファイルまたはフォルダのリスト
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.wav"))))
+        else:
+            files.append(path)
+    # 元の音声を先に .apcm にしておき、-before/-after の参照はそちらを指すようにする
+    files.sort(key=lambda p: _find_slice_source(p)[0] is not None)
+
+    before_total = after_total = 0
+    for path in files:
+        try:
+            target, before, after = migrate_wav(path, delete=delete)
+        except Exception as e:
+            print(f"❌ 移行エラー: {path}: {e}")
+            continue
+        before_total += before
+        after_total += after
+        print(f"✅ {path} → {target} ({before / 1024:.0f}KB → {after / 1024:.1f}KB)")
+    if before_total:
+        print(f"📦 合計 {before_total / 2**20:.1f}MB → {after_total / 2**20:.1f}MB ({after_total / before_total:.0%})")
+
+
+# ==========================================
+# 読み込み時間の計測
+# ==========================================
+def bench(path, window_sec=10.0, reads=50, seed=0):
+    """WAV の任意区間を読む時間を、全体を読む方法・メモリマップ・アーカイブで比べる"""
+    import audio_processor
+
+    archive = os.path.splitext(path)[0] + ".bench" + ARCHIVE_EXT
+    write_archive(archive, *_read_int16_wav(path))
+    try:
+        with ArchiveReader(archive) as reader:
+            rate, frames = reader.rate, reader.frames
+            window = min(int(window_sec * rate), frames)
+            rng = np.random.default_rng(seed)
+            starts = rng.integers(0, frames - window + 1, size=reads)
+
+            def full_decode(start):
+                audio, _ = audio_processor.load_wav(path)
+                return audio[start:start + window]
+
+            def wav_memmap(start):
+                return audio_processor.read_range(path, start / rate, (start + window) / rate)[0]
+
+            def archive_read(start):
+                return reader.read(start, start + window)
+
+            print(f"{path}: {frames / rate:.1f}秒, {window / rate:.1f}秒の区間を {reads}回読み込み")
+            print(f"  大きさ: WAV {os.path.getsize(path) / 1024:.0f}KB → アーカイブ {os.path.getsize(archive) / 1024:.0f}KB "
+                  f"({os.path.getsize(archive) / os.path.getsize(path):.0%})")
+            for name, func in (("全体を読み込み", full_decode), ("WAVメモリマップ", wav_memmap), ("アーカイブ", archive_read)):
+                times = []
+                for start in starts:
+                    t = time.perf_counter()
+                    func(int(start))
+                    times.append(time.perf_counter() - t)
+                p50, p90, p99 = np.percentile(times, [50, 90, 99]) * 1000
+                print(f"  {name:>12}: p50 {p50:7.2f}ms  p90 {p90:7.2f}ms  p99 {p99:7.2f}ms")
+    finally:
+        os.remove(archive)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="録音の保存形式 (.apcm) の変換と計測")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('migrate', help="WAV を .apcm / .clip に移行する")
+    p.add_argument('paths', nargs='+', help="WAV ファイルまたはフォルダ")
+    p.add_argument('--delete', action='store_true', help="移行できた WAV を削除する")
+    p = sub.add_parser('bench', help="任意区間の読み込み時間を計測する")
+    p.add_argument('paths', nargs='+', help="WAV ファイル")
+    p.add_argument('--window', type=float, default=10.0, help="読み込む区間の長さ（秒）")
+    p.add_argument('--reads', type=int, default=50, help="読み込む回数")
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        migrate(args.paths, delete=args.delete)
+    else:
+        for path in args.paths:
+            bench(path, args.window, args.reads)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2292 @@
+import os
+import json
+import hashlib
+import tempfile
+import struct
+import time
+import threading
+import importlib
+from collections import Counter, OrderedDict
+import config_manager
+import profiler
+
+# ==========================================
+# 0. 重いライブラリの遅延読み込み
+# ==========================================
+class _LazyModule:
+    """
+    最初に属性を使ったときに本物のモジュールを import し、このファイルのグローバル変数を置き換える
+    GUIの起動時に ffmpeg や numpy の読み込みを待たなくてよいようにするため
+    """
+
+    def __init__(self, module_name, global_name):
+        self._module_name = module_name
+        self._global_name = global_name
+
+    def _load(self):
+        module = importlib.import_module(self._module_name)
+        globals()[self._global_name] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+np = _LazyModule("numpy", "np")
+ffmpeg = _LazyModule("ffmpeg", "ffmpeg")
+resampler = _LazyModule("resampler", "resampler")
+waveform = _LazyModule("waveform", "waveform")
+
+def warm_up():
+    """
+    録音・文字起こしで使うライブラリを先に読み込んでおく
+    ウィンドウを表示した後にバックグラウンドで呼ぶと、最初の操作が速くなる
+    """
+    for module in (np, ffmpeg, resampler, waveform):
+        if isinstance(module, _LazyModule):
+            module._load()
+
+_settings = None
+_settings_lock = threading.Lock()
+
+def get_settings():
+    """
+    audio_processor が使う設定を返す (初回呼び出し時に1度だけ読み込む)
+    推論のたびに設定ファイルを読み直さず、ファイルがなくても作らない
+    """
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = config_manager.read_config()
+        return _settings
+
+def set_settings(config):
+    """設定を差し替える (GUIで設定を保存したときなど。None を渡すと次回 get_settings() で読み直す)"""
+    global _settings
+    with _settings_lock:
+        _settings = config
+
+# ==========================================
+# 1. 録音機能
+# ==========================================
+def record_audio(output_file, duration=10, format='avfoundation', audio_device=':0'):
+    """
+    マイクから録音を行う関数
+    :param output_file: 保存するファイル名 (例: 'output.wav')。複数の入力なら入力ごとのファイル名のリストも可
+    :param duration: 録音時間（秒）
+    :param format: OSごとのオーディオドライバ (Macは'avfoundation')
+    :param audio_device: デバイスID (Macは':0'など)。リストを渡すと1つの ffmpeg でまとめて録音する
+    :return: 成功ならTrue, 失敗ならFalse
+    """
+    if isinstance(audio_device, (list, tuple)):
+        return record_sources_to_files(output_file, audio_device, duration=duration, format=format)
+    print(f"🎙️ {duration}秒間の録音を開始します...")
+    try:
+        with profiler.stage("ffmpeg_capture", duration=duration):
+            record_spec(output_file, duration, format, audio_device).run(
+                overwrite_output=True, capture_stdout=True, capture_stderr=True)
+        print(f"✅ 録音完了: {output_file}")
+        return True
+    except ffmpeg.Error as e:
+        print("❌ FFmpegエラー:", e.stderr.decode())
+        return False
+    except Exception as e:
+        print(f"❌ 予期せぬエラー: {e}")
+        return False
+
+def record_spec(output_file, duration=10, format='avfoundation', audio_device=':0'):
+    """録音して 44.1kHz モノラル 16bit の WAV に保存する ffmpeg の処理 (まだ起動しない)"""
+    return (
+        ffmpeg
+        .input(audio_device, format=format, t=duration)
+        .output(output_file, acodec='pcm_s16le', ar='44100', ac=1)
+    )
+
+def source_list(sources, format='avfoundation'):
+    """
+    録音する入力のリストを (デバイス, 入力フォーマット) のリストにそろえる
+    :param sources: デバイスIDのリスト。(デバイス, フォーマット) の組も混ぜられる
+                    (例: [':0', ('sine=frequency=440', 'lavfi')])
+    """
+    return [tuple(source) if isinstance(source, (list, tuple)) else (source, format) for source in sources]
+
+def source_output_files(output_file, count):
+    """
+    入力ごとの保存先を決める
+    :param output_file: ファイル名のリスト、または1つのファイル名 (「名前-1.wav」「名前-2.wav」… にする)
+    """
+    if isinstance(output_file, (list, tuple)):
+        if len(output_file) != count:
+            raise ValueError(f"保存先の数 ({len(output_file)}) が入力の数 ({count}) と違います")
+        return list(output_file)
+    base, ext = os.path.splitext(output_file)
+    return [f"{base}-{k + 1}{ext or '.wav'}" for k in range(count)]
+
+def open_multi_pcm_stream(sources, duration=None, format='avfoundation', sample_rate=16000, sample_format='s16le'):
+    """
+    1つの ffmpeg で複数の入力を同時に録音し、入力ごとに1チャンネルとした PCM を標準出力に流す
+    入力はそれぞれモノラル・同じサンプリングレートにしてから amerge で1本にまとめるので、
+    各チャンネルは最初のサンプルの位置がそろい、長さも同じになる (一番短い入力で終わる)
+    :param sources: source_list() の形式の入力のリスト
+    :return: subprocess.Popen。出力は (フレーム数, 入力の数) の順に並んだ PCM
+    """
+    return multi_pcm_stream_spec(sources, duration, format, sample_rate, sample_format).run_async(
+        pipe_stdout=True, pipe_stderr=True)
+
+def multi_pcm_stream_spec(sources, duration=None, format='avfoundation', sample_rate=16000, sample_format='s16le'):
+    """
+    open_multi_pcm_stream() が起動する ffmpeg の処理 (まだ起動しない)
+    ffmpeg-python は同じ引数の入力を1つにまとめるので、同じ入力が2回以上あるときは1回だけ開き、asplit で分ける
+    """
+    counts = Counter(sources)
+    branches = {}   # 入力 -> まだ使っていない枝のリスト
+    for source, count in counts.items():
+        device, input_format = source
+        input_kwargs = {}
+        if input_format:
+            input_kwargs['format'] = input_format
+        if duration:
+            input_kwargs['t'] = duration
+        stream = (
+            ffmpeg.input(device, **input_kwargs).audio
+            .filter('aformat', sample_fmts='flt', sample_rates=sample_rate, channel_layouts='mono')
+        )
+        if count > 1:
+            split = stream.asplit()
+            branches[source] = [split[k] for k in range(count)]
+        else:
+            branches[source] = [stream]
+    streams = [branches[source].pop(0) for source in sources]
+    merged = ffmpeg.filter(streams, 'amerge', inputs=len(streams)) if len(streams) > 1 else streams[0]
+    output_kwargs = {'t': duration} if duration else {}
+    return (
+        merged
+        .output('pipe:', format=sample_format, acodec=f'pcm_{sample_format}', ar=sample_rate,
+                ac=len(streams), **output_kwargs)
+        .global_args('-loglevel', 'error', '-nostats')
+    )
+
+def record_sources_to_files(output_file, sources, duration=10, format='avfoundation', sample_rate=44100):
+    """
+    複数の入力を1つの ffmpeg で録音し、入力ごとの 16bit WAV に分けて保存する
+    :param output_file: 入力ごとのファイル名のリスト、または1つのファイル名 (source_output_files を参照)
+    :param sources: デバイスIDのリスト (source_list を参照)
+    :return: 成功ならTrue, 失敗ならFalse
+    """
+    sources = source_list(sources, format)
+    try:
+        paths = source_output_files(output_file, len(sources))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    print(f"🎙️ {duration}秒間の録音を開始します ({len(sources)}入力)...")
+    try:
+        with profiler.stage("ffmpeg_capture", duration=duration, sources=len(sources)):
+            process = open_multi_pcm_stream(sources, duration=duration, sample_rate=sample_rate)
+            data, stderr = process.communicate()
+        if process.returncode != 0:
+            print("❌ FFmpegエラー:", stderr.decode(errors='replace').strip())
+            return False
+        write_source_files(data, paths, sample_rate)
+        print(f"✅ 録音完了: {', '.join(paths)}")
+        return True
+    except Exception as e:
+        print(f"❌ 予期せぬエラー: {e}")
+        return False
+
+def write_source_files(data, paths, sample_rate):
+    """入力ごとに1チャンネルずつ並んだ 16bit の PCM を、入力ごとの WAV に分けて保存する"""
+    pcm = np.frombuffer(data, dtype='<i2')
+    pcm = pcm[:len(pcm) - len(pcm) % len(paths)].reshape(-1, len(paths))
+    for k, path in enumerate(paths):
+        write_wav_pcm(path, pcm[:, k:k + 1], sample_rate)
+
+def convert_spec(input_file, output_file, sample_rate=16000, channels=1, codec='pcm_s16le', progress=False):
+    """
+    音声ファイルの形式を変換する ffmpeg の処理 (まだ起動しない)
+    :param progress: Trueなら進み具合 (-progress) を標準出力に書かせる
+    """
+    global_args = ['-loglevel', 'error', '-nostats']
+    if progress:
+        global_args += ['-progress', 'pipe:1']
+    return (
+        ffmpeg
+        .input(input_file)
+        .output(output_file, acodec=codec, ar=sample_rate, ac=channels)
+        .global_args(*global_args)
+    )
+
+def convert_audio(input_file, output_file, sample_rate=16000, channels=1, codec='pcm_s16le'):
+    """
+    ffmpeg が読める音声 (mp3, m4a など) を WAV などに変換する関数
+    :param input_file: 元のファイルパス
+    :param output_file: 保存先 (拡張子で形式が決まる)
+    :param sample_rate: 変換後のサンプリングレート (16000 ならそのままモデルに渡せる)
+    :param channels: 変換後のチャンネル数
+    :param codec: 変換後のコーデック
+    :return: 成功ならTrue, 失敗ならFalse
+    """
+    try:
+        with profiler.stage("ffmpeg_convert"):
+            convert_spec(input_file, output_file, sample_rate, channels, codec).run(
+                overwrite_output=True, capture_stdout=True, capture_stderr=True)
+        print(f"✅ 変換完了: {output_file}")
+        return True
+    except ffmpeg.Error as e:
+        print("❌ FFmpegエラー:", e.stderr.decode())
+        return False
+    except Exception as e:
+        print(f"❌ 予期せぬエラー: {e}")
+        return False
+
+# ==========================================
+# 2. 音声スライス機能
+# ==========================================
+def find_silences(pcm, rate, frame_ms=20, silence_db=-40.0, min_silence_ms=300):
+    """
+    RMSエネルギーを一定長のフレームごとにまとめて計算し、無音区間を探す
+    :param pcm: (フレーム数, チャンネル数) の PCM 配列 (read_wav_pcm の戻り値) または AudioBuffer
+    :param rate: サンプリングレート
+    :param frame_ms: エネルギーを計算する単位（ミリ秒）
+    :param silence_db: これより小さい音量 (dBFS) を無音とみなす
+    :param min_silence_ms: これより短い無音は無視する
+    :return: 無音区間 (開始サンプル, 終了サンプル) のリスト
+    """
+    if isinstance(pcm, AudioBuffer):
+        pcm = pcm.pcm
+    frame_len = max(1, int(rate * frame_ms / 1000))
+    n_frames = len(pcm) // frame_len
+    if n_frames == 0:
+        return []
+
+    full_scale = float(np.iinfo(pcm.dtype).max + 1) if pcm.dtype.kind in 'iu' else 1.0
+    threshold = (full_scale * 10 ** (silence_db / 20)) ** 2
+    energy = np.empty(n_frames, dtype=np.float32)
+    # 長いファイルでもメモリを使いすぎないよう、フレームをまとめて少しずつ計算する
+    block = 4096
+    for start in range(0, n_frames, block):
+        stop = min(start + block, n_frames)
+        frames = pcm[start * frame_len:stop * frame_len].reshape(stop - start, -1)
+        if pcm.dtype == np.uint8:
+            frames = frames.astype(np.int16) - 128
+        energy[start:stop] = np.mean(np.square(frames, dtype=np.float32), axis=1)
+
+    # 無音フレームの連続区間を差分で求める
+    silent = np.concatenate(([False], energy < threshold, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    min_frames = max(1, int(np.ceil(min_silence_ms / frame_ms)))
+    keep = (ends - starts) >= min_frames
+    return [(int(a) * frame_len, int(b) * frame_len) for a, b in zip(starts[keep], ends[keep])]
+
+def detect_speech(audio, rate=16000, frame_ms=30, threshold_db=-45.0, margin_db=10.0,
+                  zcr_min=0.25, min_speech_ms=200, pad_ms=200, merge_gap_ms=500):
+    """
+    フレームごとのエネルギーとゼロ交差率で発話区間を探す (簡易VAD)
+    閾値は雑音の大きさ (フレームエネルギーの下位10%) に margin_db を足したもので、雑音が大きい録音ほど上がる
+    (上限は設けない。雑音に埋もれない声だけを発話とみなす)。
+    エネルギーが閾値以上のフレームに加え、少し小さくてもゼロ交差率の高いフレーム (「さ」「し」などの無声子音) を発話とみなす
+    :param audio: モノラル float32 の配列 (-1.0〜1.0) または AudioBuffer
+    :param rate: サンプリングレート
+    :param frame_ms: 判定する単位（ミリ秒）
+    :param threshold_db: 発話とみなす最小の音量 (dBFS)。ほぼ無音の録音でかすかな雑音を発話とみなさないための下限
+    :param margin_db: 雑音の大きさにこれだけ足したものを閾値にする
+    :param zcr_min: 無声子音とみなすゼロ交差率
+    :param min_speech_ms: これより短い発話は無視する (クリック音など)
+    :param pad_ms: 発話区間の前後に付け足す長さ（語頭・語尾の切れ防止）
+    :param merge_gap_ms: これより短い間隔の発話区間はつなげる
+    :return: 発話区間 (開始サンプル, 終了サンプル) のリスト
+    """
+    frame_len = max(1, int(rate * frame_ms / 1000))
+    n_frames = -(-len(audio) // frame_len)
+    if n_frames == 0:
+        return []
+
+    db = np.empty(n_frames, dtype=np.float32)
+    zcr = np.empty(n_frames, dtype=np.float32)
+    # 長い音声でも一時配列が大きくならないよう、フレームをまとめて少しずつ計算する
+    block = 4096
+    for start in range(0, n_frames, block):
+        stop = min(start + block, n_frames)
+        # AudioBuffer はこのブロックの分だけ float32 にする
+        part = float_range(audio, start * frame_len, stop * frame_len)
+        if len(part) < (stop - start) * frame_len:
+            # 最後の半端なフレームは無音で埋める
+            part = np.concatenate((part, np.zeros((stop - start) * frame_len - len(part), dtype=np.float32)))
+        frames = part.reshape(stop - start, frame_len)
+        energy = np.mean(np.square(frames, dtype=np.float32), axis=1)
+        db[start:stop] = 10 * np.log10(energy + np.float32(1e-12))
+        signs = np.signbit(frames)
+        zcr[start:stop] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+
+    floor = float(np.percentile(db, 10))
+    threshold = max(threshold_db, floor + margin_db)
+    speech = (db >= threshold) | ((db >= threshold - margin_db / 2) & (zcr >= zcr_min))
+
+    # 発話フレームの連続区間を求め、短いものを捨ててから前後を広げ、近いものをつなげる
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], speech, [False])).astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) >= max(1, int(np.ceil(min_speech_ms / frame_ms)))
+    pad = int(pad_ms / frame_ms)
+    gap = int(merge_gap_ms / frame_ms)
+    regions = []
+    for a, b in zip(starts[keep] - pad, ends[keep] + pad):
+        a, b = max(0, int(a)), min(n_frames, int(b))
+        if regions and a - regions[-1][1] <= gap:
+            regions[-1][1] = b
+        else:
+            regions.append([a, b])
+    return [(a * frame_len, min(b * frame_len, len(audio))) for a, b in regions]
+
+def plan_slices(pcm, rate, split_ms=None, interval_ms=None, num_segments=None, on_silence=False,
+                silence_db=-40.0, min_silence_ms=300):
+    """
+    分割位置を決めて、各区間の (開始サンプル, 終了サンプル) のリストを返す
+    :param split_ms: 分割地点（ミリ秒）またはそのリスト
+    :param interval_ms: この間隔ごとに分割する
+    :param num_segments: 全体をこの数に等分する
+    :param on_silence: Trueなら分割地点を近くの無音区間の中央にずらす。
+                       分割地点の指定がなければ、すべての無音区間で分割する
+    """
+    n = len(pcm)
+    if split_ms is not None:
+        points = split_ms if isinstance(split_ms, (list, tuple)) else [split_ms]
+        cuts = [int(ms * rate / 1000) for ms in points]
+    elif interval_ms:
+        step = max(1, int(interval_ms * rate / 1000))
+        cuts = list(range(step, n, step))
+    elif num_segments:
+        cuts = [n * k // num_segments for k in range(1, num_segments)]
+    else:
+        cuts = []
+
+    if on_silence:
+        silences = find_silences(pcm, rate, silence_db=silence_db, min_silence_ms=min_silence_ms)
+        centers = np.array([(a + b) // 2 for a, b in silences], dtype=np.int64)
+        if not cuts:
+            cuts = [int(c) for c in centers if 0 < c < n]
+        elif len(centers):
+            # 各分割地点から、隣の分割地点との中間までの範囲にある一番近い無音に寄せる
+            bounds = [0] + cuts + [n]
+            snapped = []
+            for k, cut in enumerate(cuts):
+                lo = (bounds[k] + cut) // 2
+                hi = (cut + bounds[k + 2]) // 2
+                candidates = centers[(centers > lo) & (centers < hi)]
+                snapped.append(int(candidates[np.argmin(np.abs(candidates - cut))]) if len(candidates) else cut)
+            cuts = snapped
+
+    cuts = sorted(set(min(max(c, 0), n) for c in cuts))
+    bounds = [0] + cuts + [n]
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a or n == 0]
+
+def slice_segments(input_file, split_ms=None, interval_ms=None, num_segments=None, on_silence=False,
+                   output_files=None, write_files=True, silence_db=-40.0, min_silence_ms=300, as_refs=False):
+    """
+    音声を N 個の区間に分割する関数
+    ファイルは1回だけメモリマップで読み込み、各区間は同じバッファの範囲ビューとして扱う
+    :param input_file: 元のWAVファイルパス
+    :param split_ms / interval_ms / num_segments / on_silence: 分割方法 (plan_slices を参照)
+    :param output_files: 各区間の保存先ファイル名のリスト (省略時は 元の名前-001.wav など)
+    :param write_files: Falseならファイルに書かず、メモリ上の区間だけを返す
+    :param as_refs: Trueなら音声をコピーせず、元のファイルの区間を指す参照 (.clip) を書く
+    :return: {'index', 'start_ms', 'end_ms', 'pcm', 'rate', 'path'} の辞書のリスト
+    """
+    import audio_archive
+
+    pcm, rate, _ = read_pcm(input_file)
+    ranges = plan_slices(pcm, rate, split_ms, interval_ms, num_segments, on_silence,
+                         silence_db=silence_db, min_silence_ms=min_silence_ms)
+
+    base, ext = os.path.splitext(input_file)
+    segments = []
+    for k, (start, end) in enumerate(ranges):
+        path = None
+        if write_files and as_refs:
+            path = output_files[k] if output_files else f"{base}-{k + 1:03d}{audio_archive.CLIP_EXT}"
+            audio_archive.write_clip(path, input_file, start, end)
+        elif write_files:
+            path = output_files[k] if output_files else f"{base}-{k + 1:03d}{ext}"
+            write_wav_pcm(path, pcm[start:end], rate)
+        segments.append({
+            'index': k,
+            'start_ms': start * 1000 / rate,
+            'end_ms': end * 1000 / rate,
+            'pcm': pcm[start:end],
+            'rate': rate,
+            'path': path,
+        })
+    return segments
+
+def slice_audio(input_file, split_ms=4000, as_refs=None):
+    """
+    音声を指定した時間で2つに分割する関数
+    :param input_file: 元のWAVファイルパス
+    :param split_ms: 分割する地点（ミリ秒） デフォルト4秒
+    :param as_refs: Trueなら音声をコピーせず、元のファイルの区間を指す参照 (.clip) を書く
+                    (None なら設定の slice_as_refs に従う)
+    :return: (前半ファイル名, 後半ファイル名) のタプル。失敗時は(None, None)
+    """
+    if not os.path.exists(input_file):
+        print(f"❌ ファイルが見つかりません: {input_file}")
+        return None, None
+
+    try:
+        import audio_archive
+
+        if as_refs is None:
+            as_refs = get_settings().get("slice_as_refs", False)
+
+        # 前半・後半のファイル名を生成
+        base, ext = os.path.splitext(input_file)
+        if as_refs:
+            ext = audio_archive.CLIP_EXT
+        before_file = f"{base}-before{ext}"
+        after_file = f"{base}-after{ext}"
+
+        # スライス処理 (分割地点が長さを超える場合は後半が空になる)
+        pcm, rate, _ = read_pcm(input_file)
+        cut = min(max(int(split_ms * rate / 1000), 0), len(pcm))
+        if as_refs:
+            audio_archive.write_clip(before_file, input_file, 0, cut)
+            audio_archive.write_clip(after_file, input_file, cut, len(pcm))
+        else:
+            write_wav_pcm(before_file, pcm[:cut], rate)
+            write_wav_pcm(after_file, pcm[cut:], rate)
+        
+        print(f"✂️ スライス完了: {before_file}, {after_file}")
+        return before_file, after_file
+
+    except Exception as e:
+        print(f"❌ スライスエラー: {e}")
+        return None, None
+
+def slice_range(input_file, start_ms, end_ms, output_file=None, as_refs=None):
+    """
+    音声の指定した区間だけを切り出す (検索で見つかった発言の区間など)
+    :param input_file: 元のファイルパス (.wav / .apcm / .clip)
+    :param start_ms: 開始位置（ミリ秒）
+    :param end_ms: 終了位置（ミリ秒）
+    :param output_file: 保存先 (省略時は「元の名前-開始-終了」)
+    :param as_refs: Trueなら音声をコピーせず参照 (.clip) を書く (None なら設定の slice_as_refs に従う)
+    :return: 切り出したファイル名。失敗時は None
+    """
+    try:
+        import audio_archive
+
+        if as_refs is None:
+            as_refs = get_settings().get("slice_as_refs", False)
+        base, ext = os.path.splitext(input_file)
+        if as_refs:
+            ext = audio_archive.CLIP_EXT
+        elif ext != ".wav":
+            ext = ".wav"
+        if output_file is None:
+            output_file = f"{base}-{int(start_ms)}-{int(end_ms)}{ext}"
+
+        pcm, rate, _ = read_range(input_file, start_ms / 1000, end_ms / 1000)
+        if as_refs:
+            start = int(round(start_ms * rate / 1000))
+            audio_archive.write_clip(output_file, input_file, start, start + len(pcm))
+        else:
+            write_wav_pcm(output_file, pcm, rate)
+        print(f"✂️ 切り出し完了: {output_file}")
+        return output_file
+
+    except Exception as e:
+        print(f"❌ スライスエラー: {e}")
+        return None
+
+# ==========================================
+# 3. 文字起こしエンジン（モデル常駐）
+# ==========================================
+class TranscriptionBackend:
+    """
+    文字起こしバックエンドの共通インターフェース
+    load_model() でモデルを読み込み、transcribe() で読み込み済みモデルを使って推論する
+    """
+    name = "base"
+    # False なら同じプロセスの中では同時に1つしか推論できない (並列にするには子プロセスを使う)
+    thread_safe = True
+
+    def process_args(self):
+        """
+        子プロセスで同じバックエンドを作るための (名前, コンストラクタの引数)。作れなければ None
+        名前と引数は process_engine.ProcessEngine に渡せる形にする
+        """
+        return None
+
+    def load_model(self, model_name):
+        """
+        :param model_name: モデル名 (例: 'mlx-community/whisper-base-mlx')
+        :return: transcribe() に渡すモデルオブジェクト
+        """
+        raise NotImplementedError
+
+    def transcribe(self, model_name, model, audio, **options):
+        """
+        :param model_name: モデル名
+        :param model: load_model() が返したモデル
+        :param audio: 16kHz モノラル float32 の Numpy配列
+        :return: mlx_whisper.transcribe と同じ形式の辞書 ({'text': ..., 'segments': [...]})
+        """
+        raise NotImplementedError
+
+    def transcribe_batch(self, model_name, model, audios, **options):
+        """
+        30秒以下の短い音声をまとめて推論する (対応していないバックエンドは1つずつ推論する)
+        :param audios: 16kHz モノラル float32 の Numpy配列のリスト
+        :return: transcribe() と同じ形式の辞書のリスト (audios と同じ順)
+        """
+        return [self.transcribe(model_name, model, audio, **options) for audio in audios]
+
+
+class MlxWhisperBackend(TranscriptionBackend):
+    """mlx_whisper を使う本番用バックエンド (Apple Silicon 専用)"""
+    name = "mlx"
+    # mlx_whisper はモデルをグローバル (ModelHolder) に持つため、同じプロセスの中では推論は1つずつ行う
+    thread_safe = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def process_args(self):
+        return ("mlx", {})
+
+    def load_model(self, model_name):
+        import mlx.core as mx
+        from mlx_whisper.load_models import load_model
+        # mlx_whisper.transcribe の既定 (fp16=True) に合わせて float16 で読み込む
+        return load_model(model_name, dtype=mx.float16)
+
+    def transcribe(self, model_name, model, audio, **options):
+        import mlx_whisper
+        from mlx_whisper.transcribe import ModelHolder
+        with self._lock:
+            # 読み込み済みモデルを渡しておけば transcribe() の中で再読み込みされない
+            ModelHolder.model = model
+            ModelHolder.model_path = model_name
+            return mlx_whisper.transcribe(audio, path_or_hf_repo=model_name, **options)
+
+    # mlx_whisper.transcribe がやり直しを判断する既定のしきい値
+    FALLBACK_DEFAULTS = {"compression_ratio_threshold": 2.4, "logprob_threshold": -1.0, "no_speech_threshold": 0.6}
+
+    def transcribe_batch(self, model_name, model, audios, **options):
+        import dataclasses
+        import mlx.core as mx
+        from mlx_whisper.audio import N_FRAMES, N_SAMPLES, log_mel_spectrogram, pad_or_trim
+        from mlx_whisper.decoding import DecodingOptions, decode
+        from mlx_whisper.tokenizer import get_tokenizer
+
+        # 各音声を30秒分のメルスペクトログラムにそろえ、(バッチ, フレーム, メル) にまとめて1回でデコードする
+        mels = [
+            pad_or_trim(log_mel_spectrogram(audio, n_mels=model.dims.n_mels, padding=N_SAMPLES), N_FRAMES, axis=-2)
+            for audio in audios
+        ]
+        names = {field.name for field in dataclasses.fields(DecodingOptions)}
+        decode_kwargs = {k: v for k, v in options.items() if k in names}
+        # transcribe() の temperature は温度の候補の列。まとめてデコードするのは最初の温度だけにする
+        temperature = options.get("temperature", 0.0)
+        if isinstance(temperature, (list, tuple)):
+            temperature = temperature[0]
+        decode_kwargs["temperature"] = temperature
+        decode_options = DecodingOptions(**decode_kwargs)
+        with self._lock:
+            results = decode(model, mx.stack(mels).astype(mx.float16), decode_options)
+        tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                  language=options.get("language"), task=options.get("task", "transcribe"))
+        thresholds = {k: options.get(k, v) for k, v in self.FALLBACK_DEFAULTS.items()}
+
+        outputs = []
+        for audio, result in zip(audios, results):
+            verdict = self._judge(result, thresholds)
+            if verdict == "retry":
+                # 失敗したデコードは transcribe() (温度を上げながらのやり直し付き) で1つずつ推論し直す
+                outputs.append(self.transcribe(model_name, model, audio, **options))
+                continue
+            segments = [] if verdict == "silent" else self._segments(tokenizer, result, len(audio) / 16000)
+            outputs.append({
+                "text": "".join(seg["text"] for seg in segments),
+                "segments": segments,
+                "language": result.language,
+            })
+        return outputs
+
+    @staticmethod
+    def _judge(result, thresholds):
+        """
+        mlx_whisper.transcribe と同じ基準でデコード結果を判定する
+        :return: 'ok', 'silent' (無音なので結果を捨てる), 'retry' (やり直しが必要)
+        """
+        low_logprob = (thresholds["logprob_threshold"] is not None
+                       and result.avg_logprob < thresholds["logprob_threshold"])
+        if (thresholds["no_speech_threshold"] is not None
+                and result.no_speech_prob > thresholds["no_speech_threshold"] and low_logprob):
+            return "silent"
+        if (thresholds["compression_ratio_threshold"] is not None
+                and result.compression_ratio > thresholds["compression_ratio_threshold"]):
+            return "retry"
+        return "retry" if low_logprob else "ok"
+
+    @staticmethod
+    def _segments(tokenizer, result, duration):
+        """デコード結果のタイムスタンプのトークン (<|0.00|> 文 <|2.40|>) でセグメントに分ける"""
+        # タイムスタンプのトークン1つ分の時間 (秒)
+        precision = 0.02
+        begin = tokenizer.timestamp_begin
+        spans = []
+        start, tokens = None, []
+        last_end = 0.0   # 開始のタイムスタンプがない文は、前の文の終わりから始まったことにする
+        for token in result.tokens:
+            if token < begin:
+                tokens.append(token)
+                continue
+            time_sec = min((token - begin) * precision, duration)
+            if tokens:
+                spans.append((start if start is not None else last_end, time_sec, tokens))
+                start, tokens, last_end = None, [], time_sec
+            else:
+                start = time_sec
+        if tokens:
+            spans.append((start if start is not None else last_end, duration, tokens))
+        confidence = {"avg_logprob": result.avg_logprob, "no_speech_prob": result.no_speech_prob,
+                      "compression_ratio": result.compression_ratio, "temperature": result.temperature}
+        segments = []
+        for seg_start, seg_end, seg_tokens in spans:
+            text = tokenizer.decode(seg_tokens)
+            if not text.strip():
+                continue
+            segments.append({"id": len(segments), "start": seg_start, "end": max(seg_start, seg_end),
+                             "text": text, "tokens": seg_tokens, **confidence})
+        return segments
+
+
+class FakeBackend(TranscriptionBackend):
+    """
+    テスト用の決定的なバックエンド (MLXのないLinuxでも動く)
+    同じ音声・同じモデルなら必ず同じ結果を返す
+    """
+    name = "fake"
+
+    # 台本にないセグメントの確信度 (十分に確からしい値)
+    DEFAULT_CONFIDENCE = {"avg_logprob": -0.2, "no_speech_prob": 0.01, "compression_ratio": 1.5}
+
+    def __init__(self, load_delay=0.0, infer_delay=0.0, segment_sec=None, realtime_factor=0.0, confidences=None,
+                 thread_safe=True):
+        """
+        :param load_delay: モデル読み込みにかかる時間（秒）の疑似値
+        :param infer_delay: 1回の推論にかかる時間（秒）の疑似値
+        :param realtime_factor: 音声1秒あたりの推論時間（秒）の疑似値 (長い音声ほど遅くなる)。
+                                {モデル名: 値} の辞書ならモデルごとに変えられる
+        :param segment_sec: 指定するとこの長さごとにセグメントを分けて返す (省略時は全体で1つ)
+        :param confidences: セグメントの確信度の台本 {モデル名: [1番目のセグメントの値, 2番目, ...]}。
+                            値は avg_logprob の数値か、avg_logprob / no_speech_prob / compression_ratio の辞書。
+                            番号は1回の推論の中でのセグメントの順番で、台本にないものは DEFAULT_CONFIDENCE になる
+        :param thread_safe: False なら MlxWhisperBackend のように同じプロセスの中では推論を1つずつ行う
+        """
+        # 子プロセスで同じ設定のバックエンドを作れるよう、引数を覚えておく
+        self._options = dict(load_delay=load_delay, infer_delay=infer_delay, segment_sec=segment_sec,
+                             realtime_factor=realtime_factor, confidences=confidences, thread_safe=thread_safe)
+        self.load_delay = load_delay
+        self.infer_delay = infer_delay
+        self.segment_sec = segment_sec
+        self.realtime_factor = realtime_factor
+        self.confidences = confidences or {}
+        self.load_counts = {}   # モデル名ごとの読み込み回数
+        self.infer_count = 0    # バックエンドを呼び出した回数 (まとめて推論した場合も1回)
+        self.batch_sizes = []   # transcribe_batch() で受け取った音声の数
+        self.thread_safe = thread_safe
+        self._lock = threading.Lock()
+        self._serial = threading.Lock() if not thread_safe else None
+
+    def process_args(self):
+        return ("fake", dict(self._options))
+
+    def _sleep(self, seconds):
+        """推論にかかる時間の代わりに待つ (thread_safe=False なら同時に1つだけ)"""
+        if self._serial is None:
+            time.sleep(seconds)
+            return
+        with self._serial:
+            time.sleep(seconds)
+
+    def load_model(self, model_name):
+        time.sleep(self.load_delay)
+        with self._lock:
+            self.load_counts[model_name] = self.load_counts.get(model_name, 0) + 1
+        return {"name": model_name}
+
+    def _factor(self, model_name):
+        if isinstance(self.realtime_factor, dict):
+            return self.realtime_factor.get(model_name, 0.0)
+        return self.realtime_factor
+
+    def transcribe(self, model_name, model, audio, **options):
+        seconds = len(audio) / 16000
+        self._sleep(self.infer_delay + seconds * self._factor(model_name))
+        with self._lock:
+            self.infer_count += 1
+        return self._make_result(model, audio)
+
+    def transcribe_batch(self, model_name, model, audios, **options):
+        # 一番長い音声に合わせてゼロ詰めした (バッチ, サンプル) の配列にまとめ、1回分の時間で推論したことにする
+        lengths = [len(audio) for audio in audios]
+        batch = np.zeros((len(audios), max(lengths, default=0)), dtype=np.float32)
+        for row, audio in zip(batch, audios):
+            row[:len(audio)] = audio
+        self._sleep(self.infer_delay + batch.shape[1] / 16000 * self._factor(model_name))
+        with self._lock:
+            self.infer_count += 1
+            self.batch_sizes.append(len(audios))
+        return [self._make_result(model, row[:n]) for row, n in zip(batch, lengths)]
+
+    def _make_result(self, model, audio):
+        step = int(self.segment_sec * 16000) if self.segment_sec else max(1, len(audio))
+        script = self.confidences.get(model['name'], [])
+        segments = []
+        for k, start in enumerate(range(0, max(1, len(audio)), step)):
+            part = audio[start:start + step]
+            # np.abs() の一時配列を作らずに最大振幅を求める (長い音声でもメモリを使わない)
+            peak = max(float(part.max()), -float(part.min())) if len(part) else 0.0
+            end = min(start + step, len(audio)) / 16000
+            confidence = dict(self.DEFAULT_CONFIDENCE)
+            if k < len(script):
+                value = script[k]
+                confidence.update(value if isinstance(value, dict) else {"avg_logprob": value})
+            segments.append({
+                "id": k,
+                "start": start / 16000,
+                "end": end,
+                "text": f" [{model['name']}] {end - start / 16000:.2f}秒 peak={peak:.3f}",
+                **confidence,
+            })
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "language": "ja",
+        }
+
+
+class TranscriptionEngine:
+    """
+    読み込んだモデルを常駐させて使い回す文字起こしエンジン
+    モデルは model_name をキーにした LRU プールで保持し、上限を超えたら古いものから解放する
+    """
+
+    def __init__(self, backend=None, max_models=2):
+        """
+        :param backend: TranscriptionBackend (省略時は MlxWhisperBackend)
+        :param max_models: 同時に保持するモデル数の上限
+        """
+        self.backend = backend if backend is not None else MlxWhisperBackend()
+        self.max_models = max(1, int(max_models))
+        self._models = OrderedDict()
+        self._loading = {}   # 読み込み中のモデル名 -> 読み込んだモデルが入る Future
+        self._lock = threading.RLock()
+
+    @property
+    def parallel(self):
+        """複数のスレッドから呼べば実際に並列に推論できるか"""
+        return self.backend.thread_safe
+
+    def backend_args(self):
+        """子プロセスで同じバックエンドを作るための (名前, 引数)。作れなければ None"""
+        return self.backend.process_args()
+
+    def get_model(self, model_name):
+        """
+        モデルを取得する。未読み込みならここで読み込んでプールに入れる
+        読み込みはロックの外で行うので、大きなモデルを読み込んでいる間も読み込み済みのモデルはすぐに使える。
+        同じモデルを同時に求めたスレッドは、最初のスレッドの読み込みが終わるのを待つ
+        """
+        from concurrent.futures import Future
+
+        with self._lock:
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                return self._models[model_name]
+            loading = self._loading.get(model_name)
+            owner = loading is None
+            if owner:
+                loading = self._loading[model_name] = Future()
+        if not owner:
+            return loading.result()
+
+        try:
+            print(f"📦 モデル読み込み中: {model_name}")
+            with profiler.stage("model_load", model=model_name):
+                model = self.backend.load_model(model_name)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(model_name, None)
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            self._loading.pop(model_name, None)
+            self._models[model_name] = model
+            self._models.move_to_end(model_name)
+            while len(self._models) > self.max_models:
+                evicted, _ = self._models.popitem(last=False)
+                print(f"🗑️ モデルを解放しました: {evicted}")
+        loading.set_result(model)
+        return model
+
+    def preload(self, model_name):
+        """
+        モデルを事前に読み込む（GUI起動時などに使う）
+        :return: 成功ならTrue, 失敗ならFalse
+        """
+        try:
+            self.get_model(model_name)
+            return True
+        except Exception as e:
+            print(f"❌ モデル読み込みエラー: {e}")
+            return False
+
+    def preload_async(self, model_name):
+        """別スレッドでモデルを事前に読み込む。開始したスレッドを返す"""
+        thread = threading.Thread(target=self.preload, args=(model_name,), daemon=True)
+        thread.start()
+        return thread
+
+    def is_loaded(self, model_name):
+        with self._lock:
+            return model_name in self._models
+
+    def loaded_models(self):
+        """読み込み済みモデル名のリスト（古い順）"""
+        with self._lock:
+            return list(self._models.keys())
+
+    def unload(self, model_name=None):
+        """指定したモデル（省略時はすべて）をプールから外す"""
+        with self._lock:
+            if model_name is None:
+                self._models.clear()
+            else:
+                self._models.pop(model_name, None)
+
+    def transcribe(self, audio, model_name, **options):
+        """
+        常駐モデルで推論する
+        :param audio: 16kHz モノラル float32 の Numpy配列 または AudioBuffer (バックエンドに渡す直前に float32 にする)
+        :param model_name: 使用するWhisperモデル名
+        :return: バックエンドが返した結果の辞書
+        """
+        model = self.get_model(model_name)
+        with profiler.stage("inference", model=model_name, seconds=len(audio) / 16000):
+            return self.backend.transcribe(model_name, model, model_input(audio), **options)
+
+    def transcribe_batch(self, audios, model_name, **options):
+        """
+        短い音声 (30秒以下) をまとめて1回で推論する
+        :param audios: 16kHz モノラル float32 の Numpy配列 または AudioBuffer のリスト
+        :return: 結果の辞書のリスト (audios と同じ順)
+        """
+        model = self.get_model(model_name)
+        seconds = sum(len(audio) for audio in audios) / 16000
+        with profiler.stage("inference", model=model_name, seconds=seconds, batch=len(audios)):
+            return self.backend.transcribe_batch(model_name, model, [model_input(audio) for audio in audios],
+                                                 **options)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """アプリ全体で共有する TranscriptionEngine を返す（初回呼び出し時に作成）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            config = get_settings()
+            _engine = TranscriptionEngine(max_models=config.get("max_loaded_models", 2))
+        return _engine
+
+def set_engine(engine):
+    """共有エンジンを差し替える（テストで FakeBackend を使うときなど）"""
+    global _engine
+    with _engine_lock:
+        _engine = engine
+
+# まとめて推論する音声の長さの上限 (Whisper の入力窓1つ分)
+BATCH_CLIP_SEC = 30.0
+
+
+class BatchTranscriber:
+    """
+    複数のスレッドから投入された短い音声を集め、まとめて1回で推論するクラス
+    最初の音声が届いてから max_wait_ms 待つか max_batch_size 個集まったら、同じモデル・オプションのものを一括で推論する
+    """
+
+    def __init__(self, engine, max_batch_size=8, max_wait_ms=50):
+        """
+        :param engine: 推論に使う TranscriptionEngine
+        :param max_batch_size: 1回にまとめる音声の数の上限
+        :param max_wait_ms: 他の音声が届くのを待つ最大時間（ミリ秒）
+        """
+        self.engine = engine
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000)
+        self.batch_sizes = []   # 実行したバッチの大きさ (統計用)
+        # (モデル名, オプション) ごとの待ち行列: キー -> [モデル名, オプション, [(音声, Future), ...], 最初の到着時刻]
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, audio, model_name, **options):
+        """
+        音声を推論待ちに入れる。30秒を超える音声はまとめずにその場で推論する
+        :return: 結果の辞書が入る concurrent.futures.Future
+        """
+        from concurrent.futures import Future
+
+        future = Future()
+        if len(audio) > BATCH_CLIP_SEC * 16000:
+            try:
+                future.set_result(self.engine.transcribe(audio, model_name, **options))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        key = json.dumps([model_name, options], sort_keys=True, default=_json_default)
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = [model_name, options, [], time.monotonic()]
+            entry[2].append((audio, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="batch-transcriber", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return future
+
+    def transcribe(self, audio, model_name, **options):
+        """submit() して結果を待つ"""
+        return self.submit(audio, model_name, **options).result()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # 一番先に届いた音声のグループから、締め切りまで待って集める
+            key, entry = next(iter(self._pending.items()))
+            model_name, options, items, arrived = entry
+            deadline = arrived + self.max_wait
+            while len(items) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = items[:self.max_batch_size]
+            del items[:self.max_batch_size]
+            if not items:
+                del self._pending[key]
+            return model_name, options, batch
+
+    def _run(self):
+        while True:
+            model_name, options, batch = self._next_batch()
+            batch = [(audio, future) for audio, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batch_sizes.append(len(batch))
+            try:
+                results = self.engine.transcribe_batch([audio for audio, _ in batch], model_name, **options)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """
+    共有エンジンで推論する BatchTranscriber を返す（初回呼び出し時に作成）
+    設定の batch_max_size が1以下ならまとめて推論しないので None を返す
+    """
+    global _batcher
+    engine = get_engine()
+    with _batcher_lock:
+        if _batcher is None or _batcher.engine is not engine:
+            config = get_settings()
+            if int(config.get("batch_max_size", 1)) <= 1:
+                return None
+            _batcher = BatchTranscriber(
+                engine,
+                max_batch_size=config.get("batch_max_size", 1),
+                max_wait_ms=config.get("batch_max_wait_ms", 50),
+            )
+        return _batcher
+
+def set_batcher(batcher):
+    """共有の BatchTranscriber を差し替える（None を渡すと次回 get_batcher() で作り直す）"""
+    global _batcher
+    with _batcher_lock:
+        _batcher = batcher
+
+# ==========================================
+# 4. WAV読み込み（メモリマップ）
+# ==========================================
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (フォーマット, ビット数) -> (Numpyのdtype, float32に変換するときの倍率)
+_PCM_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): ('u1', 1.0 / 128.0),
+    (WAVE_FORMAT_PCM, 16): ('<i2', 1.0 / 32768.0),
+    (WAVE_FORMAT_PCM, 32): ('<i4', 1.0 / 2147483648.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): ('<f4', 1.0),
+}
+
+def read_wav_header(file_path):
+    """
+    WAVファイルのチャンクをたどり、fmt情報とdataチャンクの位置を調べる
+    :return: (フォーマット, チャンネル数, サンプリングレート, ビット数, dataの開始位置, dataのバイト数)
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"WAVファイルではありません: {file_path}")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"dataチャンクが見つかりません: {file_path}")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+            if chunk_id == b'fmt ':
+                body = f.read(chunk_size)
+                audio_format, channels, rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # 拡張形式の場合はサブフォーマットGUIDの先頭2バイトが実際の形式
+                    audio_format = struct.unpack('<H', body[24:26])[0]
+                fmt = (audio_format, channels, rate, bits)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"fmtチャンクがdataより後にあります: {file_path}")
+                offset = f.tell()
+                # 録音中のファイルやパイプ出力ではサイズが不正な値のことがあるので実サイズで切る
+                data_size = min(chunk_size, file_size - offset)
+                return fmt + (offset, data_size)
+            else:
+                # 奇数サイズのチャンクは1バイトのパディングが入る
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+def read_wav_pcm(file_path):
+    """
+    WAVのPCMデータ部分をコピーせずにメモリマップで読み込む
+    :param file_path: WAVファイルパス
+    :return: ((フレーム数, チャンネル数) の読み取り専用配列, サンプリングレート, float32変換の倍率)
+    """
+    audio_format, channels, rate, bits, offset, data_size = read_wav_header(file_path)
+    if (audio_format, bits) not in _PCM_DTYPES:
+        raise ValueError(f"未対応のWAV形式です (format={audio_format}, bits={bits})")
+    dtype, scale = _PCM_DTYPES[(audio_format, bits)]
+    dtype = np.dtype(dtype)
+
+    frames = data_size // (dtype.itemsize * channels)
+    if frames == 0:
+        return np.zeros((0, channels), dtype=dtype), rate, scale
+    pcm = np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=(frames, channels))
+    return pcm, rate, scale
+
+def read_pcm(file_path):
+    """
+    WAV・アーカイブ (.apcm)・スライスの参照 (.clip) のどれでも PCM を読み込む
+    WAV はメモリマップ、アーカイブは展開した配列を返す
+    :return: ((フレーム数, チャンネル数) の配列, サンプリングレート, float32変換の倍率)
+    """
+    import audio_archive
+
+    if file_path.endswith(audio_archive.CLIP_EXT):
+        return read_range(file_path)
+    if file_path.endswith(audio_archive.ARCHIVE_EXT):
+        with audio_archive.ArchiveReader(file_path) as reader:
+            return reader.read(), reader.rate, 1.0 / 32768.0
+    return read_wav_pcm(file_path)
+
+def read_range(file_path, start_sec=0.0, end_sec=None):
+    """
+    指定した区間だけを読み込む。ファイル全体は展開せず、必要な位置に直接シークする
+    :param file_path: WAV・アーカイブ (.apcm)・スライスの参照 (.clip)
+    :param start_sec: 開始位置（秒）
+    :param end_sec: 終了位置（秒）。None なら最後まで
+    :return: ((フレーム数, チャンネル数) の配列, サンプリングレート, float32変換の倍率)
+    """
+    import audio_archive
+
+    def to_frame(sec, rate, default):
+        return default if sec is None else max(0, int(round(sec * rate)))
+
+    with profiler.stage("range_read"):
+        if file_path.endswith(audio_archive.CLIP_EXT):
+            # 参照の区間の中に収まるように、元のファイルでの位置に直して読む
+            source, clip_start, clip_end = audio_archive.read_clip_info(file_path)
+            rate = read_range(source, 0.0, 0.0)[1]
+            start = min(clip_start + to_frame(start_sec, rate, 0), clip_end)
+            end = min(clip_start + to_frame(end_sec, rate, clip_end - clip_start), clip_end)
+            return read_range(source, start / rate, max(start, end) / rate)
+        if file_path.endswith(audio_archive.ARCHIVE_EXT):
+            with audio_archive.ArchiveReader(file_path) as reader:
+                start = to_frame(start_sec, reader.rate, 0)
+                return reader.read(start, to_frame(end_sec, reader.rate, reader.frames)), reader.rate, 1.0 / 32768.0
+        pcm, rate, scale = read_wav_pcm(file_path)
+        start = to_frame(start_sec, rate, 0)
+        return pcm[start:max(start, to_frame(end_sec, rate, len(pcm)))], rate, scale
+
+def write_wav_pcm(file_path, pcm, rate):
+    """
+    PCM 配列をそのまま WAV ファイルに書き出す（再エンコードしない）
+    :param file_path: 保存先
+    :param pcm: (フレーム数, チャンネル数) または1次元の PCM 配列
+    :param rate: サンプリングレート
+    """
+    pcm = np.asarray(pcm)
+    channels = pcm.shape[1] if pcm.ndim == 2 else 1
+    audio_format = WAVE_FORMAT_IEEE_FLOAT if pcm.dtype.kind == 'f' else WAVE_FORMAT_PCM
+    width = pcm.dtype.itemsize
+    data_size = pcm.size * width
+    with profiler.stage("export"), open(file_path, 'wb') as f:
+        f.write(struct.pack('<4sI4s', b'RIFF', 36 + data_size, b'WAVE'))
+        f.write(struct.pack('<4sIHHIIHH', b'fmt ', 16, audio_format, channels, rate,
+                            rate * channels * width, channels * width, width * 8))
+        f.write(struct.pack('<4sI', b'data', data_size))
+        f.write(np.ascontiguousarray(pcm, dtype=pcm.dtype.newbyteorder('<')).tobytes())
+
+def load_wav(file_path):
+    """
+    WAVファイル (またはアーカイブ・スライスの参照) を読み込み、モノラルの float32 配列に変換する
+    ダウンミックスと float32 への変換はそれぞれ1回のベクトル演算で行い、余計なコピーを作らない
+    :param file_path: WAVファイルパス (.apcm / .clip も可)
+    :return: (-1.0〜1.0 の float32 配列, サンプリングレート)
+    """
+    with profiler.stage("wav_decode"):
+        pcm, rate, scale = read_pcm(file_path)
+
+    with profiler.stage("float_conversion"):
+        if pcm.dtype == np.uint8:
+            # 8bit WAV は符号なし (無音 = 128)
+            pcm = pcm.astype(np.int16) - 128
+
+        if pcm.shape[1] == 1:
+            audio = np.multiply(pcm[:, 0], np.float32(scale), dtype=np.float32)
+        else:
+            audio = np.mean(pcm, axis=1, dtype=np.float32)
+            audio *= np.float32(scale)
+    return audio, rate
+
+# 変換・ダウンミックス・リサンプリングで一度に処理するフレーム数 (作業用の一時配列の大きさ)
+CONVERT_CHUNK_FRAMES = 1 << 18
+
+class AudioBuffer:
+    """
+    int16 の PCM とサンプリングレート・チャンネル数だけを持つ音声バッファ
+    float32 の配列の半分のメモリで済む。切り出し (buf[a:b]) はコピーせずビューを返し、
+    float32 への変換は to_float32() で必要な範囲だけ行う (モデルに渡す直前の model_input() など)
+    """
+    __slots__ = ('pcm', 'rate', 'channels')
+
+    SCALE = 1.0 / 32768.0
+
+    def __init__(self, pcm, rate, channels=None):
+        """
+        :param pcm: int16 の配列。モノラルなら1次元、複数チャンネルなら (フレーム数, チャンネル数)
+        :param rate: サンプリングレート
+        :param channels: チャンネル数 (省略時は pcm の形から決める)
+        """
+        pcm = np.asarray(pcm)
+        if pcm.dtype != np.int16:
+            raise TypeError(f"AudioBuffer の PCM は int16 にしてください (dtype={pcm.dtype})")
+        if pcm.ndim == 2 and pcm.shape[1] == 1:
+            pcm = pcm[:, 0]
+        self.pcm = pcm
+        self.rate = int(rate)
+        self.channels = channels if channels is not None else (pcm.shape[1] if pcm.ndim == 2 else 1)
+
+    @classmethod
+    def from_pcm(cls, pcm, rate, scale):
+        """
+        read_pcm() の戻り値から作る。16bit の PCM (WAV のメモリマップなど) はコピーせずにそのまま使う
+        それ以外の形式 (8bit / 32bit / float) は区切りながら int16 に変換する
+        """
+        if pcm.dtype == np.int16:
+            return cls(pcm, rate)
+        out = np.empty(pcm.shape, dtype=np.int16)
+        factor = np.float32(scale * 32768.0)
+        for start in range(0, len(pcm), CONVERT_CHUNK_FRAMES):
+            part = pcm[start:start + CONVERT_CHUNK_FRAMES]
+            if part.dtype == np.uint8:
+                # 8bit WAV は符号なし (無音 = 128)
+                part = part.astype(np.int16) - 128
+            part = np.multiply(part, factor, dtype=np.float32)
+            out[start:start + len(part)] = np.clip(np.rint(part, out=part), -32768, 32767, out=part)
+        return cls(out, rate)
+
+    @classmethod
+    def from_float32(cls, audio, rate):
+        """-1.0〜1.0 の float32 配列 (録音・ストリーミングの音声など) から作る"""
+        audio = np.asarray(audio)
+        out = np.empty(audio.shape, dtype=np.int16)
+        for start in range(0, len(audio), CONVERT_CHUNK_FRAMES):
+            part = np.multiply(audio[start:start + CONVERT_CHUNK_FRAMES], np.float32(32768.0), dtype=np.float32)
+            out[start:start + len(part)] = np.clip(np.rint(part, out=part), -32768, 32767, out=part)
+        return cls(out, rate)
+
+    @classmethod
+    def load(cls, file_path):
+        """WAV・アーカイブ (.apcm)・スライスの参照 (.clip) を読み込む"""
+        return cls.from_pcm(*read_pcm(file_path))
+
+    def __len__(self):
+        return len(self.pcm)
+
+    def __getitem__(self, key):
+        """フレームの範囲 (スライス) を指定すると、同じメモリを指す AudioBuffer を返す"""
+        if not isinstance(key, slice):
+            raise TypeError("AudioBuffer はスライスで切り出してください")
+        return AudioBuffer(self.pcm[key], self.rate, self.channels)
+
+    def __reduce__(self):
+        # プロセス間で受け渡すとき、メモリマップではなく中身の配列を送る
+        return AudioBuffer, (np.ascontiguousarray(self.pcm), self.rate, self.channels)
+
+    def __repr__(self):
+        return f"AudioBuffer({self.duration:.2f}秒, {self.rate}Hz, {self.channels}ch)"
+
+    @property
+    def duration(self):
+        return len(self.pcm) / self.rate if self.rate else 0.0
+
+    @property
+    def nbytes(self):
+        return self.pcm.nbytes
+
+    def mono(self):
+        """モノラルにする。元がモノラルならそのまま返す"""
+        if self.channels == 1:
+            return self
+        out = np.empty(len(self.pcm), dtype=np.int16)
+        for start in range(0, len(self.pcm), CONVERT_CHUNK_FRAMES):
+            part = np.mean(self.pcm[start:start + CONVERT_CHUNK_FRAMES], axis=1, dtype=np.float32)
+            out[start:start + len(part)] = np.rint(part, out=part)
+        return AudioBuffer(out, self.rate)
+
+    def resample(self, rate, block_size=None):
+        """
+        モノラルにしながらサンプリングレートを変換する。元と同じレートなら mono() と同じ
+        入力は区切ってダウンミックスとリサンプリングを行うので、元のレートのモノラルの配列も
+        float32 の配列全体も作らない (作業用のメモリは1ブロック分で済む)
+        """
+        if rate == self.rate:
+            return self.mono()
+        converter = resampler.PolyphaseResampler(self.rate, rate, block_size or resampler.DEFAULT_BLOCK_SIZE)
+        out = np.empty(converter.output_length(len(self.pcm)), dtype=np.int16)
+        in_block = max(1, converter.block_size * converter.down // converter.up)
+        pos = 0
+        for start in range(0, len(self.pcm), in_block):
+            part = self.pcm[start:start + in_block]
+            if self.channels > 1:
+                part = np.mean(part, axis=1, dtype=np.float32)
+            part = converter.process(part)
+            out[pos:pos + len(part)] = np.clip(np.rint(part, out=part), -32768, 32767, out=part)
+            pos += len(part)
+        part = converter.flush()
+        out[pos:pos + len(part)] = np.clip(np.rint(part, out=part), -32768, 32767, out=part)
+        return AudioBuffer(out, rate)
+
+    def to_float32(self, start=0, end=None, out=None):
+        """
+        指定したフレームの範囲だけを -1.0〜1.0 の float32 に変換する
+        :param out: 書き込み先の配列 (共有メモリなど)。省略時は新しく作る
+        """
+        return np.multiply(self.pcm[start:end], np.float32(self.SCALE), out=out, dtype=np.float32)
+
+def float_range(audio, start=0, end=None):
+    """AudioBuffer でも float32 の配列でも、指定した範囲だけを float32 で返す"""
+    if isinstance(audio, AudioBuffer):
+        return audio.to_float32(start, end)
+    return np.asarray(audio[start:end], dtype=np.float32)
+
+def model_input(audio):
+    """モデルに渡す 16kHz モノラル float32 の配列にする。AudioBuffer はここで初めて float32 に変換する"""
+    if isinstance(audio, AudioBuffer):
+        return audio.mono().to_float32()
+    return audio
+
+# ==========================================
+# 5. 文字起こしキャッシュ
+# ==========================================
+def _json_default(obj):
+    """Numpy の数値なども JSON に保存できるようにする"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+class TranscriptCache:
+    """
+    文字起こし結果をディスクに保存するキャッシュ
+    キーは「デコードしたPCMのハッシュ + モデル名 + デコードオプション」。
+    合計サイズが上限を超えたら、最後に使われたのが古いものから削除する (LRU)。
+    """
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024):
+        """
+        :param cache_dir: 保存先ディレクトリ
+        :param max_bytes: キャッシュ全体の上限サイズ（バイト）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(pcm, rate, model_name, options=None):
+        """
+        :param pcm: read_wav_pcm() が返した PCM 配列 または AudioBuffer
+        :param rate: サンプリングレート
+        :param model_name: モデル名
+        :param options: デコードオプションの辞書
+        :return: キー文字列 (16進数)
+        """
+        if isinstance(pcm, AudioBuffer):
+            # モノラルでも (フレーム数, 1) の配列と同じキーになる
+            pcm = pcm.pcm
+        h = hashlib.blake2b(digest_size=20)
+        h.update(json.dumps({
+            "rate": rate,
+            "channels": pcm.shape[1] if pcm.ndim == 2 else 1,
+            "dtype": pcm.dtype.str,
+            "model_name": model_name,
+            "options": options or {},
+        }, sort_keys=True, default=_json_default).encode('utf-8'))
+        h.update(np.ascontiguousarray(pcm).data)
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """キャッシュにあれば結果の辞書を返し、なければ None を返す"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # 最終アクセス時刻を更新しておき、LRU の順番に使う
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, result):
+        """
+        結果を保存する。一時ファイルに書いてから置き換えるので、途中で落ちても壊れたファイルは残らない
+        :return: 成功ならTrue, 失敗ならFalse
+        """
+        entry = {k: result[k] for k in ('text', 'segments', 'language') if k in result}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, default=_json_default)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            print(f"⚠️ キャッシュ保存エラー: {e}")
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        """合計サイズが上限を下回るまで、古いエントリーから削除する"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                os.remove(entry.path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """設定に従って共有の TranscriptCache を返す。キャッシュが無効なら None"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = get_settings()
+            if not config.get("cache_enabled", True):
+                return None
+            _cache = TranscriptCache(
+                config.get("cache_dir", "transcript_cache"),
+                int(config.get("cache_max_mb", 200)) * 1024 * 1024,
+            )
+        return _cache
+
+def set_cache(cache):
+    """共有キャッシュを差し替える（None を渡すと次回 get_cache() で作り直す）"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+# ==========================================
+# 6. 文字起こし機能
+# ==========================================
+def preprocess_audio(sound):
+    """Whisper用に音声を前処理する内部関数"""
+    if sound.sample_width != 2:
+        sound = sound.set_sample_width(2)
+    if sound.channels != 1:
+        sound = sound.set_channels(1)
+    if sound.frame_rate != 16000:
+        # レート変換は pydub (audioop) ではなく Numpy のポリフェーズリサンプラーで行う
+        # raw_data はコピーせずに int16 のまま読み、float32 の配列全体は作らない
+        audio = AudioBuffer(np.frombuffer(sound.raw_data, dtype='<i2'), sound.frame_rate)
+        with profiler.stage("resample", src_rate=sound.frame_rate):
+            pcm = audio.resample(16000).pcm
+        sound = sound._spawn(pcm.tobytes(), overrides={'frame_rate': 16000})
+    return sound
+
+def load_audio_for_model(file_path):
+    """
+    WAVを読み込み、モデルに渡せる 16kHz モノラルの AudioBuffer (int16) にする
+    16bit の WAV はメモリマップのまま読み、float32 への変換はモデルに渡すときまで行わない
+    :return: (AudioBuffer, {'decode': 秒, 'resample': 秒})
+    """
+    start = time.perf_counter()
+    with profiler.stage("wav_decode"):
+        audio = AudioBuffer.load(file_path)
+    decoded = time.perf_counter()
+    with profiler.stage("resample", src_rate=audio.rate):
+        audio = audio.resample(16000)
+    return audio, {'decode': decoded - start, 'resample': time.perf_counter() - decoded}
+
+def transcribe_chunked(arr, model_name, engine=None, workers=2, chunk_sec=30.0, overlap_sec=2.0, **options):
+    """
+    長い音声を無音の位置で区切り、重なりを持たせたチャンクを並列に文字起こししてつなげる
+    :param arr: 16kHz モノラル float32 の Numpy配列 または AudioBuffer
+    :param model_name: 使用するWhisperモデル名
+    :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+    :param workers: 同時に推論する数。同じプロセスでは1つずつしか推論できないバックエンド (MLX) なら、
+                    workers 個の子プロセス (process_engine.borrow_pool) で推論する。モデルは子プロセスごとに読み込む
+    :param chunk_sec: チャンクの長さの目安（秒）
+    :param overlap_sec: 隣のチャンクと重ねる長さ（秒）
+    :return: {'text', 'segments', 'chunks'} の辞書。セグメントの時刻は元の音声での位置
+    """
+    from contextlib import nullcontext
+    from concurrent.futures import ThreadPoolExecutor
+
+    if engine is None:
+        engine = get_engine()
+    workers = max(1, int(workers))
+    session = nullcontext(engine)
+    if workers > 1 and not engine.parallel and engine.backend_args() is not None:
+        # スレッドを増やしても推論は1つずつになるので、モデルを持った子プロセスに振り分ける
+        # (プールは推論が終わるまで借りておき、その間に設定が変わっても閉じられないようにする)
+        import process_engine
+        backend, backend_options = engine.backend_args()
+        session = process_engine.borrow_pool(workers, backend, backend_options, max_models=engine.max_models)
+
+    # チャンクの境界 (区切り位置) は無音の位置に寄せ、前後に overlap_sec/2 ずつ広げて切り出す
+    cores = plan_slices(arr, 16000, interval_ms=chunk_sec * 1000, on_silence=True)
+    half = int(overlap_sec * 16000 / 2)
+    chunks = [(max(0, a - half), min(len(arr), b + half)) for a, b in cores]
+
+    with session as runner, ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda chunk: runner.transcribe(arr[chunk[0]:chunk[1]], model_name, **options),
+                                chunks))
+
+    # 重なり部分は、セグメントの中央がどちらのチャンクの担当範囲にあるかで片方だけ残す
+    segments = []
+    text = ""
+    for (core_start, core_end), (chunk_start, _), result in zip(cores, chunks, results):
+        offset = chunk_start / 16000
+        first_in_chunk = True
+        for seg in result.get('segments', []):
+            seg = dict(seg, start=seg['start'] + offset, end=seg['end'] + offset)
+            middle = (seg['start'] + seg['end']) / 2
+            if not core_start / 16000 <= middle < core_end / 16000:
+                continue
+            seg['id'] = len(segments)
+            segments.append(seg)
+            if first_in_chunk:
+                # チャンクの境目で切れたセグメントの文字が前後で重複していれば1回分にする
+                text = merge_overlap_text(text, seg.get('text', ''))
+                first_in_chunk = False
+            else:
+                text += seg.get('text', '')
+    return {'text': text.strip(), 'segments': segments, 'chunks': len(chunks)}
+
+def transcribe_clips(clips, model_name, engine=None, **options):
+    """
+    複数の短い音声をまとめて推論する
+    共有エンジンを使うときは BatchTranscriber に投入するので、他のスレッドから同時に届いた音声とも一緒に推論される
+    :param clips: 16kHz モノラル float32 の Numpy配列 または AudioBuffer のリスト
+    :param model_name: 使用するWhisperモデル名
+    :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+    :return: 結果の辞書のリスト (clips と同じ順)
+    """
+    if engine is None:
+        engine = get_engine()
+    batcher = get_batcher()
+    if batcher is not None and batcher.engine is engine:
+        with profiler.stage("batch_wait", clips=len(clips)):
+            futures = [batcher.submit(clip, model_name, **options) for clip in clips]
+            return [dict(future.result()) for future in futures]
+
+    # 共有エンジン以外 (テストなど) はこの呼び出しの中の音声だけをまとめる
+    max_batch_size = max(1, int(get_settings().get("batch_max_size", 1)))
+    results = [None] * len(clips)
+    short = []
+    for k, clip in enumerate(clips):
+        if len(clip) > BATCH_CLIP_SEC * 16000:
+            results[k] = dict(engine.transcribe(clip, model_name, **options))
+        else:
+            short.append(k)
+    for start in range(0, len(short), max_batch_size):
+        indices = short[start:start + max_batch_size]
+        if len(indices) == 1:
+            batch_results = [engine.transcribe(clips[indices[0]], model_name, **options)]
+        else:
+            batch_results = engine.transcribe_batch([clips[k] for k in indices], model_name, **options)
+        for k, result in zip(indices, batch_results):
+            results[k] = dict(result)
+    return results
+
+# ---- 小さいモデルから順に試すカスケード ----
+# まず小さく速いモデルで推論し、確信度の低いセグメントだけを次の (大きい) モデルでやり直す。
+# 確信度は Whisper がセグメントごとに返す平均対数確率・無音確率・圧縮率で判断する。
+_model_speed = {}   # モデル名 -> 音声1秒あたりの推論時間（秒）の移動平均 (短縮できた時間の見積もりに使う)
+_model_speed_lock = threading.Lock()
+
+def cascade_models(config=None):
+    """設定でカスケードが有効なら、試す順のモデル名のリストを返す。無効なら None"""
+    if config is None:
+        config = get_settings()
+    models = list(config.get("cascade_models") or [])
+    if not config.get("cascade_enabled", False) or len(models) < 2:
+        return None
+    return models
+
+def cascade_thresholds(config=None):
+    """やり直すかどうかを決める閾値の辞書"""
+    if config is None:
+        config = get_settings()
+    return {
+        'min_avg_logprob': config.get("cascade_min_avg_logprob", -1.0),
+        'max_no_speech_prob': config.get("cascade_max_no_speech_prob", 0.6),
+        'max_compression_ratio': config.get("cascade_max_compression_ratio", 2.4),
+    }
+
+def needs_escalation(segment, thresholds):
+    """
+    セグメントを大きいモデルでやり直すべきか
+    平均対数確率が低い、または圧縮率が高い (同じ言葉の繰り返し) ときにやり直す。
+    ただし無音確率も高いものは Whisper と同じく無音とみなし、やり直さない
+    確信度の値を返さないバックエンドのセグメントはやり直さない
+    """
+    logprob = segment.get('avg_logprob')
+    no_speech = segment.get('no_speech_prob')
+    ratio = segment.get('compression_ratio')
+    low_logprob = logprob is not None and logprob < thresholds['min_avg_logprob']
+    if low_logprob and no_speech is not None and no_speech > thresholds['max_no_speech_prob']:
+        return False
+    return low_logprob or (ratio is not None and ratio > thresholds['max_compression_ratio'])
+
+def _timed_clips(clips, model_name, engine, **options):
+    """transcribe_clips() を実行し、モデルの速さの見積もりを更新する"""
+    start = time.perf_counter()
+    results = transcribe_clips(clips, model_name, engine, **options)
+    elapsed = time.perf_counter() - start
+    seconds = sum(len(clip) for clip in clips) / 16000
+    if seconds > 0:
+        with _model_speed_lock:
+            previous = _model_speed.get(model_name)
+            speed = elapsed / seconds
+            _model_speed[model_name] = speed if previous is None else 0.7 * previous + 0.3 * speed
+    return results, elapsed
+
+def transcribe_cascade(clips, models, engine=None, thresholds=None, **options):
+    """
+    複数の音声を小さいモデルから順に文字起こしし、確信度の低いセグメントだけを次のモデルでやり直す
+    続けて確信度が低いセグメントは1つにまとめて切り出し、同じモデルの分はまとめて推論する
+    :param clips: 16kHz モノラル float32 の Numpy配列 または AudioBuffer のリスト
+    :param models: 試す順のモデル名のリスト (小さいモデルから)
+    :param thresholds: cascade_thresholds() の形式の辞書 (省略時は設定の値)
+    :return: (結果の辞書のリスト, 報告の辞書)。セグメントには推論したモデル名 'model' が付く。
+             報告は {'models', 'segments', 'escalated' (モデルごとのやり直した数), 'escalation_rate',
+             'audio_sec', 'inference_sec', 'baseline_sec' (最後のモデルだけで推論した場合の見積もり),
+             'time_saved_sec'} (見積もれない値は None)
+    """
+    if engine is None:
+        engine = get_engine()
+    if thresholds is None:
+        thresholds = cascade_thresholds()
+
+    with profiler.stage("cascade", model=models[0], clips=len(clips)):
+        results, elapsed = _timed_clips(clips, models[0], engine, **options)
+    results = [dict(result, segments=[dict(seg, model=models[0]) for seg in result.get('segments', [])])
+               for result in results]
+    first_pass = sum(len(result['segments']) for result in results)
+    escalated = {}
+
+    for previous, model in zip(models, models[1:]):
+        # 前のモデルが出した確信度の低いセグメントのうち、続いているものを1つの区間にまとめる
+        runs = []   # (音声の番号, 最初のセグメント, 最後のセグメント+1)
+        for k, result in enumerate(results):
+            flags = [seg['model'] == previous and needs_escalation(seg, thresholds) for seg in result['segments']]
+            i = 0
+            while i < len(flags):
+                if not flags[i]:
+                    i += 1
+                    continue
+                j = i
+                while j < len(flags) and flags[j]:
+                    j += 1
+                runs.append((k, i, j))
+                i = j
+        if not runs:
+            break
+
+        spans = [(int(results[k]['segments'][i]['start'] * 16000), int(results[k]['segments'][j - 1]['end'] * 16000))
+                 for k, i, j in runs]
+        sub_clips = [clips[k][start:end] for (k, _, _), (start, end) in zip(runs, spans)]
+        with profiler.stage("cascade", model=model, clips=len(sub_clips)):
+            sub_results, sub_elapsed = _timed_clips(sub_clips, model, engine, **options)
+        elapsed += sub_elapsed
+        escalated[model] = sum(j - i for _, i, j in runs)
+
+        # 後ろの区間から置き換えると、前の区間のセグメントの位置がずれない
+        for (k, i, j), (start, _), sub in reversed(list(zip(runs, spans, sub_results))):
+            offset = start / 16000
+            results[k]['segments'][i:j] = [dict(seg, start=seg['start'] + offset, end=seg['end'] + offset, model=model)
+                                           for seg in sub.get('segments', [])]
+
+    for result in results:
+        for n, seg in enumerate(result['segments']):
+            seg['id'] = n
+        result['text'] = "".join(seg.get('text', '') for seg in result['segments'])
+
+    audio_sec = sum(len(clip) for clip in clips) / 16000
+    with _model_speed_lock:
+        speed = _model_speed.get(models[-1])
+    baseline = audio_sec * speed if speed is not None else None
+    report = {
+        'models': list(models),
+        'segments': sum(len(result['segments']) for result in results),
+        'escalated': escalated,
+        # 2番目以降のモデルでやり直すのは、最初のモデルでやり直したセグメントの一部だけ
+        'escalation_rate': escalated.get(models[1], 0) / first_pass if first_pass else 0.0,
+        'audio_sec': audio_sec,
+        'inference_sec': elapsed,
+        'baseline_sec': baseline,
+        'time_saved_sec': baseline - elapsed if baseline is not None else None,
+    }
+    return results, report
+
+def describe_cascade(report):
+    """transcribe_cascade() の報告を1行にまとめる"""
+    escalated = ", ".join(f"{model.split('/')[-1]} {count}件" for model, count in report['escalated'].items())
+    line = f"やり直し {report['escalation_rate']:.0%} ({escalated or 'なし'}), 推論 {report['inference_sec']:.2f}秒"
+    if report.get('time_saved_sec') is not None:
+        line += f", 最後のモデルだけの場合より {report['time_saved_sec']:.2f}秒短縮 (見積もり)"
+    return line
+
+def transcribe_speech(arr, model_name, engine=None, chunked=False, workers=2, models=None, **options):
+    """
+    発話区間だけをモデルに渡して文字起こしする。無音だけの音声は推論しない
+    :param arr: 16kHz モノラル float32 の Numpy配列 または AudioBuffer
+    :param model_name: 使用するWhisperモデル名
+    :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+    :param chunked: Trueなら長い発話区間をチャンクに分けて並列に文字起こしする
+    :param workers: chunked=True のときの並列数
+    :param models: 指定するとこのモデルのリストでカスケードする (model_name と chunked は使わない)
+    :return: {'text', 'segments', 'speech', 'speech_ratio'} の辞書 (カスケードなら 'cascade' の報告も付く)。
+             セグメントの時刻は元の音声での位置、speech は発話区間 (開始秒, 終了秒) のリスト
+    """
+    if engine is None:
+        engine = get_engine()
+    with profiler.stage("vad"):
+        regions = detect_speech(arr, 16000)
+
+    report = None
+    if models:
+        results, report = transcribe_cascade([arr[start:end] for start, end in regions], models, engine, **options)
+    elif chunked:
+        results = [transcribe_chunked(arr[start:end], model_name, engine, workers=workers, **options)
+                   for start, end in regions]
+    else:
+        # 発話区間は短いことが多いので、まとめて推論する
+        results = transcribe_clips([arr[start:end] for start, end in regions], model_name, engine, **options)
+
+    segments = []
+    text = ""
+    for (start, end), result in zip(regions, results):
+        offset = start / 16000
+        for seg in result.get('segments', []):
+            segments.append(dict(seg, id=len(segments), start=seg['start'] + offset, end=seg['end'] + offset))
+        text += result.get('text', '')
+
+    speech_samples = sum(end - start for start, end in regions)
+    result = {
+        'text': text.strip(),
+        'segments': segments,
+        'speech': [(start / 16000, end / 16000) for start, end in regions],
+        'speech_ratio': speech_samples / len(arr) if len(arr) else 0.0,
+    }
+    if report is not None:
+        result['cascade'] = report
+    return result
+
+def transcribe_array(arr, model_name, engine=None, vad=None, chunked=False, workers=2, cascade=None, **options):
+    """
+    16kHz の配列を、設定に応じて VAD・チャンク分割・カスケードを使い分けて文字起こしする
+    :param vad: Trueなら発話区間だけを推論する (None なら設定の vad_enabled に従う)
+    :param cascade: モデル名のリストを渡すと、小さいモデルから順に試すカスケードで推論する
+                    (None なら設定の cascade_enabled / cascade_models に従う。False なら使わない)
+    :return: {'text', 'segments', ...} の辞書。カスケードなら 'cascade' に報告 (transcribe_cascade を参照)
+    """
+    if engine is None:
+        engine = get_engine()
+    if vad is None:
+        vad = get_settings().get("vad_enabled", False)
+    models = cascade_models() if cascade is None else (cascade or None)
+    if vad:
+        return transcribe_speech(arr, model_name, engine, chunked=chunked, workers=workers, models=models, **options)
+    if models:
+        results, report = transcribe_cascade([arr], models, engine, **options)
+        return dict(results[0], cascade=report)
+    if chunked:
+        return transcribe_chunked(arr, model_name, engine, workers=workers, **options)
+    return transcribe_clips([arr], model_name, engine, **options)[0]
+
+def transcribe_file(file_path, model_name="mlx-community/whisper-base-mlx", engine=None, use_cache=True,
+                    chunked=False, workers=2, vad=None, cascade=None, **options):
+    """
+    ファイルを文字起こしし、結果を辞書で返す関数（キャッシュを使う）
+    :param file_path: 文字起こしするファイルのパス
+    :param model_name: 使用するWhisperモデル名
+    :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+    :param use_cache: Falseならキャッシュを使わない
+    :param chunked: Trueなら長い音声をチャンクに分けて並列に文字起こしする
+    :param workers: chunked=True のときの並列数
+    :param vad: Trueなら発話区間だけを推論する (None なら設定の vad_enabled に従う)
+    :param cascade: カスケードで推論するモデル名のリスト (transcribe_array を参照)
+    :param options: バックエンドに渡すデコードオプション
+    :return: {'text', 'segments', 'cache': 'hit'/'miss'/'off', 'timings': {...}} の辞書
+    """
+    if vad is None:
+        vad = get_settings().get("vad_enabled", False)
+    cascade = cascade_models() if cascade is None else (cascade or False)
+    timings = {}
+    cache = get_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        start = time.perf_counter()
+        pcm, rate, _ = read_pcm(file_path)
+        key_options = dict(options)
+        if chunked:
+            key_options['chunked'] = True
+        if vad:
+            key_options['vad'] = True
+        if cascade:
+            key_options['cascade'] = [cascade, cascade_thresholds()]
+        key = TranscriptCache.make_key(pcm, rate, model_name, key_options)
+        cached = cache.get(key)
+        timings['lookup'] = time.perf_counter() - start
+        if cached is not None:
+            cached.update(cache='hit', timings=timings)
+            return cached
+
+    # 音声読み込みと前処理 (PCMをメモリマップし、16kHz モノラル float32 に変換)
+    arr, load_timings = load_audio_for_model(file_path)
+    timings.update(load_timings)
+
+    # 推論実行 (モデルは常駐エンジンから取得するので2回目以降は読み込まない)
+    if engine is None:
+        engine = get_engine()
+    start = time.perf_counter()
+    result = transcribe_array(arr, model_name, engine, vad=vad, chunked=chunked, workers=workers, cascade=cascade,
+                              **options)
+    timings['inference'] = time.perf_counter() - start
+    result['text'] = result.get('text', '').strip()
+
+    if cache is not None:
+        cache.put(key, result)
+    result.update(cache='miss' if cache is not None else 'off', timings=timings)
+    return result
+
+def transcribe_audio(file_path, model_name="mlx-community/whisper-base-mlx", engine=None, chunked=False, workers=2):
+    """
+    指定されたファイルを文字起こしする関数
+    :param file_path: 文字起こしするファイルのパス
+    :param model_name: 使用するWhisperモデル名
+    :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+    :param chunked: Trueなら長い音声をチャンクに分けて並列に文字起こしする
+    :param workers: chunked=True のときの並列数
+    :return: 文字起こしされたテキスト（文字列）。失敗時はエラーメッセージ。
+    """
+    if not os.path.exists(file_path):
+        return "エラー: ファイルが見つかりません"
+
+    print(f"📝 文字起こし中: {file_path}")
+    try:
+        result = transcribe_file(file_path, model_name, engine, chunked=chunked, workers=workers)
+        text = result['text']
+        mark = " (キャッシュ)" if result['cache'] == 'hit' else ""
+        print(f"✅ 完了{mark}: {text[:30]}...") # 冒頭だけログ出力
+        return text
+
+    except Exception as e:
+        print(f"❌ 文字起こしエラー: {e}")
+        return f"エラーが発生しました: {e}"
+
+def _load_uncached(file_path, model_name, key_options, cache_dir):
+    """
+    transcribe_many() のプロセスプールで1ファイルずつ実行する
+    キャッシュのキーを作り、キャッシュになかったときだけモデル用に読み込む
+    :param cache_dir: キャッシュのディレクトリ (None ならキャッシュを使わない)
+    :return: (キー, キャッシュの結果, AudioBuffer, 計測時間の辞書)。キャッシュにあれば音声は None
+    """
+    key = None
+    if cache_dir is not None:
+        pcm, rate, _ = read_pcm(file_path)
+        key = TranscriptCache.make_key(pcm, rate, model_name, key_options)
+        del pcm
+        cached = TranscriptCache(cache_dir).get(key)
+        if cached is not None:
+            return key, cached, None, {}
+    audio, timings = load_audio_for_model(file_path)
+    return key, None, audio, timings
+
+def transcribe_many(paths, model_name="mlx-community/whisper-base-mlx", workers=2, engine=None, use_cache=True,
+                    vad=None, cascade=None):
+    """
+    複数のファイルをまとめて文字起こしする関数
+    キャッシュのキーの計算・読み込み・リサンプリングはプロセスプールで先行して行い、その間にメインスレッドで推論する
+    :param paths: 文字起こしするファイルパスのリスト
+    :param model_name: 使用するWhisperモデル名
+    :param workers: 読み込みに使うプロセス数
+    :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+    :param use_cache: Falseならキャッシュを使わない
+    :param vad: Trueなら発話区間だけを推論する (None なら設定の vad_enabled に従う)
+    :param cascade: カスケードで推論するモデル名のリスト (transcribe_array を参照)
+    :return: (ファイルパス, テキスト, 計測時間の辞書) を完了した順に返すジェネレータ
+             計測時間は 'decode', 'resample', 'wait'(投入から推論開始まで), 'inference' の秒数と
+             キャッシュの結果 'cache' ('hit'/'miss'/'off')
+             失敗したファイルのテキストはエラーメッセージになる
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    if engine is None:
+        engine = get_engine()
+    if vad is None:
+        vad = get_settings().get("vad_enabled", False)
+    cascade = cascade_models() if cascade is None else (cascade or False)
+    key_options = {}
+    if vad:
+        key_options['vad'] = True
+    if cascade:
+        key_options['cascade'] = [cascade, cascade_thresholds()]
+    workers = max(1, int(workers))
+    cache = get_cache() if use_cache else None
+
+    pending_paths = []
+    for file_path in paths:
+        if not os.path.exists(file_path):
+            yield file_path, "エラー: ファイルが見つかりません", {}
+            continue
+        pending_paths.append(file_path)
+    # キャッシュのキーもプロセスプールで作る (最初のファイルの推論を、全ファイルのハッシュ計算の後まで待たせない)
+    cache_dir = cache.cache_dir if cache is not None else None
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}   # Future -> (ファイルパス, 投入時刻)
+
+        def submit_next():
+            # 読み込み済みの音声を溜め込みすぎないよう、先行するのはプロセス数+1件まで
+            while pending_paths and len(in_flight) < workers + 1:
+                file_path = pending_paths.pop(0)
+                future = pool.submit(_load_uncached, file_path, model_name, key_options or None, cache_dir)
+                in_flight[future] = (file_path, time.perf_counter())
+
+        submit_next()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, submitted = in_flight.pop(future)
+                # 推論している間も次のファイルの読み込みを進めておく
+                submit_next()
+                try:
+                    key, cached, arr, timings = future.result()
+                    if cached is not None:
+                        print(f"✅ 完了 (キャッシュ): {file_path}")
+                        yield file_path, cached.get('text', ''), {'cache': 'hit'}
+                        continue
+                    timings['wait'] = time.perf_counter() - submitted
+
+                    start = time.perf_counter()
+                    result = transcribe_array(arr, model_name, engine, vad=vad, cascade=cascade)
+                    timings['inference'] = time.perf_counter() - start
+                    text = result.get('text', '').strip()
+                    if cache is not None:
+                        cache.put(key, dict(result, text=text))
+                    timings['cache'] = 'miss' if cache is not None else 'off'
+                    print(f"✅ 完了: {file_path}: {text[:30]}...")
+                    yield file_path, text, timings
+                except Exception as e:
+                    print(f"❌ 文字起こしエラー: {file_path}: {e}")
+                    yield file_path, f"エラーが発生しました: {e}", {}
+
+# ==========================================
+# 7. ストリーミング録音・逐次文字起こし
+# ==========================================
+class RingBuffer:
+    """
+    一定サイズのリングバッファ (float32)
+    書き込んだ総サンプル数を数えておき、直近 capacity サンプルの任意の範囲を取り出せる
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=np.float32)
+        self.total_written = 0
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) > self.capacity:
+            self.total_written += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        pos = self.total_written % self.capacity
+        first = min(len(samples), self.capacity - pos)
+        self._data[pos:pos + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+        self.total_written += len(samples)
+
+    def read(self, start, end):
+        """
+        書き込み開始からの通し番号で [start, end) の範囲をコピーして返す
+        :raises ValueError: すでに上書きされた範囲を指定したとき
+        """
+        if start < self.total_written - self.capacity or end > self.total_written or start > end:
+            raise ValueError(f"範囲外です: [{start}, {end}) (書き込み済み {self.total_written})")
+        indices = np.arange(start, end) % self.capacity
+        return self._data[indices]
+
+
+def open_pcm_stream(source, duration=None, format='avfoundation', sample_rate=16000, realtime=False,
+                    sample_format='s16le'):
+    """
+    ffmpeg を起動し、標準出力にモノラル PCM を流す
+    :param source: 入力 (マイクなら ':0' などのデバイスID、テスト時はWAVファイルパス)
+    :param duration: 録音時間（秒）。None なら入力が終わるまで
+    :param format: 入力フォーマット (ファイル入力の場合は None)
+    :param sample_rate: 出力のサンプリングレート
+    :param realtime: Trueならファイル入力を実時間の速さで読む (マイクの代わりに使うとき)
+    :param sample_format: 出力の形式 ('s16le' なら16bit整数、'f32le' なら32bit浮動小数点)
+    :return: subprocess.Popen
+    """
+    return pcm_stream_spec(source, duration, format, sample_rate, realtime, sample_format).run_async(
+        pipe_stdout=True, pipe_stderr=True)
+
+def pcm_stream_spec(source, duration=None, format='avfoundation', sample_rate=16000, realtime=False,
+                    sample_format='s16le'):
+    """open_pcm_stream() が起動する ffmpeg の処理 (まだ起動しない)"""
+    input_kwargs = {}
+    if format:
+        input_kwargs['format'] = format
+    if duration:
+        input_kwargs['t'] = duration
+    if realtime:
+        input_kwargs['re'] = None
+    return (
+        ffmpeg
+        .input(source, **input_kwargs)
+        .output('pipe:', format=sample_format, acodec=f'pcm_{sample_format}', ar=sample_rate, ac=1)
+        .global_args('-loglevel', 'error', '-nostats')
+    )
+
+def iter_pcm_chunks(process, chunk_samples=1600):
+    """ffmpeg の標準出力から float32 の配列を少しずつ読み出すジェネレータ"""
+    chunk_bytes = chunk_samples * 2
+    leftover = b''
+    while True:
+        data = process.stdout.read(chunk_bytes)
+        if not data:
+            break
+        data = leftover + data
+        usable = len(data) - (len(data) % 2)
+        leftover = data[usable:]
+        if usable:
+            yield np.frombuffer(data[:usable], dtype='<i2').astype(np.float32) * np.float32(1.0 / 32768.0)
+
+def iter_windows(chunks, window_size, hop_size):
+    """
+    音声の断片を受け取り、一定長で重なりのある窓を順に返すジェネレータ
+    :param chunks: float32 配列を返すイテラブル
+    :param window_size: 窓の長さ（サンプル数）
+    :param hop_size: 窓をずらす幅（サンプル数）。window_size - hop_size が重なり
+    :return: (窓の開始サンプル位置, 窓の配列, 最後の窓かどうか) を返すジェネレータ。
+             最後は必ず「最後の窓」を返す (入力が窓の区切りちょうどで終わったときは、長さ0の窓)
+    """
+    ring = RingBuffer(window_size + hop_size)
+    next_end = window_size
+    emitted_end = 0   # 最後に返した窓の終わり
+    for chunk in chunks:
+        # リングバッファの余裕 (hop_size) を超えないよう小分けにして書き込む
+        for pos in range(0, len(chunk), hop_size):
+            ring.write(chunk[pos:pos + hop_size])
+            while ring.total_written >= next_end:
+                start = next_end - window_size
+                yield start, ring.read(start, next_end), False
+                emitted_end = next_end
+                next_end += hop_size
+
+    # まだ返していない末尾があれば、最後の窓として返す
+    if ring.total_written > emitted_end:
+        start = max(0, ring.total_written - window_size)
+        yield start, ring.read(start, ring.total_written), True
+    else:
+        # 末尾まで返し終えていても、終わったことが分かるよう長さ0の最後の窓を返す
+        yield ring.total_written, np.zeros(0, dtype=np.float32), True
+
+def merge_overlap_text(previous, new, min_overlap=2):
+    """
+    重なりのある窓の結果をつなぐ。previous の末尾と new の先頭で一致する部分を1回分にする
+    :return: つないだ文字列
+    """
+    if not previous:
+        return new
+    for length in range(min(len(previous), len(new)), min_overlap - 1, -1):
+        if previous.endswith(new[:length]):
+            return previous + new[length:]
+    return previous + new
+
+def stream_transcribe(source, model_name="mlx-community/whisper-base-mlx", duration=None,
+                      format='avfoundation', window_sec=10.0, overlap_sec=2.0,
+                      output_file=None, realtime=False, engine=None):
+    """
+    録音しながら一定長の窓ごとに文字起こしするジェネレータ
+    :param source: 入力デバイスID、またはテスト用のWAVファイルパス (format=None で指定)
+    :param model_name: 使用するWhisperモデル名
+    :param duration: 録音時間（秒）。None なら入力が終わるまで
+    :param format: 入力フォーマット (Macは'avfoundation'、ファイル入力なら None)
+    :param window_sec: 1回に文字起こしする長さ（秒）
+    :param overlap_sec: 前の窓と重ねる長さ（秒）
+    :param output_file: 指定すると録音した音声を 16kHz の WAV として保存する
+    :param realtime: Trueならファイル入力を実時間の速さで読む
+    :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+    :return: {'start', 'end', 'text', 'full_text', 'new_start', 'new_text', 'is_final'} の辞書を窓ごとに返すジェネレータ。
+             new_start / new_text は前の窓と重ならない部分 (前の窓の終わりから) と、full_text に新しく加わった文字列
+    """
+    import wave
+
+    if engine is None:
+        engine = get_engine()
+    window_size = int(window_sec * 16000)
+    hop_size = max(1, window_size - int(overlap_sec * 16000))
+
+    process = open_pcm_stream(source, duration=duration, format=format, realtime=realtime)
+    writer = peaks = None
+    if output_file:
+        writer = wave.open(output_file, 'wb')
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(16000)
+        peaks = waveform.PeakBuilder(16000)
+
+    def chunks():
+        for chunk in iter_pcm_chunks(process):
+            if writer is not None:
+                writer.writeframes(np.clip(np.rint(chunk * 32768.0), -32768, 32767).astype('<i2').tobytes())
+                peaks.append(chunk)
+            yield chunk
+
+    print(f"🎙️ ストリーミング録音を開始します: {source}")
+    full_text = ""
+    emitted_end = 0.0
+    try:
+        for start, window, is_final in iter_windows(chunks(), window_size, hop_size):
+            # 長さ0の最後の窓 (入力が窓の区切りちょうどで終わった) は推論せず、終わりだけを知らせる
+            result = engine.transcribe(window, model_name) if len(window) else {}
+            text = result.get('text', '').strip()
+            previous, full_text = full_text, merge_overlap_text(full_text, text)
+            end = (start + len(window)) / 16000
+            yield {
+                'start': start / 16000,
+                'end': end,
+                'text': text,
+                'full_text': full_text,
+                'new_start': max(start / 16000, emitted_end),
+                'new_text': full_text[len(previous):].strip(),
+                'is_final': is_final,
+            }
+            emitted_end = max(emitted_end, end)
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        if writer is not None:
+            writer.close()
+            waveform.save_peaks(output_file, peaks.finish())
+        stderr = process.stderr.read().decode(errors='replace').strip()
+        if stderr:
+            print("❌ FFmpegエラー:", stderr)
+    print("✅ ストリーミング録音完了")
+
+# ==========================================
+# 8. 録音データをそのまま文字起こし（WAVを経由しない）
+# ==========================================
+def record_to_array(duration=10, format='avfoundation', audio_device=':0', output_file=None, sample_rate=16000):
+    """
+    ffmpeg の標準出力から 16kHz モノラル 16bit の PCM を直接 AudioBuffer に読み込む
+    モデルに渡す形式で録音するので、WAVの書き出し・読み直し・リサンプリングが要らない
+    (float32 への変換はモデルに渡すときに行う)
+    :param duration: 録音時間（秒）
+    :param format: 入力フォーマット (Macは'avfoundation'、ファイル入力なら None)
+    :param audio_device: デバイスID、またはテスト用のWAVファイルパス
+    :param output_file: 指定すると録音した音声を別スレッドで 16bit WAV として保存する
+    :param sample_rate: 録音するサンプリングレート
+    :return: (AudioBuffer, 保存中のスレッド または None)。失敗時は (None, None)
+    """
+    print(f"🎙️ {duration}秒間の録音を開始します (メモリ上)...")
+    with profiler.stage("ffmpeg_capture", duration=duration):
+        process = open_pcm_stream(audio_device, duration=duration, format=format,
+                                  sample_rate=sample_rate, sample_format='s16le')
+        # 録音時間ぶんを先に確保し、パイプから配列のメモリへ直接読み込む
+        buffer = np.empty(int(duration * sample_rate) + sample_rate, dtype=np.int16)
+        filled = 0   # 読み込んだバイト数
+        # 保存する場合は、表示用の波形データも録音しながら作っておく
+        peaks = waveform.PeakBuilder(sample_rate) if output_file else None
+        try:
+            while True:
+                view = memoryview(buffer).cast('B')
+                if filled == len(view):
+                    # 想定より長かったら倍に広げる
+                    buffer = np.concatenate((buffer, np.empty_like(buffer)))
+                    view = memoryview(buffer).cast('B')
+                n = process.stdout.readinto(view[filled:])
+                if not n:
+                    break
+                if peaks is not None:
+                    peaks.append(buffer[peaks.frames:(filled + n) // 2])
+                filled += n
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        stderr = process.stderr.read().decode(errors='replace').strip()
+
+    if process.returncode != 0:
+        print("❌ FFmpegエラー:", stderr)
+        return None, None
+    audio = AudioBuffer(buffer[:filled // 2], sample_rate)
+    print(f"✅ 録音完了: {audio.duration:.1f}秒")
+
+    writer = None
+    if output_file:
+        def save():
+            # 録音したままの 16bit なので変換せずに書き出せる
+            write_wav_pcm(output_file, audio.pcm, sample_rate)
+            waveform.save_peaks(output_file, peaks.finish())
+        writer = threading.Thread(target=save, name="wav-writer")
+        writer.start()
+    return audio, writer
+
+def record_sources(sources, duration=10, format='avfoundation', output_files=None, sample_rate=16000):
+    """
+    複数の入力を1つの ffmpeg で同時に録音し、入力ごとの 16kHz モノラル 16bit の AudioBuffer としてメモリに読み込む
+    各入力は開始位置がそろっていて、同じ長さになる。そのまま transcribe_clips() に渡せる
+    (record_to_array と同じく、float32 への変換はモデルに渡すときに行う)
+    :param sources: デバイスIDのリスト (source_list を参照)
+    :param duration: 録音時間（秒）
+    :param format: 入力フォーマット (組で指定しなかった入力に使う)
+    :param output_files: 指定すると入力ごとの 16bit WAV を別スレッドで保存する (source_output_files を参照)
+    :param sample_rate: 録音するサンプリングレート
+    :return: (入力ごとの AudioBuffer のリスト, 保存中のスレッド または None)。失敗時は (None, None)
+    """
+    sources = source_list(sources, format)
+    paths = source_output_files(output_files, len(sources)) if output_files else None
+    print(f"🎙️ {duration}秒間の録音を開始します (メモリ上, {len(sources)}入力)...")
+    with profiler.stage("ffmpeg_capture", duration=duration, sources=len(sources)):
+        process = open_multi_pcm_stream(sources, duration=duration, sample_rate=sample_rate, sample_format='s16le')
+        data, stderr = process.communicate()
+    if process.returncode != 0:
+        print("❌ FFmpegエラー:", stderr.decode(errors='replace').strip())
+        return None, None
+    pcm = np.frombuffer(data, dtype='<i2')
+    pcm = pcm[:len(pcm) - len(pcm) % len(sources)].reshape(-1, len(sources))
+    # 入力ごとに連続した配列にしておく (推論はチャンネルごとに行うため)
+    audios = [AudioBuffer(np.ascontiguousarray(pcm[:, k]), sample_rate) for k in range(len(sources))]
+    del pcm, data
+    print(f"✅ 録音完了: {len(audios[0]) / sample_rate:.1f}秒 x {len(sources)}入力")
+
+    writer = None
+    if paths:
+        def save():
+            for path, audio in zip(paths, audios):
+                write_wav_pcm(path, audio.pcm, sample_rate)
+                waveform.save_peaks(path, waveform.PeakPyramid.from_pcm(audio.pcm, sample_rate))
+        writer = threading.Thread(target=save, name="wav-writer")
+        writer.start()
+    return audios, writer
+
+def record_and_transcribe(model_name="mlx-community/whisper-base-mlx", duration=10, format='avfoundation',
+                          audio_device=':0', output_file=None, engine=None, vad=None, **options):
+    """
+    録音した PCM をファイルに書かずにそのまま文字起こしする
+    output_file を指定した場合、WAVの保存は文字起こしと並行して行い、返す前に完了を待つ
+    :param model_name: 使用するWhisperモデル名
+    :param duration: 録音時間（秒）
+    :param format: 入力フォーマット (Macは'avfoundation'、ファイル入力なら None)
+    :param audio_device: デバイスID、またはテスト用のWAVファイルパス
+    :param output_file: 録音した音声の保存先 (省略すると保存しない)
+    :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+    :param vad: Trueなら発話区間だけを推論する (None なら設定の vad_enabled に従う)
+    :param options: バックエンドに渡すデコードオプション
+    :return: {'text', 'segments', 'cache': 'off', 'timings': {...}} の辞書。録音に失敗したら None
+    """
+    timings = {}
+    start = time.perf_counter()
+    audio, writer = record_to_array(duration, format, audio_device, output_file)
+    timings['record'] = time.perf_counter() - start
+    if audio is None:
+        return None
+
+    if engine is None:
+        engine = get_engine()
+    try:
+        start = time.perf_counter()
+        result = transcribe_array(audio, model_name, engine, vad=vad, **options)
+        timings['inference'] = time.perf_counter() - start
+    finally:
+        if writer is not None:
+            writer.join()
+    result['text'] = result.get('text', '').strip()
+    result.update(cache='off', timings=timings)
+    return result
@@ -0,0 +1,521 @@
+import asyncio
+import functools
+import inspect
+import sys
+import threading
+import traceback
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import audio_processor
+
+# ==========================================
+# audio_processor の asyncio 版
+# ==========================================
+# ffmpeg は asyncio.create_subprocess_exec で起動し、標準出力・標準エラーを読みながら終了を待つので、
+# 1つのイベントループで何十もの録音・変換を同時に進められる。キャンセルや timeout で ffmpeg も止まる。
+# スライスや文字起こしなど CPU を使う処理は、共有のスレッドプール (get_executor) で実行する。
+# GUI からは AsyncBridge を使うと、GUI スレッドの async def の中でこれらを await できる。
+
+# 標準出力を一度に読む大きさ（バイト）
+READ_CHUNK = 64 * 1024
+# キャンセルしたとき、ffmpeg が自分で終了する (書き込み中のファイルを閉じる) のを待つ時間（秒）
+STOP_GRACE_SEC = 2.0
+
+# ==========================================
+# 1. 重い処理を実行するスレッドプール
+# ==========================================
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """CPU を使う処理を実行する共有のスレッドプールを返す（初回呼び出し時に作成）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = audio_processor.get_settings().get("aio_max_workers", 4)
+            _executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="aio-worker")
+        return _executor
+
+def set_executor(executor):
+    """共有のスレッドプールを差し替える（None を渡すと次回 get_executor() で作り直す）"""
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    同期の関数をスレッドプールで実行して結果を待つ
+    キャンセルすると結果を待たなくなるが、実行中の関数そのものは最後まで動く
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+# ==========================================
+# 2. サブプロセス (ffmpeg)
+# ==========================================
+async def run_process(args, timeout=None, on_stdout=None, on_stderr=None):
+    """
+    外部コマンドを起動し、標準出力・標準エラーを読みながら終了を待つ
+    :param args: コマンドと引数のリスト
+    :param timeout: この秒数で終わらなければプロセスを止めて asyncio.TimeoutError を送出する
+    :param on_stdout: 標準出力を受け取る関数 (bytes が届いた分ずつ渡る)。省略すると標準出力は捨てる
+    :param on_stderr: 標準エラーを1行ずつ受け取る関数 (str)
+    :return: (終了コード, 標準エラーの全文)
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE if on_stdout else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stderr_lines = []
+
+    async def read_stdout():
+        while True:
+            data = await process.stdout.read(READ_CHUNK)
+            if not data:
+                return
+            on_stdout(data)
+
+    async def read_stderr():
+        async for line in process.stderr:
+            text = line.decode(errors='replace').rstrip()
+            stderr_lines.append(text)
+            if on_stderr is not None:
+                on_stderr(text)
+
+    readers = [read_stderr(), read_stdout()] if on_stdout else [read_stderr()]
+    try:
+        await asyncio.wait_for(asyncio.gather(*readers, process.wait()), timeout)
+    except BaseException:
+        # キャンセル・タイムアウト・コールバックの例外のどれでも、プロセスを残さない
+        await _stop(process)
+        raise
+    return process.returncode, "\n".join(stderr_lines)
+
+async def _stop(process):
+    """プロセスに終了を頼み (ffmpeg は SIGTERM で出力ファイルを閉じてから終わる)、応じなければ強制終了する"""
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), STOP_GRACE_SEC)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+def ffmpeg_args(spec):
+    """ffmpeg-python で組み立てた処理を、create_subprocess_exec に渡すコマンドライン引数にする"""
+    return spec.compile(overwrite_output=True)
+
+async def run_ffmpeg(spec, timeout=None, on_stdout=None, on_stderr=None):
+    """
+    ffmpeg を起動して終わるまで待つ
+    :param spec: ffmpeg-python で組み立てた処理 (audio_processor.record_spec() など)
+    :return: 成功ならTrue。失敗したらエラーを表示して False
+    """
+    returncode, stderr = await run_process(ffmpeg_args(spec), timeout, on_stdout, on_stderr)
+    if returncode != 0:
+        print("❌ FFmpegエラー:", stderr)
+        return False
+    return True
+
+# ==========================================
+# 3. 録音・変換
+# ==========================================
+async def record_audio(output_file, duration=10, format='avfoundation', audio_device=':0', timeout=None,
+                       on_stderr=None):
+    """
+    record_audio() の asyncio 版
+    :param timeout: この秒数で終わらなければ録音を止めて asyncio.TimeoutError を送出する
+    :param on_stderr: ffmpeg のメッセージを1行ずつ受け取る関数
+    :return: 成功ならTrue, 失敗ならFalse
+    """
+    if isinstance(audio_device, (list, tuple)):
+        return await record_sources_to_files(output_file, audio_device, duration=duration, format=format,
+                                             timeout=timeout)
+    print(f"🎙️ {duration}秒間の録音を開始します...")
+    spec = audio_processor.record_spec(output_file, duration, format, audio_device)
+    if not await run_ffmpeg(spec, timeout, on_stderr=on_stderr):
+        return False
+    print(f"✅ 録音完了: {output_file}")
+    return True
+
+async def record_sources_to_files(output_file, sources, duration=10, format='avfoundation', sample_rate=44100,
+                                  timeout=None):
+    """record_sources_to_files() の asyncio 版 (複数の入力を1つの ffmpeg で録音し、入力ごとの WAV に保存する)"""
+    sources = audio_processor.source_list(sources, format)
+    try:
+        paths = audio_processor.source_output_files(output_file, len(sources))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    print(f"🎙️ {duration}秒間の録音を開始します ({len(sources)}入力)...")
+    data = bytearray()
+    spec = audio_processor.multi_pcm_stream_spec(sources, duration=duration, sample_rate=sample_rate)
+    if not await run_ffmpeg(spec, timeout, on_stdout=data.extend):
+        return False
+    await run_blocking(audio_processor.write_source_files, data, paths, sample_rate)
+    print(f"✅ 録音完了: {', '.join(paths)}")
+    return True
+
+async def record_to_array(duration=10, format='avfoundation', audio_device=':0', output_file=None,
+                          sample_rate=16000, timeout=None):
+    """
+    record_to_array() の asyncio 版
+    :return: (AudioBuffer, WAVを保存中の asyncio.Future または None)。失敗時は (None, None)
+    """
+    np = audio_processor.np
+    waveform = audio_processor.waveform
+
+    print(f"🎙️ {duration}秒間の録音を開始します (メモリ上)...")
+    data = bytearray()
+    pending = b''   # 16bit に満たない端数のバイト
+    # 保存する場合は、表示用の波形データも録音しながら作っておく
+    peaks = waveform.PeakBuilder(sample_rate) if output_file else None
+
+    def on_stdout(chunk):
+        nonlocal pending
+        chunk = pending + chunk
+        usable = len(chunk) - len(chunk) % 2
+        pending = chunk[usable:]
+        data.extend(chunk[:usable])
+        if peaks is not None:
+            peaks.append(np.frombuffer(chunk, dtype='<i2', count=usable // 2))
+
+    spec = audio_processor.pcm_stream_spec(audio_device, duration=duration, format=format, sample_rate=sample_rate)
+    if not await run_ffmpeg(spec, timeout, on_stdout=on_stdout):
+        return None, None
+    audio = audio_processor.AudioBuffer(np.frombuffer(data, dtype='<i2'), sample_rate)
+    print(f"✅ 録音完了: {audio.duration:.1f}秒")
+
+    writer = None
+    if output_file:
+        def save():
+            audio_processor.write_wav_pcm(output_file, audio.pcm, sample_rate)
+            waveform.save_peaks(output_file, peaks.finish())
+        writer = asyncio.ensure_future(run_blocking(save))
+    return audio, writer
+
+async def record_and_transcribe(model_name="mlx-community/whisper-base-mlx", duration=10, format='avfoundation',
+                                audio_device=':0', output_file=None, engine=None, vad=None, timeout=None, **options):
+    """
+    record_and_transcribe() の asyncio 版 (録音は ffmpeg を待つだけ、推論はスレッドプールで行う)
+    :return: {'text', 'segments', 'cache': 'off', 'timings': {...}} の辞書。録音に失敗したら None
+    """
+    timings = {}
+    start = time.perf_counter()
+    audio, writer = await record_to_array(duration, format, audio_device, output_file, timeout=timeout)
+    timings['record'] = time.perf_counter() - start
+    if audio is None:
+        return None
+    try:
+        start = time.perf_counter()
+        result = await transcribe_array(audio, model_name, engine, vad=vad, **options)
+        timings['inference'] = time.perf_counter() - start
+    finally:
+        if writer is not None:
+            await writer
+    result['text'] = result.get('text', '').strip()
+    result.update(cache='off', timings=timings)
+    return result
+
+async def convert_audio(input_file, output_file, sample_rate=16000, channels=1, codec='pcm_s16le', timeout=None,
+                        on_progress=None):
+    """
+    convert_audio() の asyncio 版
+    :param timeout: この秒数で終わらなければ変換を止めて asyncio.TimeoutError を送出する
+    :param on_progress: 変換済みの長さ（秒）を受け取る関数 (ffmpeg の -progress の出力から読み取る)
+    :return: 成功ならTrue, 失敗ならFalse
+    """
+    buffered = b''
+
+    def on_stdout(chunk):
+        nonlocal buffered
+        *lines, buffered = (buffered + chunk).split(b'\n')
+        for line in lines:
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            # out_time_ms は名前に反してマイクロ秒単位
+            if key == 'out_time_ms' and value.isdigit():
+                on_progress(int(value) / 1e6)
+
+    spec = audio_processor.convert_spec(input_file, output_file, sample_rate, channels, codec,
+                                        progress=on_progress is not None)
+    if not await run_ffmpeg(spec, timeout, on_stdout=on_stdout if on_progress else None):
+        return False
+    print(f"✅ 変換完了: {output_file}")
+    return True
+
+# ==========================================
+# 4. スライス・文字起こし (スレッドプールで実行)
+# ==========================================
+async def slice_audio(input_file, split_ms=4000, as_refs=None):
+    """slice_audio() の asyncio 版"""
+    return await run_blocking(audio_processor.slice_audio, input_file, split_ms, as_refs)
+
+async def slice_segments(input_file, **kwargs):
+    """slice_segments() の asyncio 版 (引数は slice_segments を参照)"""
+    return await run_blocking(audio_processor.slice_segments, input_file, **kwargs)
+
+async def slice_range(input_file, start_ms, end_ms, output_file=None, as_refs=None):
+    """slice_range() の asyncio 版"""
+    return await run_blocking(audio_processor.slice_range, input_file, start_ms, end_ms, output_file, as_refs)
+
+async def transcribe_file(file_path, model_name="mlx-community/whisper-base-mlx", engine=None, **kwargs):
+    """transcribe_file() の asyncio 版 (引数は transcribe_file を参照)"""
+    return await run_blocking(audio_processor.transcribe_file, file_path, model_name, engine, **kwargs)
+
+async def transcribe_array(arr, model_name, engine=None, **kwargs):
+    """transcribe_array() の asyncio 版 (引数は transcribe_array を参照)"""
+    return await run_blocking(audio_processor.transcribe_array, arr, model_name, engine, **kwargs)
+
+# ==========================================
+# 5. GUI との橋渡し
+# ==========================================
+class EventLoopThread:
+    """
+    別スレッドで asyncio のイベントループを回し続けるクラス
+    GUI スレッドなど、ループの外のスレッドからコルーチンを投入する
+    """
+
+    def __init__(self, name="aio-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """
+        コルーチンをループで実行する
+        :return: concurrent.futures.Future。cancel() するとループ側のタスクもキャンセルされる
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout=5.0):
+        """実行中のタスクをキャンセルし、終わるのを待ってからループを止める"""
+        if self.loop.is_closed():
+            return
+
+        async def cancel_all():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            self.submit(cancel_all()).result(timeout)
+        except Exception as e:
+            print(f"⚠️ 非同期タスクの停止エラー: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+
+_loop_thread = None
+_loop_thread_lock = threading.Lock()
+
+def get_loop_thread():
+    """アプリ全体で共有する EventLoopThread を返す（初回呼び出し時に作成）"""
+    global _loop_thread
+    with _loop_thread_lock:
+        if _loop_thread is None:
+            _loop_thread = EventLoopThread()
+        return _loop_thread
+
+def shutdown():
+    """共有のイベントループを止め、スレッドプールを閉じる (アプリの終了時に呼ぶ)"""
+    global _loop_thread
+    with _loop_thread_lock:
+        loop_thread, _loop_thread = _loop_thread, None
+    if loop_thread is not None:
+        loop_thread.stop()
+    with _executor_lock:
+        executor = _executor
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        set_executor(None)
+
+
+class _Await:
+    """AsyncBridge.run() の戻り値。GUI スレッドの async def の中で await する"""
+    __slots__ = ('future',)
+
+    def __init__(self, future):
+        self.future = future
+
+    def __await__(self):
+        return (yield self)
+
+
+class GuiTask:
+    """
+    GUI スレッドで async def の処理を進めるタスク
+    await している間は GUI スレッドを止めず、結果が届いたら post() で GUI スレッドに戻って続きを実行する。
+    そのため async def の中ではウィジェットをそのまま操作できる
+    """
+
+    def __init__(self, coro, post, on_finish=None):
+        """
+        :param coro: 実行するコルーチン (await できるのは AsyncBridge.run() の戻り値だけ)
+        :param post: 関数を GUI スレッドで呼び出す関数
+        :param on_finish: 終わったときに add_done_callback() の callback より先に呼ぶ関数 (AsyncBridge の後片付け用)
+        """
+        self._coro = coro
+        self._post = post
+        self._on_finish = on_finish
+        self._retrieved = False  # result() で結果 (例外) を受け取ったか
+        self._waiting = None     # 待っている concurrent.futures.Future
+        self._state = 'pending'  # 'pending', 'finished', 'cancelled', 'error'
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        # 最初の await までは呼び出したスレッド (GUI) でそのまま実行する
+        self._step()
+
+    def _step(self, value=None, error=None):
+        self._waiting = None
+        try:
+            awaited = self._coro.throw(error) if error is not None else self._coro.send(value)
+        except StopIteration as e:
+            self._finish('finished', result=e.value)
+            return
+        except asyncio.CancelledError:
+            self._finish('cancelled')
+            return
+        except Exception as e:
+            self._finish('error', exception=e)
+            return
+        if not isinstance(awaited, _Await):
+            self._step(error=TypeError("GUI スレッドの async def では AsyncBridge.run() の戻り値だけを await できます"))
+            return
+        self._waiting = awaited.future
+        awaited.future.add_done_callback(lambda future: self._post(functools.partial(self._resume, future)))
+
+    def _resume(self, future):
+        if self.done():
+            return
+        if future.cancelled():
+            self._step(error=asyncio.CancelledError())
+        elif future.exception() is not None:
+            self._step(error=future.exception())
+        else:
+            self._step(future.result())
+
+    def _finish(self, state, result=None, exception=None):
+        self._state = state
+        self._result = result
+        self._exception = exception
+        if self._on_finish is not None:
+            self._on_finish(self)
+        for callback in self._callbacks:
+            callback(self)
+        # 誰も result() で受け取らなかった例外は、握りつぶさずにトレースバックを出す
+        if exception is not None and not self._retrieved:
+            print(f"❌ 非同期処理エラー: {type(exception).__name__}: {exception}", file=sys.stderr)
+            traceback.print_exception(type(exception), exception, exception.__traceback__)
+
+    def cancel(self):
+        """
+        待っている処理をキャンセルする (async def の中には CancelledError が届く)
+        :return: キャンセルを依頼できたら True
+        """
+        if self.done() or self._waiting is None:
+            return False
+        return self._waiting.cancel()
+
+    def done(self):
+        return self._state != 'pending'
+
+    def cancelled(self):
+        return self._state == 'cancelled'
+
+    def result(self):
+        """終わった処理の戻り値を返す (失敗していればその例外を送出する)"""
+        if self._state == 'pending':
+            raise RuntimeError("まだ終わっていません")
+        self._retrieved = True
+        if self._state == 'cancelled':
+            raise asyncio.CancelledError()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def add_done_callback(self, callback):
+        """
+        終わったら GUI スレッドで callback(task) を呼ぶ (もう終わっていればすぐ呼ぶ)
+        callback の中で task.result() を呼ばなかった例外は、未処理のエラーとしてトレースバックを出す
+        """
+        if self.done():
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+
+class AsyncBridge:
+    """
+    GUI (Qt など) のスレッドから audio_processor.aio の関数を await するための橋渡し (qasync の asyncSlot に相当)
+    コルーチンは共有のイベントループのスレッドで動き、結果は post() で GUI スレッドに戻る
+        bridge = AsyncBridge(signals.call_signal.emit)
+        button.clicked.connect(bridge.slot(self.on_clicked))
+
+        async def on_clicked(self):
+            ok = await bridge.run(aio.convert_audio(src, dst), timeout=60)
+            self.label.setText("完了" if ok else "失敗")   # ここは GUI スレッド
+    """
+
+    def __init__(self, post, loop_thread=None):
+        """
+        :param post: 関数を GUI スレッドで呼び出す関数 (Qt ならキュー接続のシグナルの emit)
+        :param loop_thread: コルーチンを実行する EventLoopThread (省略時は共有のもの)
+        """
+        self.post = post
+        self.loop_thread = loop_thread
+        self._tasks = set()
+
+    def run(self, coro, timeout=None):
+        """
+        コルーチンをイベントループのスレッドで実行し、GUI スレッドの async def で await できるものを返す
+        :param timeout: この秒数で終わらなければキャンセルし、await した側に asyncio.TimeoutError を送出する
+        """
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        loop_thread = self.loop_thread or get_loop_thread()
+        return _Await(loop_thread.submit(coro))
+
+    def start(self, coro):
+        """GUI スレッドの async def の処理を開始する。:return: GuiTask"""
+        task = GuiTask(coro, self.post, on_finish=self._tasks.discard)
+        if not task.done():
+            self._tasks.add(task)
+        return task
+
+    def slot(self, func):
+        """
+        async def の関数を、Qt のシグナルにつなげられる普通の関数にする
+        シグナルが余分な引数 (clicked の checked など) を渡しても、関数が受け取る数だけ渡す
+        """
+        params = inspect.signature(func).parameters.values()
+        if any(p.kind == p.VAR_POSITIONAL for p in params):
+            count = None
+        else:
+            count = sum(1 for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            return self.start(func(*args[:count]))
+        return wrapper
+
+    def pending_count(self):
+        return len(self._tasks)
+
+    def cancel_all(self):
+        """実行中の処理をすべてキャンセルする"""
+        for task in list(self._tasks):
+            task.cancel()
@@ -0,0 +1,250 @@
+# 録音・スライス・文字起こし処理のベンチマーク
+# 使い方:
+#   python benchmark.py                    # 計測してベースラインと比較 (ベースラインがなければ失敗)
+#   python benchmark.py --update-baseline  # 今回の結果をベースラインとして保存
+#   python benchmark.py --sizes 1,10 --threshold 0.3
+#   python benchmark.py --sizes 60 --stages end_to_end,end_to_end_float32   # int16 化の前後のピークRSS
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import tempfile
+import platform
+import multiprocessing
+import numpy as np
+
+import audio_processor
+import resampler
+
+SAMPLE_FILES = ["output.wav", "test_record.wav", "async_test.wav"]
+SYNTHETIC_MINUTES = [1, 10, 60]
+BASELINE_FILE = "benchmark_baseline.json"
+SYNTHETIC_DIR = ".bench_cache"
+# 疑似バックエンドの推論時間 (音声1秒あたりの秒数)。VADで減らした無音の分だけ速くなる
+INFERENCE_COST = 0.005
+
+# ==========================================
+# 合成音声の作成
+# ==========================================
+def make_synthetic_wav(path, minutes, rate=44100, seed=0):
+    """
+    会話のような合成音声 (声の代わりの変調ノイズと無音が交互に続く) を WAV で作る
+    長いファイルでもメモリを使いすぎないよう、1秒ずつ書き込む
+    """
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    n_seconds = int(minutes * 60)
+    data_size = n_seconds * rate * 2
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<4sI4s', b'RIFF', 36 + data_size, b'WAVE'))
+        f.write(struct.pack('<4sIHHIIHH', b'fmt ', 16, 1, 1, rate, rate * 2, 2, 16))
+        f.write(struct.pack('<4sI', b'data', data_size))
+        t = np.arange(rate) / rate
+        for second in range(n_seconds):
+            if rng.random() < 0.3:
+                # 無音 (小さな背景ノイズだけ)
+                block = rng.normal(0, 30, rate)
+            else:
+                envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 6) * t)
+                block = rng.normal(0, 3000, rate) * envelope
+            f.write(np.clip(block, -32768, 32767).astype('<i2').tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+def prepare_inputs(sizes, synthetic_dir=SYNTHETIC_DIR):
+    """計測に使う (名前, ファイルパス) のリストを返す"""
+    inputs = [(name, name) for name in SAMPLE_FILES if os.path.exists(name)]
+    os.makedirs(synthetic_dir, exist_ok=True)
+    for minutes in sizes:
+        path = os.path.join(synthetic_dir, f"synthetic-{minutes}min.wav")
+        print(f"🛠️ 合成音声を準備中: {path}")
+        inputs.append((f"synthetic-{minutes}min", make_synthetic_wav(path, minutes)))
+    return inputs
+
+# ==========================================
+# 各処理段階の計測 (子プロセスで実行)
+# ==========================================
+def _stage_decode(path, workdir):
+    audio_processor.load_wav(path)
+
+def _stage_resample(path, workdir, _cache={}):
+    if path not in _cache:
+        _cache.clear()
+        _cache[path] = audio_processor.load_wav(path)
+    audio, rate = _cache[path]
+    resampler.resample(audio, rate, 16000)
+
+def _stage_slice(path, workdir):
+    outputs = [os.path.join(workdir, f"slice-{k}.wav") for k in range(4)]
+    audio_processor.slice_segments(path, num_segments=4, output_files=outputs)
+
+def _fake_engine(_engine=[]):
+    if not _engine:
+        backend = audio_processor.FakeBackend(realtime_factor=INFERENCE_COST)
+        _engine.append(audio_processor.TranscriptionEngine(backend))
+    return _engine[0]
+
+def _stage_end_to_end(path, workdir):
+    audio_processor.transcribe_file(path, "fake-model", _fake_engine(), use_cache=False, vad=False)
+
+def _stage_end_to_end_vad(path, workdir):
+    audio_processor.transcribe_file(path, "fake-model", _fake_engine(), use_cache=False, vad=True)
+
+def _stage_end_to_end_float32(path, workdir):
+    # 比較用: AudioBuffer を使う前の処理 (読み込んだ直後に全体を float32 にしてからリサンプリングする)
+    audio, rate = audio_processor.load_wav(path)
+    audio = resampler.resample(audio, rate, 16000)
+    audio_processor.transcribe_array(audio, "fake-model", _fake_engine(), vad=False)
+
+STAGES = {
+    'decode': _stage_decode,
+    'resample': _stage_resample,
+    'slice': _stage_slice,
+    'end_to_end': _stage_end_to_end,
+    'end_to_end_vad': _stage_end_to_end_vad,
+    'end_to_end_float32': _stage_end_to_end_float32,
+}
+
+def _peak_rss_bytes():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+def _measure(stage, path, repeat):
+    """子プロセスの中で1つの段階を repeat 回実行し、時間とピークRSSを返す"""
+    func = STAGES[stage]
+    # スライスの段階は毎回 WAV を書き出すので、終わったらフォルダごと消す
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        # 初回はインポートやキャッシュの準備を含むので計測しない
+        func(path, workdir)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(path, workdir)
+            times.append(time.perf_counter() - start)
+    return {'times': times, 'peak_rss': _peak_rss_bytes()}
+
+def audio_seconds(path):
+    _, channels, rate, bits, _, data_size = audio_processor.read_wav_header(path)
+    return data_size / (rate * channels * bits // 8)
+
+def speech_ratio(path):
+    """VAD が発話とみなす割合 (この割合以外の推論が省ける)"""
+    audio, rate = audio_processor.load_wav(path)
+    regions = audio_processor.detect_speech(audio, rate)
+    return sum(end - start for start, end in regions) / len(audio) if len(audio) else 0.0
+
+def run_stage(stage, path, repeat):
+    """ピークRSSが他の計測の影響を受けないよう、毎回新しいプロセスで計測する"""
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        raw = pool.apply(_measure, (stage, path, repeat))
+    times = np.array(raw['times'])
+    median = float(np.median(times))
+    seconds = audio_seconds(path)
+    return {
+        'audio_seconds': seconds,
+        'throughput': seconds / median if median > 0 else float('inf'),
+        'p50': median,
+        'p90': float(np.percentile(times, 90)),
+        'p99': float(np.percentile(times, 99)),
+        'peak_rss': raw['peak_rss'],
+    }
+
+# ==========================================
+# ベースラインとの比較
+# ==========================================
+def compare(results, baseline, threshold):
+    """
+    ベースラインより悪くなった項目を探す
+    :param threshold: 許容する悪化の割合 (0.2 なら 20%)。ベースラインの "thresholds" で段階ごとに上書きできる
+    :return: 悪化した項目の説明のリスト
+    """
+    regressions = []
+    overrides = baseline.get('thresholds', {})
+    for key, current in results.items():
+        base = baseline.get('results', {}).get(key)
+        if base is None:
+            continue
+        limit = overrides.get(key.split('/')[0], threshold)
+        if current['throughput'] < base['throughput'] * (1 - limit):
+            regressions.append(
+                f"{key}: 処理速度 {current['throughput']:.1f}倍速 (ベースライン {base['throughput']:.1f}倍速)"
+            )
+        if current['peak_rss'] > base['peak_rss'] * (1 + limit):
+            regressions.append(
+                f"{key}: ピークRSS {current['peak_rss'] / 2**20:.1f}MB (ベースライン {base['peak_rss'] / 2**20:.1f}MB)"
+            )
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="audio_processor のベンチマーク")
+    parser.add_argument('--sizes', default=",".join(map(str, SYNTHETIC_MINUTES)),
+                        help="合成音声の長さ（分）をカンマ区切りで指定 (空なら合成音声を使わない)")
+    parser.add_argument('--stages', default=",".join(STAGES), help="計測する段階をカンマ区切りで指定")
+    parser.add_argument('--repeat', type=int, default=5, help="1分以下の入力を繰り返す回数")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="ベースラインのJSONファイル")
+    parser.add_argument('--threshold', type=float, default=0.25, help="許容する悪化の割合")
+    parser.add_argument('--update-baseline', action='store_true', help="今回の結果をベースラインとして保存する")
+    args = parser.parse_args(argv)
+
+    sizes = [float(x) if '.' in x else int(x) for x in args.sizes.split(',') if x]
+    stages = [s for s in args.stages.split(',') if s]
+
+    print("=== ベンチマーク開始 ===")
+    results = {}
+    for name, path in prepare_inputs(sizes):
+        for stage in stages:
+            # 長い入力は繰り返し回数を減らす
+            repeat = args.repeat if audio_seconds(path) <= 60 else max(1, args.repeat // 3)
+            result = run_stage(stage, path, repeat)
+            results[f"{stage}/{name}"] = result
+            print(f"{stage:>10} {name:>20}: {result['throughput']:8.1f}倍速  "
+                  f"p50 {result['p50'] * 1000:8.1f}ms  p90 {result['p90'] * 1000:8.1f}ms  "
+                  f"ピークRSS {result['peak_rss'] / 2**20:7.1f}MB")
+        if 'end_to_end' in stages and 'end_to_end_vad' in stages:
+            # VAD で無音を推論しなかった分の短縮を表示する
+            full, gated = results[f"end_to_end/{name}"], results[f"end_to_end_vad/{name}"]
+            print(f"{'':>10} {name:>20}: VADによる短縮 {1 - gated['p50'] / full['p50']:6.1%}  "
+                  f"(発話の割合 {speech_ratio(path):6.1%})")
+        if 'end_to_end' in stages and 'end_to_end_float32' in stages:
+            # int16 のまま扱うことで減ったピークRSSを表示する
+            compact, legacy = results[f"end_to_end/{name}"], results[f"end_to_end_float32/{name}"]
+            print(f"{'':>10} {name:>20}: int16 化によるピークRSSの削減 "
+                  f"{1 - compact['peak_rss'] / legacy['peak_rss']:6.1%}  "
+                  f"(float32 {legacy['peak_rss'] / 2**20:.1f}MB → int16 {compact['peak_rss'] / 2**20:.1f}MB, "
+                  f"PCM {audio_seconds(path) * 16000 * 2 / 2**20:.1f}MB @16kHz)")
+
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        # ベースラインがないまま成功にすると、比較せずに通ってしまう
+        print(f"\n❌ ベースラインがありません: {args.baseline}")
+        print("   この環境で計測した結果を保存するには --update-baseline を付けて実行してください")
+        print("\n=== ベンチマーク終了 ===")
+        return 2
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'machine': platform.platform(), 'results': results}, f, indent=4, ensure_ascii=False)
+        print(f"\n💾 ベースラインを保存しました: {args.baseline}")
+        print("\n=== ベンチマーク終了 ===")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\n❌ ベースラインより悪化しています:")
+        for line in regressions:
+            print(f"  - {line}")
+    else:
+        print("\n✅ ベースラインからの悪化はありません")
+    print("\n=== ベンチマーク終了 ===")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# 録音と文字起こし結果のカタログ (SQLite + FTS5)
+# 使い方:
+#   python catalog.py search 議事録            # 発言を検索 (空白で区切るとすべてを含むものを探す)
+#   python catalog.py add output.wav ...      # 録音を文字起こしして登録
+#   python catalog.py stats
+#
+# 録音ごとの情報 (長さ・モデル・処理時間) と、セグメントごとの発言 (開始・終了時刻つき) を保存する。
+# 発言は trigram で索引を作るので、日本語のように単語の区切りがない文章でも部分一致で探せる。
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+
+import config_manager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    duration REAL,
+    rate INTEGER,
+    size INTEGER,
+    mtime REAL,
+    model TEXT,
+    text TEXT,
+    timings TEXT,
+    transcribed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    recording_id INTEGER NOT NULL REFERENCES recordings(id) ON DELETE CASCADE,
+    start_sec REAL NOT NULL,
+    end_sec REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_by_recording ON segments(recording_id, start_sec);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+# trigram の索引で探せる一番短い語の長さ (これより短い語はセグメントを順に調べる)
+MIN_INDEXED_TERM = 3
+
+
+def _audio_info(path):
+    """録音の (長さ（秒）, サンプリングレート)。読めなければ (None, None)"""
+    import audio_processor
+    import audio_archive
+
+    try:
+        if path.endswith(audio_archive.ARCHIVE_EXT):
+            with audio_archive.ArchiveReader(path) as reader:
+                return reader.duration, reader.rate
+        if path.endswith(audio_archive.CLIP_EXT):
+            source, start, end = audio_archive.read_clip_info(path)
+            rate = _audio_info(source)[1]
+            return ((end - start) / rate, rate) if rate else (None, None)
+        _, channels, rate, bits, _, data_size = audio_processor.read_wav_header(path)
+        return data_size / (rate * channels * bits // 8), rate
+    except Exception:
+        return None, None
+
+def _segments_of(result, duration):
+    """文字起こし結果のセグメント。セグメントがなければ全文を1つのセグメントにする"""
+    segments = [(float(seg.get('start', 0.0)), float(seg.get('end', 0.0)), seg.get('text', '').strip())
+                for seg in result.get('segments') or []]
+    segments = [seg for seg in segments if seg[2]]
+    if not segments and result.get('text', '').strip():
+        segments = [(0.0, duration or 0.0, result['text'].strip())]
+    return segments
+
+
+class Catalog:
+    """
+    録音と文字起こし結果を SQLite に保存し、発言を全文検索する
+    書き込みは add_async() でキューに入れ、専用のスレッドがまとめて1回のトランザクションで書く。
+    検索はどのスレッドから呼んでもよい (スレッドごとに読み込み用の接続を持つ)
+    """
+
+    def __init__(self, path="catalog.db", batch_size=64, max_wait_ms=200):
+        """
+        :param path: データベースファイル
+        :param batch_size: 1回のトランザクションでまとめて書く件数の上限
+        :param max_wait_ms: 次の書き込みを待ってまとめる最大時間（ミリ秒）
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        # WAL にすると、書き込み中でも検索が待たされない
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---- 書き込み ----
+    def add(self, path, result, model=None):
+        """録音1件の文字起こし結果をすぐに書き込む"""
+        self.add_many([(path, result, model)])
+
+    def add_many(self, items):
+        """
+        複数の録音をまとめて1回のトランザクションで書き込む。同じ録音が登録済みなら置き換える
+        :param items: (録音のパス, 文字起こし結果の辞書, モデル名) のリスト
+        """
+        rows = []
+        for path, result, model in items:
+            path = os.path.abspath(path)
+            duration, rate = _audio_info(path)
+            try:
+                st = os.stat(path)
+                size, mtime = st.st_size, st.st_mtime
+            except OSError:
+                size = mtime = None
+            timings = json.dumps(result.get('timings') or {}, ensure_ascii=False)
+            rows.append((path, duration, rate, size, mtime, model, result.get('text', '').strip(), timings,
+                         _segments_of(result, duration)))
+
+        conn = self._conn()
+        with conn:
+            for path, duration, rate, size, mtime, model, text, timings, segments in rows:
+                conn.execute("DELETE FROM recordings WHERE path = ?", (path,))
+                recording_id = conn.execute(
+                    "INSERT INTO recordings (path, duration, rate, size, mtime, model, text, timings, transcribed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, duration, rate, size, mtime, model, text, timings, time.time()),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO segments (recording_id, start_sec, end_sec, text) VALUES (?, ?, ?, ?)",
+                    [(recording_id, start, end, seg_text) for start, end, seg_text in segments],
+                )
+
+    def add_async(self, path, result, model=None):
+        """書き込みをキューに入れてすぐに戻る (書き込み用のスレッドがまとめて書く)"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="catalog-writer", daemon=True)
+                self._writer.start()
+        self._queue.put((path, dict(result), model))
+
+    def flush(self):
+        """キューに入っている書き込みがすべて終わるまで待つ"""
+        self._queue.join()
+
+    def close(self):
+        """書き込みを終えてから、書き込み用のスレッドを止める"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = [item]
+            # 続けて届いた書き込みを少し待ってまとめる
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self.add_many(batch)
+            except Exception as e:
+                print(f"❌ カタログへの書き込みエラー: {e}")
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                break
+
+    # ---- 検索 ----
+    def search(self, query, limit=50):
+        """
+        発言を検索する
+        :param query: 検索語 (空白で区切るとすべてを含むセグメントを探す)
+        :param limit: 返す件数の上限
+        :return: {'path', 'start', 'end', 'text', 'snippet', 'model', 'duration'} の辞書のリスト
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        indexed = [t for t in terms if len(t) >= MIN_INDEXED_TERM]
+        short = [t for t in terms if len(t) < MIN_INDEXED_TERM]
+        like = "".join(" AND s.text LIKE ? ESCAPE '\\'" for _ in short)
+        like_args = ["%" + t.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + "%" for t in short]
+
+        if indexed:
+            match = " ".join('"' + t.replace('"', '""') + '"' for t in indexed)
+            sql = ("SELECT r.path, r.model, r.duration, s.start_sec, s.end_sec, s.text,"
+                   " highlight(segments_fts, 0, '【', '】') AS snippet"
+                   " FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid"
+                   " JOIN recordings r ON r.id = s.recording_id"
+                   " WHERE segments_fts MATCH ?" + like +
+                   " ORDER BY bm25(segments_fts), r.transcribed_at DESC LIMIT ?")
+            args = [match] + like_args + [limit]
+        else:
+            sql = ("SELECT r.path, r.model, r.duration, s.start_sec, s.end_sec, s.text, s.text AS snippet"
+                   " FROM segments s JOIN recordings r ON r.id = s.recording_id"
+                   " WHERE 1" + like +
+                   " ORDER BY r.transcribed_at DESC, s.start_sec LIMIT ?")
+            args = like_args + [limit]
+        return [{'path': row['path'], 'start': row['start_sec'], 'end': row['end_sec'], 'text': row['text'],
+                 'snippet': row['snippet'], 'model': row['model'], 'duration': row['duration']}
+                for row in self._conn().execute(sql, args)]
+
+    def recording(self, path):
+        """登録済みの録音の情報とセグメント。未登録なら None"""
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM recordings WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+        info = dict(row)
+        info['timings'] = json.loads(info['timings'] or '{}')
+        info['segments'] = [{'start': s['start_sec'], 'end': s['end_sec'], 'text': s['text']} for s in conn.execute(
+            "SELECT start_sec, end_sec, text FROM segments WHERE recording_id = ? ORDER BY start_sec", (row['id'],))]
+        return info
+
+    def stats(self):
+        conn = self._conn()
+        recordings, seconds = conn.execute("SELECT COUNT(*), COALESCE(SUM(duration), 0) FROM recordings").fetchone()
+        segments = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {'recordings': recordings, 'segments': segments, 'audio_seconds': seconds}
+
+
+# ==========================================
+# 共有のカタログ
+# ==========================================
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """設定 (audio_processor.get_settings()) に従って共有の Catalog を返す。カタログが無効なら None"""
+    import audio_processor
+
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            config = audio_processor.get_settings()
+            if not config.get("catalog_enabled", False):
+                return None
+            _catalog = Catalog(config.get("catalog_path", "catalog.db"))
+        return _catalog
+
+def set_catalog(catalog):
+    """共有カタログを差し替える（None を渡すと次回 get_catalog() で作り直す）"""
+    global _catalog
+    with _catalog_lock:
+        _catalog = catalog
+
+def close_catalog():
+    """共有カタログを開いていれば閉じる (アプリの終了時に、登録する処理をすべて止めてから呼ぶ)"""
+    global _catalog
+    with _catalog_lock:
+        shared, _catalog = _catalog, None
+    if shared is not None:
+        shared.close()
+
+def record_result(path, result, model=None):
+    """文字起こし結果を共有カタログに登録する (キューに入れるだけなので、すぐに戻る)"""
+    if not path or not isinstance(result, dict) or not os.path.exists(path):
+        return
+    try:
+        catalog = get_catalog()
+        if catalog is not None:
+            catalog.add_async(path, result, model)
+    except Exception as e:
+        print(f"❌ カタログに登録できません: {e}")
+
+
+def main(argv=None):
+    config = config_manager.load_config()
+    parser = argparse.ArgumentParser(description="録音と文字起こし結果のカタログ")
+    parser.add_argument('--db', default=config.get('catalog_path', 'catalog.db'))
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('search', help="発言を検索する")
+    p.add_argument('query', nargs='+')
+    p.add_argument('--limit', type=int, default=20)
+    p = sub.add_parser('add', help="録音を文字起こしして登録する")
+    p.add_argument('paths', nargs='+')
+    p.add_argument('--model', default=config.get('model_name', 'mlx-community/whisper-base-mlx'))
+    sub.add_parser('stats', help="登録件数を表示する")
+    args = parser.parse_args(argv)
+
+    catalog = Catalog(args.db)
+    if args.command == 'search':
+        start = time.perf_counter()
+        hits = catalog.search(" ".join(args.query), limit=args.limit)
+        print(f"🔍 {len(hits)}件 ({(time.perf_counter() - start) * 1000:.1f}ms)")
+        for hit in hits:
+            print(f"{hit['path']} [{hit['start']:.1f}-{hit['end']:.1f}秒] {hit['snippet']}")
+    elif args.command == 'add':
+        import audio_processor
+        for path in args.paths:
+            result = audio_processor.transcribe_file(path, args.model)
+            catalog.add(path, result, args.model)
+            print(f"✅ 登録: {path}")
+    else:
+        s = catalog.stats()
+        print(f"📚 録音 {s['recordings']}件 / セグメント {s['segments']}件 / {s['audio_seconds'] / 3600:.1f}時間")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
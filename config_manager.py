@@ -8,8 +8,44 @@ CONFIG_FILE = "app_config.json"
 DEFAULT_CONFIG = {
     "model_name": "mlx-community/whisper-base-mlx",
     "record_duration": 10,      # 秒
+    "audio_device": ":0",       # 録音するデバイス (ffmpeg の avfoundation の入力。Macは':0'など)
     "slice_time_ms": 4000,      # ミリ秒
-    "output_filename": "output.wav"
+    "slice_as_refs": False,     # スライスを音声のコピーではなく元のファイルの区間の参照 (.clip) で保存するか
+    "output_filename": "output.wav",
+    "max_loaded_models": 2,     # 常駐させるモデル数の上限
+    "cache_enabled": True,      # 文字起こし結果をキャッシュするか
+    "cache_dir": "transcript_cache",
+    "cache_max_mb": 200,        # キャッシュ全体の上限 (MB)
+    "catalog_enabled": False,   # 文字起こし結果を検索用のカタログ (catalog_path の SQLite) に登録するか
+    "catalog_path": "catalog.db",
+    "vad_enabled": False,       # 発話区間だけを文字起こしするか (無音部分を推論しない)
+    # カスケード: 小さいモデルから順に試し、確信度の低いセグメントだけを次のモデルでやり直す
+    "cascade_enabled": False,
+    "cascade_models": ["mlx-community/whisper-tiny-mlx", "mlx-community/whisper-base-mlx"],
+    "cascade_min_avg_logprob": -1.0,       # 平均対数確率がこれより低ければやり直す
+    "cascade_max_no_speech_prob": 0.6,     # 無音確率がこれより高ければ (確率が低くても) 無音とみなしてやり直さない
+    "cascade_max_compression_ratio": 2.4,  # 圧縮率がこれより高ければ (繰り返しが多い) やり直す
+    "batch_max_size": 1,        # 短い音声をまとめて推論する数の上限 (1ならまとめない。2以上ならまとめてデコードし、失敗した音声だけ1つずつやり直す)
+    "batch_max_wait_ms": 50,    # まとめる音声が届くのを待つ最大時間 (ミリ秒)
+    "worker_count": 2,          # 同時に実行する仕事の数
+    "job_queue_size": 32,       # 待機できる仕事の数の上限
+    "aio_max_workers": 4,       # audio_processor.aio で重い処理 (スライス・文字起こし) を実行するスレッド数
+    "inference_isolated": False, # 推論を別プロセスで行うか (GUIが固まらず、推論が落ちてもアプリは落ちない)
+    "inference_max_restarts": 5, # 推論プロセスが落ちたとき自動で起動し直す回数の上限
+    "use_server": False,        # 文字起こしを文字起こしサーバー (transcribe_server.py) で行うか
+    "server_host": "127.0.0.1",
+    "server_port": 8765,
+    "server_max_jobs": 2,       # サーバーで同時に実行する文字起こしの数
+    "server_queue_sec": 10.0,   # サーバーが同時実行数の上限に達しているとき、空きを待つ秒数 (過ぎたら 503)
+    "server_max_body_mb": 256,  # サーバーが受け付ける本文 (PCM のアップロードなど) の大きさの上限 (MB)
+    "watch_folder": "",         # 監視するフォルダ (空ならGUIで選ぶ)
+    "watch_workers": 2,         # 監視フォルダのファイルを同時に文字起こしする数
+    "watch_settle_sec": 2.0,    # ファイルの大きさがこの秒数変わらなければ書き込み完了とみなす
+    "watch_poll_sec": 1.0,      # 変化を調べる間隔 (inotify が使えないとき)
+    "watch_state_file": "",     # 処理済みファイルの記録 (空なら監視フォルダ内の .transcribe_state.json)
+    "profile_enabled": False,   # 処理時間の計測を記録するか
+    "profile_sink": "profile.jsonl",
+    "profile_memory": False     # 計測時にピークメモリも測るか (少し遅くなる)
 }
 
 def load_config():
@@ -20,8 +56,16 @@ def load_config():
     if not os.path.exists(CONFIG_FILE):
         print("ℹ️ 設定ファイルが見つからないため、デフォルト設定を作成します。")
         save_config(DEFAULT_CONFIG)
-        return DEFAULT_CONFIG
+        return dict(DEFAULT_CONFIG)
+    return read_config()
 
+def read_config():
+    """
+    設定ファイルを読み込む。ファイルがなくても作成せず、デフォルト設定を返す。
+    (ライブラリから使う。ファイルを作るのはアプリの起動時の load_config() だけにする)
+    """
+    if not os.path.exists(CONFIG_FILE):
+        return dict(DEFAULT_CONFIG)
     try:
         with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
             config = json.load(f)
@@ -32,7 +76,7 @@ def load_config():
             return config
     except Exception as e:
         print(f"⚠️ 設定読み込みエラー: {e}。デフォルト設定を使用します。")
-        return DEFAULT_CONFIG
+        return dict(DEFAULT_CONFIG)
 
 def save_config(config_data):
     """
@@ -0,0 +1,409 @@
+# フォルダ監視による一括文字起こし
+# 使い方:
+#   python folder_watcher.py                     # 設定の watch_folder を監視
+#   python folder_watcher.py recordings --workers 4
+# フォルダに置かれた .wav を書き込みが終わるのを待ってから文字起こしし、同じ場所に .txt を保存する
+import os
+import sys
+import json
+import time
+import queue
+import select
+import struct
+import argparse
+import tempfile
+import threading
+
+import audio_processor
+import catalog
+import config_manager
+
+STATE_FILENAME = ".transcribe_state.json"
+
+# ==========================================
+# 変更の検出 (inotify / ポーリング)
+# ==========================================
+def _is_target(name):
+    return name.lower().endswith('.wav') and not name.startswith('.')
+
+def _scan(folder):
+    """フォルダ内の対象ファイルのパスの集合"""
+    try:
+        with os.scandir(folder) as entries:
+            return {entry.path for entry in entries if entry.is_file() and _is_target(entry.name)}
+    except FileNotFoundError:
+        return set()
+
+
+class _PollingSource:
+    """一定間隔でフォルダを調べ、増えた・変わったファイルを返す (どのOSでも動く)"""
+    mode = "polling"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._seen = {}
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return self.changes()
+
+    def changes(self):
+        changed = set()
+        current = {}
+        for path in _scan(self.folder):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            current[path] = (st.st_size, st.st_mtime_ns)
+            if self._seen.get(path) != current[path]:
+                changed.add(path)
+        self._seen = current
+        return changed
+
+    def close(self):
+        pass
+
+
+class _InotifySource:
+    """Linux の inotify で変更を待つ (ポーリングより速く気づき、CPUも使わない)"""
+    mode = "inotify"
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, folder):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.folder = folder
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 に失敗しました")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self._fd, os.fsencode(folder), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch に失敗しました: {folder}")
+
+    def changes(self):
+        # 監視を始める前からあったファイル
+        return _scan(self.folder)
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        changed = set()
+        if not readable:
+            return changed
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        pos = 0
+        while pos + self._EVENT.size <= len(data):
+            _, _, _, length = self._EVENT.unpack_from(data, pos)
+            name = data[pos + self._EVENT.size:pos + self._EVENT.size + length].rstrip(b'\0')
+            pos += self._EVENT.size + length
+            name = os.fsdecode(name)
+            if _is_target(name):
+                changed.add(os.path.join(self.folder, name))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _open_source(folder, use_inotify=True):
+    if use_inotify and sys.platform.startswith('linux'):
+        try:
+            return _InotifySource(folder)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify が使えないためポーリングで監視します: {e}")
+    return _PollingSource(folder)
+
+
+class FolderWatcher:
+    """
+    フォルダを監視し、書き込みが終わった .wav ファイルを知らせるクラス
+    大きさと更新時刻が settle_sec 秒変わらなければ、書き込みが終わったとみなす
+    """
+
+    def __init__(self, folder, on_ready, settle_sec=2.0, poll_sec=1.0, use_inotify=True):
+        """
+        :param folder: 監視するフォルダ
+        :param on_ready: 書き込みが終わったファイルを受け取る関数 on_ready(パス, os.stat の結果) (監視スレッドから呼ばれる)
+        :param settle_sec: 変化がなくなってから待つ秒数
+        :param poll_sec: 変化を調べる間隔（秒）
+        :param use_inotify: Falseなら Linux でもポーリングで監視する
+        """
+        self.folder = os.path.abspath(folder)
+        self.on_ready = on_ready
+        self.settle_sec = settle_sec
+        self.poll_sec = poll_sec
+        self.use_inotify = use_inotify
+        self.mode = None
+        self._pending = {}   # パス -> ((大きさ, 更新時刻), 変化がなくなった時刻)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.folder, exist_ok=True)
+        source = _open_source(self.folder, self.use_inotify)
+        self.mode = source.mode
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(source,), name="folder-watcher", daemon=True)
+        self._thread.start()
+        print(f"👀 フォルダの監視を開始しました ({self.mode}): {self.folder}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, source):
+        try:
+            changed = source.changes()
+            while not self._stop.is_set():
+                for path in changed:
+                    self._pending.setdefault(path, (None, 0.0))
+                self._check_pending()
+                # 書き込み途中のファイルがあるときは、変化がなくても一定間隔で確認する
+                changed = source.wait(min(self.poll_sec, self.settle_sec / 2) if self._pending else self.poll_sec)
+        finally:
+            source.close()
+
+    def _check_pending(self):
+        now = time.monotonic()
+        for path, (previous, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != previous:
+                self._pending[path] = (current, now)
+            elif now - since >= self.settle_sec:
+                del self._pending[path]
+                self.on_ready(path, st)
+
+
+# ==========================================
+# 処理済みファイルの記録
+# ==========================================
+class IngestState:
+    """処理したファイルを JSON に記録し、再起動後に同じファイルを処理しないようにする"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._files = json.load(f).get('files', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 状態ファイルを読み込めません。最初から処理します: {e}")
+
+    def is_done(self, path, st):
+        with self._lock:
+            entry = self._files.get(path)
+        # 失敗したファイルは記録があっても次回やり直す
+        return (entry is not None and entry.get('status') == "done"
+                and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns)
+
+    def mark(self, path, st, status, **info):
+        with self._lock:
+            self._files[path] = dict(info, size=st.st_size, mtime_ns=st.st_mtime_ns, status=status, time=time.time())
+            self._save()
+
+    def _save(self):
+        # 途中で落ちても壊れたファイルが残らないよう、一時ファイルに書いてから置き換える
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".state-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'files': self._files}, f, indent=1, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+# ==========================================
+# 監視フォルダの一括文字起こし
+# ==========================================
+def transcript_path(audio_path):
+    """音声ファイルの隣に置く文字起こし結果のパス"""
+    return os.path.splitext(audio_path)[0] + ".txt"
+
+
+class FolderIngest:
+    """
+    監視フォルダに置かれた音声を、決まった数のスレッドで文字起こしして .txt に保存するクラス
+    """
+
+    def __init__(self, folder, model_name="mlx-community/whisper-base-mlx", workers=2, settle_sec=2.0,
+                 poll_sec=1.0, state_file=None, engine=None, use_inotify=True, on_result=None):
+        """
+        :param folder: 監視するフォルダ
+        :param model_name: 使用するWhisperモデル名
+        :param workers: 同時に文字起こしするファイルの数
+        :param settle_sec: 書き込みが終わったとみなすまでの秒数
+        :param poll_sec: 変化を調べる間隔（秒）
+        :param state_file: 処理済みファイルの記録 (省略時はフォルダ内の .transcribe_state.json)
+        :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+        :param on_result: 1件終わるたびに呼ばれる関数 on_result(パス, 結果の辞書 または エラーメッセージ)
+        """
+        self.folder = os.path.abspath(folder)
+        self.model_name = model_name
+        self.workers = max(1, int(workers))
+        self.engine = engine
+        self.on_result = on_result or (lambda path, result: None)
+        self.state = IngestState(state_file or os.path.join(self.folder, STATE_FILENAME))
+        self.watcher = FolderWatcher(self.folder, self._on_ready, settle_sec, poll_sec, use_inotify)
+
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started = None
+        self.running = 0
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.audio_seconds = 0.0
+
+    def start(self):
+        self._started = time.monotonic()
+        self._threads = [threading.Thread(target=self._work, name=f"ingest-{k}", daemon=True)
+                         for k in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        self.watcher.start()
+
+    def stop(self, wait=True):
+        """監視をやめる。wait=True なら実行中のファイルが終わるまで待つ (待機中のものは次回に回す)"""
+        self.watcher.stop()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            # 次に start() したとき、待機中だったファイルをもう一度受け付けられるようにする
+            if item is not None:
+                with self._lock:
+                    self._queued.discard(item[0])
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def stats(self):
+        """処理の進み具合 (待機中の数、処理した数、処理速度など) の辞書"""
+        with self._lock:
+            elapsed = time.monotonic() - self._started if self._started else 0.0
+            return {
+                'mode': self.watcher.mode,
+                'queued': self._queue.qsize(),
+                'running': self.running,
+                'done': self.done,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'audio_seconds': self.audio_seconds,
+                'elapsed': elapsed,
+                'files_per_min': self.done * 60 / elapsed if elapsed else 0.0,
+                # 1秒あたりに処理した音声の秒数
+                'speed': self.audio_seconds / elapsed if elapsed else 0.0,
+            }
+
+    def _on_ready(self, path, st):
+        if self.state.is_done(path, st):
+            with self._lock:
+                self.skipped += 1
+            return
+        with self._lock:
+            if path in self._queued:
+                return
+            self._queued.add(path)
+        self._queue.put((path, st))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, st = item
+            with self._lock:
+                self.running += 1
+            try:
+                result = audio_processor.transcribe_file(path, self.model_name, self.engine)
+                with open(transcript_path(path), 'w', encoding='utf-8') as f:
+                    f.write(result['text'] + "\n")
+                _, channels, rate, bits, _, data_size = audio_processor.read_wav_header(path)
+                seconds = data_size / (rate * channels * bits // 8)
+                self.state.mark(path, st, "done", transcript=transcript_path(path), seconds=seconds)
+                with self._lock:
+                    self.done += 1
+                    self.audio_seconds += seconds
+                print(f"✅ 完了: {path}")
+                catalog.record_result(path, result, self.model_name)
+                self.on_result(path, result)
+            except Exception as e:
+                self.state.mark(path, st, "error", error=str(e))
+                with self._lock:
+                    self.failed += 1
+                print(f"❌ 文字起こしエラー: {path}: {e}")
+                self.on_result(path, f"エラーが発生しました: {e}")
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self._queued.discard(path)
+
+
+def create_ingest(config=None, folder=None, **kwargs):
+    """設定 (watch_* の項目) に従って FolderIngest を作る"""
+    if config is None:
+        config = config_manager.read_config()
+    folder = folder or config.get('watch_folder') or "watch"
+    return FolderIngest(
+        folder,
+        model_name=config.get('model_name', 'mlx-community/whisper-base-mlx'),
+        workers=config.get('watch_workers', 2),
+        settle_sec=config.get('watch_settle_sec', 2.0),
+        poll_sec=config.get('watch_poll_sec', 1.0),
+        state_file=config.get('watch_state_file') or None,
+        **kwargs
+    )
+
+def main(argv=None):
+    config = config_manager.load_config()
+    parser = argparse.ArgumentParser(description="フォルダを監視して文字起こしする")
+    parser.add_argument('folder', nargs='?', default=config.get('watch_folder') or "watch")
+    parser.add_argument('--workers', type=int, default=config.get('watch_workers', 2))
+    parser.add_argument('--report-sec', type=float, default=10.0, help="進み具合を表示する間隔（秒）")
+    args = parser.parse_args(argv)
+
+    ingest = create_ingest(dict(config, watch_workers=args.workers), folder=args.folder)
+    ingest.start()
+    try:
+        while True:
+            time.sleep(args.report_sec)
+            s = ingest.stats()
+            print(f"📊 待機 {s['queued']}件 / 処理中 {s['running']}件 / 完了 {s['done']}件 / 失敗 {s['failed']}件  "
+                  f"{s['files_per_min']:.1f}件/分, {s['speed']:.1f}倍速")
+    except KeyboardInterrupt:
+        print("\n👋 監視を終了します")
+    finally:
+        ingest.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
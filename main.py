@@ -1,43 +1,200 @@
 # main_gui.py
+import asyncio
+import os
 import sys
+import time
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QLabel, QLineEdit,
-    QVBoxLayout, QWidget, QFileDialog, QMessageBox
+    QVBoxLayout, QWidget, QFileDialog, QMessageBox, QPlainTextEdit, QListWidget, QListWidgetItem
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer, QLineF, pyqtSignal
+from PyQt6.QtGui import QPainter, QColor
 
-from async_worker import AudioWorker
+from async_worker import JobScheduler, ProcessEngineSignals, IngestSignals, AsyncBridgeSignals
+import audio_processor
+from audio_processor import aio
+import catalog
 import config_manager
+import profiler
+import transcribe_client
+
+class WaveformView(QWidget):
+    """
+    録音の波形を表示するウィジェット
+    waveform.PeakPyramid から表示幅ぶんの列だけを取り出して描くので、長いファイルでも描画の手間は変わらない。
+    ホイールで拡大・縮小し、クリックした位置をミリ秒で通知する
+    """
+    position_clicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pyramid = None
+        self.view_start = 0   # 表示している範囲 (フレーム)
+        self.view_end = 0
+        self.marker_ms = None
+        self.setMinimumHeight(80)
+
+    def set_pyramid(self, pyramid):
+        self.pyramid = pyramid
+        self.view_start, self.view_end = 0, pyramid.frames if pyramid is not None else 0
+        self.update()
+
+    def set_marker(self, ms):
+        self.marker_ms = ms
+        self.update()
+
+    def show_range(self, start_sec, end_sec):
+        """指定した区間 (前後に少し余白をつける) を表示する"""
+        if self.pyramid is None:
+            return
+        rate, frames = self.pyramid.rate, self.pyramid.frames
+        margin = max(0.5, (end_sec - start_sec) * 0.1)
+        self.view_start = max(0, int((start_sec - margin) * rate))
+        self.view_end = min(frames, max(self.view_start + self.width(), int((end_sec + margin) * rate)))
+        self.update()
+
+    def frame_at(self, x):
+        return self.view_start + (self.view_end - self.view_start) * x / max(1, self.width())
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(30, 30, 30))
+        if self.pyramid is None or self.view_end <= self.view_start:
+            painter.setPen(QColor(150, 150, 150))
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "波形なし")
+            return
+        width, mid = self.width(), self.height() / 2
+        lo, hi = self.pyramid.columns(self.view_start, self.view_end, width)
+        painter.setPen(QColor(80, 180, 255))
+        painter.drawLines([QLineF(x, mid - top * mid, x, mid - bottom * mid)
+                           for x, (bottom, top) in enumerate(zip(lo.tolist(), hi.tolist()))])
+        if self.marker_ms is not None:
+            frame = self.marker_ms * self.pyramid.rate / 1000
+            if self.view_start <= frame <= self.view_end:
+                x = (frame - self.view_start) * width / (self.view_end - self.view_start)
+                painter.setPen(QColor(255, 80, 80))
+                painter.drawLine(QLineF(x, 0, x, self.height()))
+
+    def wheelEvent(self, event):
+        # マウスの位置を中心に拡大・縮小する (1画素1フレームより細かくはしない)
+        if self.pyramid is None:
+            return
+        center = self.frame_at(event.position().x())
+        scale = 0.8 if event.angleDelta().y() > 0 else 1.25
+        span = min(self.pyramid.frames, max(self.width(), (self.view_end - self.view_start) * scale))
+        start = min(max(0, center - (center - self.view_start) * scale), self.pyramid.frames - span)
+        self.view_start, self.view_end = int(start), int(start + span)
+        self.update()
+
+    def mousePressEvent(self, event):
+        if self.pyramid is None or event.button() != Qt.MouseButton.LeftButton:
+            return
+        self.position_clicked.emit(int(self.frame_at(event.position().x()) * 1000 / self.pyramid.rate))
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("音声録音・文字起こしアプリ")
-        self.setGeometry(100, 100, 400, 250)
+        self.setGeometry(100, 100, 400, 450)
 
-        # 設定読み込み
+        # 設定読み込み (audio_processor などのライブラリには保存済みの設定を渡す)
         self.config = config_manager.load_config()
+        audio_processor.set_settings(dict(self.config))
+        if self.config.get('profile_enabled'):
+            profiler.enable(self.config.get('profile_sink', 'profile.jsonl'),
+                            trace_memory=self.config.get('profile_memory', False))
+
+        # 推論を別プロセスで行う設定なら、共有エンジンを子プロセスで推論するものに差し替える
+        self.process_engine = None
+        if self.config.get('inference_isolated'):
+            from process_engine import ProcessEngine
+            self.engine_signals = ProcessEngineSignals()
+            self.engine_signals.event_signal.connect(self.on_engine_event)
+            self.process_engine = ProcessEngine(
+                max_models=self.config.get('max_loaded_models', 2),
+                max_restarts=self.config.get('inference_max_restarts', 5),
+                on_event=self.engine_signals.event_signal.emit,
+            )
+            audio_processor.set_engine(self.process_engine)
+
+        # 録音・文字起こしの仕事はスケジューラのキューに入れて順に実行する
+        self.scheduler = JobScheduler(
+            max_workers=self.config.get('worker_count', 2),
+            max_queue=self.config.get('job_queue_size', 32),
+        )
+        # 短い非同期の処理 (audio_processor.aio) は、async def のスロットの中で await する
+        self.bridge_signals = AsyncBridgeSignals()
+        self.bridge_signals.call_signal.connect(lambda func: func())
+        self.bridge = aio.AsyncBridge(self.bridge_signals.call_signal.emit)
+        self.job_names = {}   # ジョブID -> 表示用の名前
+        self.waveform_jobs = set()    # 波形を読み込んでいるジョブ
+        self.recording_jobs = set()   # 出力ファイルに録音するジョブ (終わったら波形を読み直す)
+        self.pending_range = None     # 波形を読み込んだら表示する区間 (検索結果から開いたとき)
+        # use_server が有効なら、文字起こしは常駐している文字起こしサーバーに任せる
+        self.server_url = transcribe_client.server_url(self.config) if self.config.get('use_server') else None
+        self.scheduler.job_started.connect(self.on_job_started)
+        self.scheduler.job_progress.connect(self.on_progress)
+        self.scheduler.job_finished.connect(self.on_success)
+        self.scheduler.job_error.connect(self.on_error)
+        self.scheduler.job_cancelled.connect(self.on_cancelled)
+        self.scheduler.job_timings.connect(self.on_timings)
 
         # ウィジェット作成
         self.filename_label = QLabel(f"出力ファイル: {self.config['output_filename']}")
+        # 波形をクリックした位置をスライス位置 (slice_time_ms) にする
+        self.waveform_view = WaveformView()
+        self.waveform_view.set_marker(self.config.get('slice_time_ms', 4000))
         self.status_label = QLabel("ステータス: 待機中")
         self.duration_input = QLineEdit(str(self.config.get('record_duration', 10)))
         self.duration_input.setPlaceholderText("録音時間（秒）")
 
         self.record_button = QPushButton("録音開始")
         self.transcribe_button = QPushButton("文字起こし")
+        self.quick_button = QPushButton("録音して文字起こし")
+        self.live_button = QPushButton("ライブ文字起こし")
+        self.batch_button = QPushButton("複数ファイル文字起こし")
+        self.watch_button = QPushButton("フォルダ監視開始")
+        self.cancel_button = QPushButton("すべてキャンセル")
         self.select_file_button = QPushButton("ファイル選択")
         self.save_config_button = QPushButton("設定保存")
 
+        # ライブ文字起こしの途中経過を表示する欄
+        self.live_text = QPlainTextEdit()
+        self.live_text.setReadOnly(True)
+        self.live_text.setPlaceholderText("ライブ文字起こしの結果がここに表示されます")
+
+        # 完了した仕事の結果を順に表示する欄
+        self.result_log = QPlainTextEdit()
+        self.result_log.setReadOnly(True)
+        self.result_log.setPlaceholderText("文字起こしの結果がここに表示されます")
+
+        # これまでの文字起こし結果から発言を検索する欄
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("発言を検索 (Enterで検索)")
+        self.search_results = QListWidget()
+        self.slice_hit_button = QPushButton("選択した発言を切り出し")
+
         # レイアウト
         layout = QVBoxLayout()
         layout.addWidget(self.filename_label)
+        layout.addWidget(self.waveform_view)
         layout.addWidget(self.select_file_button)
         layout.addWidget(QLabel("録音時間（秒）:"))
         layout.addWidget(self.duration_input)
         layout.addWidget(self.record_button)
         layout.addWidget(self.transcribe_button)
+        layout.addWidget(self.quick_button)
+        layout.addWidget(self.live_button)
+        layout.addWidget(self.batch_button)
+        layout.addWidget(self.watch_button)
+        layout.addWidget(self.cancel_button)
         layout.addWidget(self.save_config_button)
+        layout.addWidget(self.live_text)
+        layout.addWidget(self.result_log)
+        layout.addWidget(self.search_input)
+        layout.addWidget(self.search_results)
+        layout.addWidget(self.slice_hit_button)
         layout.addWidget(self.status_label)
 
         container = QWidget()
@@ -47,6 +204,24 @@ class MainWindow(QMainWindow):
         # シグナル接続
         self.record_button.clicked.connect(self.start_record)
         self.transcribe_button.clicked.connect(self.start_transcribe)
+        self.quick_button.clicked.connect(self.start_record_and_transcribe)
+        self.live_button.clicked.connect(self.start_live_transcribe)
+        self.batch_button.clicked.connect(self.start_batch_transcribe)
+        self.watch_button.clicked.connect(self.toggle_watch)
+        self.waveform_view.position_clicked.connect(self.set_slice_time)
+        self.search_input.returnPressed.connect(self.search_transcripts)
+        self.search_results.itemDoubleClicked.connect(self.open_search_hit)
+        self.slice_hit_button.clicked.connect(self.bridge.slot(self.slice_search_hit))
+        self.cancel_button.clicked.connect(self.cancel_all)
+
+        # フォルダ監視 (開始するまで作らない)
+        self.ingest = None
+        self.ingest_signals = IngestSignals()
+        self.ingest_signals.result_signal.connect(self.on_ingest_result)
+        self.ingest_timer = QTimer(self)
+        self.ingest_timer.timeout.connect(self.show_ingest_stats)
+        # 閉じるときに、実行中の仕事が止まるのを待つタイマー (closeEvent で作る)
+        self.closing_timer = None
         self.select_file_button.clicked.connect(self.select_file)
         self.save_config_button.clicked.connect(self.save_config)
 
@@ -57,6 +232,68 @@ class MainWindow(QMainWindow):
         if file_path:
             self.config['output_filename'] = file_path
             self.filename_label.setText(f"出力ファイル: {file_path}")
+            self.load_waveform()
+
+    def load_waveform(self):
+        """出力ファイルの波形を読み込む (ファイルがまだなければ空にする)"""
+        filename = self.config['output_filename']
+        if not os.path.exists(filename):
+            self.waveform_view.set_pyramid(None)
+            return
+        job_id = self.submit_job("波形読み込み", "peaks", priority=5, filename=filename)
+        if job_id is not None:
+            self.waveform_jobs.add(job_id)
+
+    def search_transcripts(self):
+        """カタログから発言を検索し、一致したセグメントを一覧に出す"""
+        shared = catalog.get_catalog()
+        if shared is None:
+            self.update_status("カタログが無効です (catalog_enabled)")
+            return
+        start = time.perf_counter()
+        hits = shared.search(self.search_input.text(), limit=200)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.search_results.clear()
+        for hit in hits:
+            item = QListWidgetItem(
+                f"{os.path.basename(hit['path'])} [{hit['start']:.1f}-{hit['end']:.1f}秒] {hit['snippet']}")
+            item.setData(Qt.ItemDataRole.UserRole, hit)
+            self.search_results.addItem(item)
+        self.update_status(f"検索結果 {len(hits)}件 ({elapsed:.1f}ms)")
+
+    def open_search_hit(self, item):
+        """検索結果の録音を開き、その発言の区間を表示してスライス位置にする"""
+        hit = item.data(Qt.ItemDataRole.UserRole)
+        self.config['output_filename'] = hit['path']
+        self.filename_label.setText(f"出力ファイル: {hit['path']}")
+        self.pending_range = (hit['start'], hit['end'])
+        self.set_slice_time(int(hit['start'] * 1000))
+        self.load_waveform()
+
+    async def slice_search_hit(self):
+        """選択した検索結果の発言の区間を切り出す (切り出しは別スレッドで行い、その間も画面は動く)"""
+        item = self.search_results.currentItem()
+        if item is None:
+            QMessageBox.information(self, "情報", "切り出す発言を検索結果から選んでください。")
+            return
+        hit = item.data(Qt.ItemDataRole.UserRole)
+        self.update_status("切り出し中...")
+        try:
+            output = await self.bridge.run(aio.slice_range(hit['path'], hit['start'] * 1000, hit['end'] * 1000))
+        except asyncio.CancelledError:
+            self.update_status("切り出しをキャンセルしました")
+            return
+        if output is None:
+            QMessageBox.critical(self, "エラー", "切り出しに失敗しました。")
+            return
+        self.result_log.appendPlainText(f"✂️ 切り出し: {output}")
+        self.update_status("切り出し完了")
+
+    def set_slice_time(self, ms):
+        """波形をクリックした位置を slice_audio で分割する位置にする (設定保存で保存される)"""
+        self.config['slice_time_ms'] = ms
+        self.waveform_view.set_marker(ms)
+        self.update_status(f"スライス位置: {ms / 1000:.2f}秒")
 
     def save_config(self):
         # 録音時間を保存
@@ -67,47 +304,207 @@ class MainWindow(QMainWindow):
             return
 
         config_manager.save_config(self.config)
+        audio_processor.set_settings(dict(self.config))
         QMessageBox.information(self, "情報", "設定を保存しました。")
 
+    def submit_job(self, name, task_type, priority=10, **kwargs):
+        """仕事をスケジューラに入れる。キューが満杯なら警告を出す"""
+        job_id = self.scheduler.submit(task_type, priority=priority, **kwargs)
+        if job_id is None:
+            QMessageBox.warning(self, "警告", "待機中の仕事が多すぎます。しばらく待ってから実行してください。")
+            return None
+        self.job_names[job_id] = name
+        self.update_status(f"#{job_id} {name} を待機中")
+        return job_id
+
+    def submit_recording(self, name, task_type, **kwargs):
+        """出力ファイルに録音する仕事を入れる。録音は実時間で進むので、待機中の文字起こしより先に実行する"""
+        kwargs.setdefault('audio_device', self.config.get('audio_device', ':0'))
+        job_id = self.submit_job(name, task_type, priority=0, **kwargs)
+        if job_id is not None:
+            self.recording_jobs.add(job_id)
+        return job_id
+
+    def update_status(self, message):
+        self.status_label.setText(f"ステータス: {message}（残り {self.scheduler.pending_count()} 件）")
+
     def start_record(self):
-        self.status_label.setText("ステータス: 録音中...")
         filename = self.config['output_filename']
         duration = int(self.duration_input.text())
-        self.record_button.setEnabled(False)
-        self.transcribe_button.setEnabled(False)
-
-        self.worker = AudioWorker("record", filename=filename, duration=duration)
-        self.worker.finished_signal.connect(self.on_success)
-        self.worker.error_signal.connect(self.on_error)
-        self.worker.start()
+        self.submit_recording("録音", "record", filename=filename, duration=duration)
 
     def start_transcribe(self):
-        self.status_label.setText("ステータス: 文字起こし中...")
         filename = self.config['output_filename']
         model = self.config.get('model_name', 'mlx-community/whisper-base-mlx')
-        self.record_button.setEnabled(False)
-        self.transcribe_button.setEnabled(False)
+        self.submit_job(f"文字起こし ({filename})", "transcribe", filename=filename, model=model,
+                        server_url=self.server_url)
+
+    def start_record_and_transcribe(self):
+        filename = self.config['output_filename']
+        duration = int(self.duration_input.text())
+        model = self.config.get('model_name', 'mlx-community/whisper-base-mlx')
+        # 録音した音声はメモリ上でそのまま文字起こしし、WAVの保存は並行して行う
+        self.submit_recording("録音して文字起こし", "record_and_transcribe",
+                              filename=filename, duration=duration, model=model, server_url=self.server_url)
+
+    def start_batch_transcribe(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "文字起こしするファイルを選択", "", "WAV Files (*.wav)")
+        model = self.config.get('model_name', 'mlx-community/whisper-base-mlx')
+        for file_path in file_paths:
+            if self.submit_job(f"文字起こし ({file_path})", "transcribe", filename=file_path, model=model,
+                               server_url=self.server_url) is None:
+                break
+
+    def toggle_watch(self):
+        """監視フォルダに置かれた音声の自動文字起こしを開始・停止する"""
+        import folder_watcher
+
+        if self.ingest is not None:
+            self.ingest_timer.stop()
+            self.ingest.stop(wait=False)
+            self.ingest = None
+            self.watch_button.setText("フォルダ監視開始")
+            self.update_status("フォルダ監視を停止しました")
+            return
+
+        folder = self.config.get('watch_folder')
+        if not folder:
+            folder = QFileDialog.getExistingDirectory(self, "監視するフォルダを選択")
+            if not folder:
+                return
+            self.config['watch_folder'] = folder
+        self.ingest = folder_watcher.create_ingest(self.config, on_result=self.ingest_signals.result_signal.emit)
+        self.ingest.start()
+        self.watch_button.setText("フォルダ監視停止")
+        self.ingest_timer.start(2000)
+        self.show_ingest_stats()
+
+    def show_ingest_stats(self):
+        s = self.ingest.stats()
+        self.status_label.setText(
+            f"ステータス: フォルダ監視中 ({s['mode']}) 待機 {s['queued']}件 / 処理中 {s['running']}件 / "
+            f"完了 {s['done']}件 / 失敗 {s['failed']}件, {s['files_per_min']:.1f}件/分"
+        )
+
+    def on_ingest_result(self, path, result):
+        if isinstance(result, dict):
+            self.result_log.appendPlainText(f"[監視 {path}]\n{result.get('text', '')}\n")
+        else:
+            self.result_log.appendPlainText(f"[監視 {path}] {result}")
+
+    def start_live_transcribe(self):
+        filename = self.config['output_filename']
+        duration = int(self.duration_input.text())
+        model = self.config.get('model_name', 'mlx-community/whisper-base-mlx')
+        self.live_text.clear()
+        self.submit_recording("ライブ文字起こし", "stream", filename=filename, duration=duration, model=model)
+
+    def preload_model(self):
+        """起動直後にモデルを読み込んでおき、最初の文字起こしを速くする"""
+        model = self.config.get('model_name', 'mlx-community/whisper-base-mlx')
+        self.submit_job("モデル準備", "preload", priority=0, model=model, server_url=self.server_url)
+
+    def on_job_started(self, job_id):
+        self.update_status(f"#{job_id} {self.job_names.get(job_id, '')} を実行中...")
 
-        self.worker = AudioWorker("transcribe", filename=filename, model=model)
-        self.worker.finished_signal.connect(self.on_success)
-        self.worker.error_signal.connect(self.on_error)
-        self.worker.start()
+    def on_progress(self, job_id, value):
+        # ライブ文字起こしの途中経過
+        self.live_text.setPlainText(str(value))
 
-    def on_success(self, result):
-        self.status_label.setText(f"ステータス: 完了")
-        QMessageBox.information(self, "完了", str(result))
-        self.record_button.setEnabled(True)
-        self.transcribe_button.setEnabled(True)
+    def on_timings(self, job_id, records):
+        # 計測が有効なときだけ、処理段階ごとの時間を結果欄に出す
+        if not profiler.is_enabled() or not records:
+            return
+        summary = profiler.summarize(records)
+        parts = [f"{name} {item['wall']:.2f}秒" for name, item in summary.items()]
+        self.result_log.appendPlainText(f"[#{job_id} 計測] " + ", ".join(parts))
+
+    def on_engine_event(self, kind, detail):
+        """推論プロセスからの通知"""
+        if kind == 'progress':
+            self.update_status(detail)
+        elif kind == 'crashed':
+            self.result_log.appendPlainText(f"⚠️ {detail}")
+        elif kind == 'restarted':
+            self.result_log.appendPlainText("🔁 推論プロセスを再起動しました")
+        elif kind == 'gave_up':
+            self.result_log.appendPlainText(f"❌ 推論プロセスを再起動できません: {detail}")
+
+    def on_success(self, job_id, result):
+        name = self.job_names.pop(job_id, "")
+        if job_id in self.waveform_jobs:
+            self.waveform_jobs.discard(job_id)
+            self.waveform_view.set_pyramid(result)
+            if self.pending_range is not None:
+                self.waveform_view.show_range(*self.pending_range)
+                self.pending_range = None
+            self.update_status(f"#{job_id} 波形を表示しました ({result.duration:.1f}秒)")
+            return
+        if job_id in self.recording_jobs:
+            self.recording_jobs.discard(job_id)
+            self.load_waveform()
+        if isinstance(result, dict):
+            # 文字起こしの結果はキャッシュを使ったかどうかも表示する
+            cached = "（キャッシュ）" if result.get('cache') == 'hit' else ""
+            self.result_log.appendPlainText(f"[#{job_id} {name}]{cached}\n{result.get('text', '')}\n")
+            if result.get('cascade'):
+                self.result_log.appendPlainText(
+                    f"[#{job_id} カスケード] {audio_processor.describe_cascade(result['cascade'])}")
+            self.update_status(f"#{job_id} 完了{cached}")
+        else:
+            self.update_status(f"#{job_id} {result}")
 
-    def on_error(self, msg):
-        self.status_label.setText("ステータス: エラー")
-        QMessageBox.critical(self, "エラー", msg)
-        self.record_button.setEnabled(True)
-        self.transcribe_button.setEnabled(True)
+    def on_error(self, job_id, msg):
+        name = self.job_names.pop(job_id, "")
+        self.waveform_jobs.discard(job_id)
+        self.recording_jobs.discard(job_id)
+        self.update_status(f"#{job_id} エラー")
+        QMessageBox.critical(self, "エラー", f"{name}: {msg}")
+
+    def on_cancelled(self, job_id):
+        name = self.job_names.pop(job_id, "")
+        self.waveform_jobs.discard(job_id)
+        self.recording_jobs.discard(job_id)
+        self.update_status(f"#{job_id} {name} をキャンセルしました")
+
+    def cancel_all(self):
+        """キューの仕事と、await している非同期の処理をすべてキャンセルする"""
+        self.scheduler.cancel_all()
+        self.bridge.cancel_all()
+
+    def closeEvent(self, event):
+        # 待機中の仕事は捨て、実行中の仕事には止まるよう合図する。
+        # 止まるまでは閉じずに (GUI を固めずに) 少しずつ様子を見て、止まってから後片付けをする
+        self.cancel_all()
+        # 初回だけ、空いているスレッドが止まるのを少し待つ (GUI が固まるほどは待たない)
+        if not self.scheduler.shutdown(timeout=0.1 if self.closing_timer is None else 0):
+            event.ignore()
+            if self.closing_timer is None:
+                self.setEnabled(False)
+                self.update_status("終了しています (実行中の仕事が止まるのを待っています)")
+                self.closing_timer = QTimer(self)
+                self.closing_timer.timeout.connect(self.close)
+                self.closing_timer.start(200)
+            return
+        if self.closing_timer is not None:
+            self.closing_timer.stop()
+        aio.shutdown()
+        if self.ingest is not None:
+            self.ingest.stop()
+        if self.process_engine is not None:
+            self.process_engine.close()
+        # チャンクの並列推論で立ち上げた子プロセスを止める
+        import process_engine
+        process_engine.close_pool()
+        # 結果を登録する処理がすべて止まってからカタログを閉じる
+        catalog.close_catalog()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    window.preload_model()
+    window.load_waveform()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,424 @@
+import os
+import queue
+import itertools
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import audio_processor
+import profiler
+
+# ==========================================
+# 別プロセスで推論する文字起こしエンジン
+# ==========================================
+# モデルと推論ループを子プロセスに閉じ込めるので、推論中もGUIのスレッドがGILで待たされず、
+# バックエンド (ネイティブコード) が落ちてもアプリ本体は落ちない。
+# 音声は pickle せず、共有メモリ (multiprocessing.shared_memory) に書いて名前だけを渡す。
+
+
+class WorkerCrashedError(Exception):
+    """推論中に子プロセスが異常終了したとき"""
+
+
+def _make_backend(backend, options):
+    if backend == "fake":
+        return audio_processor.FakeBackend(**options)
+    return audio_processor.MlxWhisperBackend(**options)
+
+def _attach(name):
+    """親が作った共有メモリを開く (解放は親が行うので、子の側では管理しない)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.12 以前は track 引数がない。spawn で起動した子は親と同じ resource_tracker を使うので、
+        # ここで登録されても親の unlink() で一緒に取り消される
+        return shared_memory.SharedMemory(name=name)
+
+def _worker_main(conn, backend, backend_options, max_models):
+    """子プロセスの本体。親からの依頼を1件ずつ処理して結果を返す"""
+    np = audio_processor.np
+    engine = audio_processor.TranscriptionEngine(_make_backend(backend, backend_options), max_models)
+    conn.send(('ready', None, os.getpid(), []))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        kind, call_id = message[0], message[1]
+        if kind == 'stop':
+            break
+        try:
+            if kind == 'preload':
+                engine.get_model(message[2])
+                reply = None
+            elif kind == 'unload':
+                engine.unload(message[2])
+                reply = None
+            elif kind == 'transcribe':
+                _, _, shm_name, dtype, lengths, model_name, options = message
+                if not engine.is_loaded(model_name):
+                    conn.send(('progress', call_id, f"モデル読み込み中: {model_name}", None))
+                conn.send(('progress', call_id, f"推論中 ({len(lengths)}件, {sum(lengths) / 16000:.1f}秒)", None))
+                shm = _attach(shm_name)
+                try:
+                    audio = np.ndarray((sum(lengths),), dtype=dtype, buffer=shm.buf)
+                    offsets = np.concatenate(([0], np.cumsum(lengths)))
+                    clips = [audio[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+                    if audio.dtype == np.int16:
+                        # float32 への変換はエンジンがバックエンドに渡すときに行う
+                        clips = [audio_processor.AudioBuffer(clip, 16000) for clip in clips]
+                    if len(clips) == 1:
+                        reply = [engine.transcribe(clips[0], model_name, **options)]
+                    else:
+                        reply = engine.transcribe_batch(clips, model_name, **options)
+                    # 共有メモリを閉じる前に、そこを指している配列を手放す
+                    del audio, clips
+                finally:
+                    shm.close()
+            else:
+                raise ValueError(f"不明な依頼です: {kind}")
+            conn.send(('ok', call_id, reply, engine.loaded_models()))
+        except Exception as e:
+            conn.send(('error', call_id, f"{type(e).__name__}: {e}", engine.loaded_models()))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.value = None
+
+
+class ProcessEngine:
+    """
+    TranscriptionEngine と同じ使い方で、推論を常駐する子プロセスで行うエンジン
+    audio_processor.set_engine() に渡せば、文字起こしの処理はすべて子プロセスで推論される。
+    子プロセスが異常終了したら、実行中の依頼を WorkerCrashedError で失敗させ、自動で起動し直す。
+    """
+
+    def __init__(self, backend="mlx", backend_options=None, max_models=2, max_restarts=5, on_event=None):
+        """
+        :param backend: 子プロセスで使うバックエンド ("mlx" または "fake")
+        :param backend_options: バックエンドのコンストラクタに渡す引数
+        :param max_models: 子プロセスで同時に保持するモデル数の上限
+        :param max_restarts: 自動で起動し直す回数の上限
+        :param on_event: 出来事を受け取る関数 on_event(種類, 内容)。種類は
+                         'started', 'progress', 'crashed', 'restarted', 'gave_up' (別スレッドから呼ばれる)
+        """
+        self.backend_name = backend
+        self.backend_options = backend_options or {}
+        self.max_models = max_models
+        self.max_restarts = max_restarts
+        self.on_event = on_event or (lambda kind, detail: None)
+        self.restarts = 0
+        self._ids = itertools.count(1)
+        self._calls = {}
+        self._loaded = []
+        self._lock = threading.RLock()
+        self._send_lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        self._closed = False
+
+    # ---- 子プロセスの管理 ----
+    @property
+    def pid(self):
+        return self._process.pid if self._process is not None else None
+
+    def start(self):
+        """子プロセスを起動する (依頼を出せば自動で起動するので、呼ばなくてもよい)"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ProcessEngine は終了しています")
+            if self._process is not None and self._process.is_alive():
+                return
+            ctx = multiprocessing.get_context('spawn')
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker_main,
+                args=(child_conn, self.backend_name, self.backend_options, self.max_models),
+                name="inference-worker", daemon=True,
+            )
+            process.start()
+            # 子プロセスが落ちたとき recv() が EOFError になるよう、親の側の子の端は閉じる
+            child_conn.close()
+            self._process, self._conn = process, parent_conn
+            threading.Thread(target=self._read_loop, args=(process, parent_conn),
+                             name="inference-reader", daemon=True).start()
+        self.on_event('started', str(process.pid))
+
+    def close(self):
+        """子プロセスを止める"""
+        with self._lock:
+            self._closed = True
+            process, conn = self._process, self._conn
+        if process is None:
+            return
+        try:
+            with self._send_lock:
+                conn.send(('stop', None))
+        except (OSError, ValueError):
+            pass
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _read_loop(self, process, conn):
+        while True:
+            try:
+                kind, call_id, value, loaded = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == 'progress':
+                self.on_event('progress', value)
+                continue
+            if loaded is not None:
+                self._loaded = loaded
+            call = self._calls.pop(call_id, None) if call_id is not None else None
+            if call is not None:
+                call.ok, call.value = kind == 'ok', value
+                call.done.set()
+
+        # 子プロセスが終わった
+        process.join(timeout=5)
+        conn.close()
+        with self._lock:
+            if self._process is not process:
+                return
+            self._process = None
+            pending, self._calls = self._calls, {}
+            closed = self._closed
+        message = f"推論プロセスが異常終了しました (終了コード {process.exitcode})"
+        for call in pending.values():
+            call.value = WorkerCrashedError(message)
+            call.done.set()
+        if closed:
+            return
+
+        print(f"❌ {message}")
+        self.on_event('crashed', message)
+        models, self._loaded = self._loaded, []
+        if self.restarts >= self.max_restarts:
+            self.on_event('gave_up', f"再起動の上限 ({self.max_restarts}回) に達しました")
+            return
+        self.restarts += 1
+        print(f"🔁 推論プロセスを再起動します ({self.restarts}回目)")
+        self.start()
+        self.on_event('restarted', str(self.pid))
+        # 落ちる前に読み込んでいたモデルを読み込み直しておく
+        for model_name in models:
+            self.preload_async(model_name)
+
+    def _call(self, message):
+        self.start()
+        call = _Call()
+        call_id = next(self._ids)
+        with self._lock:
+            self._calls[call_id] = call
+            conn = self._conn
+        try:
+            with self._send_lock:
+                conn.send((message[0], call_id) + tuple(message[1:]))
+        except (OSError, ValueError) as e:
+            with self._lock:
+                self._calls.pop(call_id, None)
+            raise WorkerCrashedError(f"推論プロセスに依頼を送れません: {e}")
+        call.done.wait()
+        if isinstance(call.value, WorkerCrashedError):
+            raise call.value
+        if not call.ok:
+            raise RuntimeError(call.value)
+        return call.value
+
+    # ---- TranscriptionEngine と同じメソッド ----
+    # 子プロセスは依頼を1件ずつ処理するので、複数のスレッドから呼んでも並列にはならない
+    parallel = False
+
+    def backend_args(self):
+        return (self.backend_name, dict(self.backend_options))
+
+    def preload(self, model_name):
+        try:
+            self._call(('preload', model_name))
+            return True
+        except Exception as e:
+            print(f"❌ モデル読み込みエラー: {e}")
+            return False
+
+    def preload_async(self, model_name):
+        thread = threading.Thread(target=self.preload, args=(model_name,), daemon=True)
+        thread.start()
+        return thread
+
+    def is_loaded(self, model_name):
+        return model_name in self._loaded
+
+    def loaded_models(self):
+        return list(self._loaded)
+
+    def unload(self, model_name=None):
+        self._call(('unload', model_name))
+
+    def transcribe(self, audio, model_name, **options):
+        return self.transcribe_batch([audio], model_name, **options)[0]
+
+    def transcribe_batch(self, audios, model_name, **options):
+        """
+        音声を共有メモリに並べて子プロセスに渡し、まとめて推論する
+        :raises WorkerCrashedError: 推論中に子プロセスが異常終了したとき
+        """
+        np = audio_processor.np
+        lengths = [len(audio) for audio in audios]
+        # AudioBuffer だけなら int16 のまま渡す (共有メモリは float32 の半分で済む)
+        compact = all(isinstance(audio, audio_processor.AudioBuffer) for audio in audios)
+        dtype = np.dtype(np.int16 if compact else np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, sum(lengths) * dtype.itemsize))
+        try:
+            buffer = np.ndarray((sum(lengths),), dtype=dtype, buffer=shm.buf)
+            pos = 0
+            for audio in audios:
+                if compact:
+                    buffer[pos:pos + len(audio)] = audio.mono().pcm
+                else:
+                    buffer[pos:pos + len(audio)] = audio_processor.float_range(audio)
+                pos += len(audio)
+            del buffer
+            with profiler.stage("inference", model=model_name, seconds=sum(lengths) / 16000,
+                                batch=len(audios), isolated=True):
+                return self._call(('transcribe', shm.name, dtype.str, lengths, model_name, options))
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+class EnginePool:
+    """
+    ProcessEngine を size 個立ち上げ、推論を空いている子プロセスに振り分けるエンジン
+    MLX のように同じプロセスの中では1つずつしか推論できないバックエンドでも、子プロセスの数だけ並列に推論できる。
+    モデルは子プロセスごとに読み込むので、メモリはその数だけ使う
+    """
+    parallel = True
+
+    def __init__(self, size, backend="mlx", backend_options=None, max_models=1, max_restarts=5):
+        """
+        :param size: 子プロセスの数
+        :param backend: 子プロセスで使うバックエンド ("mlx" または "fake")
+        :param backend_options: バックエンドのコンストラクタに渡す引数
+        :param max_models: 子プロセスごとに同時に保持するモデル数の上限
+        """
+        self.size = max(1, int(size))
+        self.backend_name = backend
+        self.backend_options = backend_options or {}
+        self.max_models = max_models
+        self.engines = [ProcessEngine(backend, backend_options, max_models, max_restarts) for _ in range(self.size)]
+        self._idle = queue.Queue()
+        for engine in self.engines:
+            self._idle.put(engine)
+        # borrow_pool() で使っている数と、共有のプールから外されたか (どちらも _pool_lock で守る)
+        self._users = 0
+        self._retired = False
+
+    def close(self):
+        for engine in self.engines:
+            engine.close()
+
+    def backend_args(self):
+        return (self.backend_name, dict(self.backend_options))
+
+    def preload(self, model_name):
+        """すべての子プロセスでモデルを読み込む (同時に読み込む)"""
+        threads = [engine.preload_async(model_name) for engine in self.engines]
+        for thread in threads:
+            thread.join()
+        return all(engine.is_loaded(model_name) for engine in self.engines)
+
+    def is_loaded(self, model_name):
+        return all(engine.is_loaded(model_name) for engine in self.engines)
+
+    def loaded_models(self):
+        return self.engines[0].loaded_models()
+
+    def unload(self, model_name=None):
+        for engine in self.engines:
+            engine.unload(model_name)
+
+    def transcribe(self, audio, model_name, **options):
+        return self.transcribe_batch([audio], model_name, **options)[0]
+
+    def transcribe_batch(self, audios, model_name, **options):
+        """空いている子プロセスで推論する (すべて使用中なら空くまで待つ)"""
+        engine = self._idle.get()
+        try:
+            return engine.transcribe_batch(audios, model_name, **options)
+        finally:
+            self._idle.put(engine)
+
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+def _retire(pool):
+    """
+    共有のプールから外した EnginePool を閉じる (_pool_lock を持って呼ぶ)
+    borrow_pool() で使っている途中なら、最後に返されたときに閉じる。:return: 今すぐ閉じるなら pool、それ以外は None
+    """
+    if pool is None:
+        return None
+    pool._retired = True
+    return pool if pool._users == 0 else None
+
+def _current_pool(size, backend, backend_options, max_models):
+    """_pool_lock を持って呼ぶ。:return: (共有の EnginePool, 閉じる古い EnginePool または None)"""
+    global _pool, _pool_key
+    key = (int(size), backend, repr(sorted((backend_options or {}).items())), max_models)
+    stale = None
+    if _pool is not None and _pool_key != key:
+        stale = _retire(_pool)
+        _pool = None
+    if _pool is None:
+        _pool, _pool_key = EnginePool(size, backend, backend_options, max_models), key
+    return _pool, stale
+
+def get_pool(size, backend="mlx", backend_options=None, max_models=1):
+    """
+    チャンクの並列推論に使う共有の EnginePool を返す
+    子プロセスとモデルは次の呼び出しでも使い回す。大きさやバックエンドが前回と違えば作り直す
+    (古いプールは borrow_pool() で使っている処理がすべて終わってから閉じる)
+    """
+    with _pool_lock:
+        pool, stale = _current_pool(size, backend, backend_options, max_models)
+    if stale is not None:
+        stale.close()
+    return pool
+
+@contextmanager
+def borrow_pool(size, backend="mlx", backend_options=None, max_models=1):
+    """
+    get_pool() と同じ共有の EnginePool を with の間だけ借りる
+    借りている間に別のスレッドが違う設定で get_pool() を呼んでも、このプールは返すまで閉じない
+    """
+    with _pool_lock:
+        pool, stale = _current_pool(size, backend, backend_options, max_models)
+        pool._users += 1
+    if stale is not None:
+        stale.close()
+    try:
+        yield pool
+    finally:
+        with _pool_lock:
+            pool._users -= 1
+            done = pool._retired and pool._users == 0
+        if done:
+            pool.close()
+
+def close_pool():
+    """共有の EnginePool の子プロセスを止める (アプリの終了時に呼ぶ。使っている途中なら返されたときに止める)"""
+    global _pool, _pool_key
+    with _pool_lock:
+        stale = _retire(_pool)
+        _pool, _pool_key = None, None
+    if stale is not None:
+        stale.close()
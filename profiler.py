@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+from functools import wraps
+from contextlib import contextmanager
+
+# ==========================================
+# 処理ごとの時間・メモリ計測
+# ==========================================
+# 計測が無効で、集計中のスレッドもなければ stage() は何もしない
+_enabled = False
+_sink_path = None
+_trace_memory = False
+_sink_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(sink_path="profile.jsonl", trace_memory=False):
+    """
+    計測を有効にする
+    :param sink_path: 計測結果を JSON Lines で追記するファイル (None ならファイルに書かない)
+    :param trace_memory: Trueなら tracemalloc で各処理のピークメモリも測る (少し遅くなる)
+    """
+    global _enabled, _sink_path, _trace_memory
+    _sink_path = sink_path
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+def disable():
+    global _enabled, _trace_memory
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = False
+
+def is_enabled():
+    return _enabled
+
+
+class _NullStage:
+    """計測しないときに使う何もしないコンテキストマネージャ"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        stack = _stack()
+        self.memory = _trace_memory and tracemalloc.is_tracing()
+        if self.memory:
+            self.mem_start, peak = tracemalloc.get_traced_memory()
+            if stack and stack[-1].memory:
+                # ピークをリセットする前に、外側の処理のここまでのピークを残しておく
+                stack[-1].child_peak = max(stack[-1].child_peak, peak - stack[-1].mem_start)
+            tracemalloc.reset_peak()
+        self.child_peak = 0
+        stack.append(self)
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.thread_time() - self.cpu_start
+        stack = _stack()
+        stack.pop()
+
+        record = {
+            'stage': self.name,
+            'wall': wall,
+            'cpu': cpu,
+            'peak_mem': None,
+            'ok': exc_type is None,
+            'thread': threading.current_thread().name,
+            'ts': time.time(),
+        }
+        if self.memory:
+            _, peak = tracemalloc.get_traced_memory()
+            # 内側の処理が reset_peak() するので、その分のピークも含める
+            record['peak_mem'] = max(peak - self.mem_start, self.child_peak)
+            if stack and stack[-1].memory:
+                stack[-1].child_peak = max(stack[-1].child_peak, record['peak_mem'] + self.mem_start - stack[-1].mem_start)
+        tags = dict(getattr(_local, 'tags', {}))
+        tags.update(self.tags)
+        if tags:
+            record['tags'] = tags
+        _emit(record)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _emit(record):
+    collectors = getattr(_local, 'collectors', None)
+    if collectors:
+        for records in collectors:
+            records.append(record)
+    if _enabled and _sink_path:
+        line = json.dumps(record, ensure_ascii=False)
+        with _sink_lock:
+            with open(_sink_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+def stage(name, **tags):
+    """
+    処理を1つの段階として計測するコンテキストマネージャ
+        with profiler.stage("inference", model=model_name):
+            ...
+    :param name: 段階の名前 (例: 'wav_decode', 'inference')
+    :param tags: 記録に一緒に残す値
+    """
+    if not _enabled and not getattr(_local, 'collectors', None):
+        return _NULL_STAGE
+    return _Stage(name, tags)
+
+def profiled(name=None):
+    """関数全体を1つの段階として計測するデコレーター"""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def collect(**tags):
+    """
+    この中で（同じスレッドで）計測された記録をリストに集める
+    計測が無効でも、集計中は記録する
+        with profiler.collect(job_id=3) as records:
+            ...
+    :param tags: 集めた記録すべてに付ける値
+    """
+    records = []
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    previous_tags = getattr(_local, 'tags', {})
+    _local.tags = dict(previous_tags, **tags)
+    collectors.append(records)
+    try:
+        yield records
+    finally:
+        collectors.remove(records)
+        _local.tags = previous_tags
+
+def summarize(records):
+    """段階ごとに時間を合計した辞書を返す {'inference': {'wall': 秒, 'cpu': 秒, 'count': 回数}, ...}"""
+    summary = {}
+    for record in records:
+        item = summary.setdefault(record['stage'], {'wall': 0.0, 'cpu': 0.0, 'count': 0, 'peak_mem': None})
+        item['wall'] += record['wall']
+        item['cpu'] += record['cpu']
+        item['count'] += 1
+        if record.get('peak_mem') is not None:
+            item['peak_mem'] = max(item['peak_mem'] or 0, record['peak_mem'])
+    return summary
+
+def read_sink(sink_path="profile.jsonl"):
+    """JSON Lines に保存された計測結果を読み込む"""
+    if not os.path.exists(sink_path):
+        return []
+    with open(sink_path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
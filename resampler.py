@@ -0,0 +1,141 @@
+import math
+from functools import lru_cache
+import numpy as np
+
+# 1ブロックで計算する出力サンプル数（作業メモリは block_size × タップ数 程度に収まる）
+DEFAULT_BLOCK_SIZE = 16384
+
+# ==========================================
+# フィルタバンク（レートの組み合わせごとにキャッシュ）
+# ==========================================
+@lru_cache(maxsize=16)
+def get_filter_bank(src_rate, dst_rate, beta=5.0):
+    """
+    ポリフェーズ分解したローパスフィルタを作る
+    :param src_rate: 入力のサンプリングレート
+    :param dst_rate: 出力のサンプリングレート
+    :param beta: カイザー窓のパラメータ
+    :return: (up, down, half_len, bank) のタプル
+             bank は (up, タップ数) の配列で、各行は時間を逆順に並べた1位相分の係数
+    """
+    g = math.gcd(int(src_rate), int(dst_rate))
+    up, down = int(dst_rate) // g, int(src_rate) // g
+
+    # scipy.signal.resample_poly と同じ設計 (カイザー窓付き sinc, 遮断周波数は 1/max(up, down))
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    n_taps = 2 * half_len + 1
+    m = np.arange(n_taps) - half_len
+    cutoff = 1.0 / max_rate
+    h = cutoff * np.sinc(cutoff * m) * np.kaiser(n_taps, beta)
+    h *= up / h.sum()
+
+    # h[p + k*up] を bank[p, k] に並べ替え、入力窓とそのまま内積を取れるよう k を逆順にする
+    n_phase_taps = -(-n_taps // up)
+    padded = np.zeros(n_phase_taps * up)
+    padded[:n_taps] = h
+    bank = padded.reshape(n_phase_taps, up).T[:, ::-1].astype(np.float32)
+    bank.setflags(write=False)
+    return up, down, half_len, bank
+
+
+# ==========================================
+# ストリーミング対応リサンプラー
+# ==========================================
+class PolyphaseResampler:
+    """
+    有理数比のポリフェーズリサンプラー
+    process() に入力を少しずつ渡すと、その時点で確定した出力だけを返す。
+    最後に flush() を呼ぶと残りの出力を返す。
+    """
+
+    def __init__(self, src_rate, dst_rate, block_size=DEFAULT_BLOCK_SIZE):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.block_size = block_size
+        self.up, self.down, self.half_len, self.bank = get_filter_bank(src_rate, dst_rate)
+        self.n_taps = self.bank.shape[1]
+
+        # 入力の先頭より前は無音として扱う
+        self._buffer = np.zeros(self.n_taps - 1, dtype=np.float32)
+        self._buffer_start = -(self.n_taps - 1)   # _buffer[0] が入力の何サンプル目か
+        self._consumed = 0                        # これまでに受け取った入力サンプル数
+        self._produced = 0                        # これまでに出力したサンプル数
+
+    def output_length(self, n_input):
+        """入力 n_input サンプルに対する出力サンプル数"""
+        return -(-n_input * self.up // self.down)
+
+    def process(self, x):
+        """
+        入力の続きを渡し、計算できるところまでの出力を返す
+        :param x: float32 の1次元配列
+        :return: float32 の1次元配列
+        """
+        x = np.asarray(x, dtype=np.float32)
+        self._buffer = np.concatenate((self._buffer, x))
+        self._consumed += len(x)
+
+        # 出力 n に必要な最後の入力は (n*down + half_len) // up 番目
+        n_end = -(-(self._consumed * self.up - self.half_len) // self.down)
+        return self._compute(min(n_end, self.output_length(self._consumed)))
+
+    def flush(self):
+        """入力の終わり以降を無音とみなして、残りの出力をすべて返す"""
+        total = self.output_length(self._consumed)
+        if self._produced >= total:
+            return np.zeros(0, dtype=np.float32)
+        last_index = ((total - 1) * self.down + self.half_len) // self.up
+        pad = last_index + 1 - (self._buffer_start + len(self._buffer))
+        if pad > 0:
+            self._buffer = np.concatenate((self._buffer, np.zeros(pad, dtype=np.float32)))
+        return self._compute(total)
+
+    def _compute(self, n_end):
+        if n_end <= self._produced:
+            return np.zeros(0, dtype=np.float32)
+
+        out = np.empty(n_end - self._produced, dtype=np.float32)
+        windows = np.lib.stride_tricks.sliding_window_view(self._buffer, self.n_taps)
+        for start in range(self._produced, n_end, self.block_size):
+            n = np.arange(start, min(start + self.block_size, n_end))
+            t = n * self.down + self.half_len
+            # 窓の先頭は (t // up) - (タップ数 - 1) 番目の入力
+            rows = t // self.up - (self.n_taps - 1) - self._buffer_start
+            out[start - self._produced:start - self._produced + len(n)] = np.einsum(
+                'ij,ij->i', windows[rows], self.bank[t % self.up]
+            )
+        self._produced = n_end
+
+        # 次の出力に必要な入力だけを残す
+        keep_from = (n_end * self.down + self.half_len) // self.up - (self.n_taps - 1)
+        drop = max(0, keep_from - self._buffer_start)
+        if drop:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+        return out
+
+
+def resample(x, src_rate, dst_rate, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    配列全体をリサンプリングする
+    入力は一定サイズのブロックごとに処理するので、作業メモリは入力長によらず一定
+    :param x: float32 の1次元配列
+    :param src_rate: 入力のサンプリングレート
+    :param dst_rate: 出力のサンプリングレート
+    :return: float32 の1次元配列
+    """
+    if src_rate == dst_rate:
+        return np.asarray(x, dtype=np.float32)
+
+    resampler = PolyphaseResampler(src_rate, dst_rate, block_size)
+    out = np.empty(resampler.output_length(len(x)), dtype=np.float32)
+    pos = 0
+    in_block = max(1, block_size * resampler.down // resampler.up)
+    for start in range(0, len(x), in_block):
+        y = resampler.process(x[start:start + in_block])
+        out[pos:pos + len(y)] = y
+        pos += len(y)
+    y = resampler.flush()
+    out[pos:pos + len(y)] = y
+    return out
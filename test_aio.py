@@ -0,0 +1,226 @@
+# audio_processor.aio (asyncio 版) のテスト
+# サブプロセスの出力の読み取り・タイムアウト・キャンセル、スレッドプールでのスライス・文字起こし、
+# GUI スレッドから await する橋渡し (AsyncBridge) を確かめる
+import io
+import os
+import sys
+import time
+import queue
+import shutil
+import asyncio
+import tempfile
+import contextlib
+import threading
+
+import audio_processor
+from audio_processor import aio
+
+# 0.1秒おきに1行ずつ標準出力・標準エラーに書く子プロセス
+TICKER = [sys.executable, "-c",
+          "import sys, time\n"
+          "for k in range(int(sys.argv[1])):\n"
+          "    print(k, flush=True); print('tick', k, file=sys.stderr, flush=True); time.sleep(0.1)\n"]
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+async def check_process():
+    ok = True
+    # 1. 標準出力・標準エラーを終了前から少しずつ受け取れる
+    print("\n--- Step 1: 出力の読み取り ---")
+    received = []
+    start = time.perf_counter()
+    returncode, stderr = await aio.run_process(TICKER + ["5"], on_stdout=lambda data: received.append(
+        (time.perf_counter() - start, data)))
+    print(f"終了コード {returncode}, 標準出力 {len(received)}回, 標準エラー {stderr.splitlines()}")
+    ok = ok and returncode == 0 and stderr.splitlines() == [f"tick {k}" for k in range(5)]
+    ok = ok and b"".join(data for _, data in received).split() == [str(k).encode() for k in range(5)]
+    # 最初の出力は終了 (約0.5秒後) を待たずに届いている
+    ok = ok and received[0][0] < 0.3
+
+    # 2. タイムアウトするとプロセスも止まる
+    print("\n--- Step 2: タイムアウト ---")
+    started = []
+    start = time.perf_counter()
+    try:
+        await aio.run_process(TICKER + ["100"], timeout=0.5, on_stderr=started.append)
+        ok = False
+    except asyncio.TimeoutError:
+        elapsed = time.perf_counter() - start
+        print(f"{elapsed:.2f}秒でタイムアウト (出力 {len(started)}行)")
+        ok = ok and elapsed < 0.5 + aio.STOP_GRACE_SEC and 0 < len(started) < 10
+
+    # 3. キャンセルするとプロセスも止まる
+    print("\n--- Step 3: キャンセル ---")
+    pids = []
+    real_exec = asyncio.create_subprocess_exec
+
+    async def recording_exec(*args, **kwargs):
+        process = await real_exec(*args, **kwargs)
+        pids.append(process.pid)
+        return process
+
+    asyncio.create_subprocess_exec = recording_exec
+    try:
+        task = asyncio.ensure_future(aio.run_process(TICKER + ["100"]))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        try:
+            await task
+            ok = False
+        except asyncio.CancelledError:
+            pass
+    finally:
+        asyncio.create_subprocess_exec = real_exec
+    print(f"キャンセル後のプロセス: {'残っている' if alive(pids[0]) else '終了'}")
+    ok = ok and len(pids) == 1 and not alive(pids[0])
+
+    # 4. 1つのループで多数のプロセスを同時に待てる
+    print("\n--- Step 4: 同時実行 ---")
+    count = 30
+    start = time.perf_counter()
+    results = await asyncio.gather(*(aio.run_process(TICKER + ["5"]) for _ in range(count)))
+    elapsed = time.perf_counter() - start
+    print(f"{count}プロセスを {elapsed:.2f}秒で完了 (順に実行すると約{count * 0.5:.0f}秒)")
+    ok = ok and all(code == 0 for code, _ in results) and elapsed < count * 0.5 / 3
+    return ok
+
+async def check_executor(input_filename, folder):
+    ok = True
+    # 5. スライスと文字起こしはスレッドプールで実行され、その間もループは止まらない
+    print("\n--- Step 5: スライス・文字起こし ---")
+    path = os.path.join(folder, "input.wav")
+    shutil.copy(input_filename, path)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tick_task = asyncio.ensure_future(ticker())
+    engine = audio_processor.TranscriptionEngine(audio_processor.FakeBackend(segment_sec=2.0, realtime_factor=0.05))
+    try:
+        files = await aio.slice_audio(path, 1000, as_refs=False)
+        part = await aio.slice_range(path, 500, 1500, as_refs=False)
+        result = await aio.transcribe_file(path, "fake-model", engine, use_cache=False, vad=False, cascade=False)
+    finally:
+        tick_task.cancel()
+    expected = audio_processor.transcribe_file(path, "fake-model", engine, use_cache=False, vad=False,
+                                               cascade=False)
+    print(f"スライス {len(files)}件, 切り出し {os.path.basename(part)}, ループの反応 {ticks}回")
+    print(result['text'])
+    ok = ok and files == audio_processor.slice_audio(path, 1000, as_refs=False) and os.path.exists(part)
+    ok = ok and result['text'] == expected['text'] and ticks > 0
+    return ok
+
+def check_bridge(input_filename):
+    ok = True
+    # 6. GUI スレッド (ここではメインスレッドのキュー) から await できる
+    print("\n--- Step 6: GUI からの await ---")
+    calls = queue.Queue()
+    bridge = aio.AsyncBridge(calls.put)
+    main_thread = threading.get_ident()
+    seen = {}
+
+    async def on_clicked(checked=False):
+        seen['before'] = threading.get_ident()
+        header = await bridge.run(aio.run_blocking(audio_processor.read_wav_header, input_filename))
+        seen['after'] = threading.get_ident()
+        return header
+
+    task = bridge.slot(on_clicked)(True, "余分な引数")
+    while not task.done():
+        calls.get(timeout=5)()
+    print(f"結果 {task.result()}, 続きを実行したスレッド: {'GUI' if seen['after'] == main_thread else '別'}")
+    ok = ok and seen == {'before': main_thread, 'after': main_thread}
+    ok = ok and task.result() == audio_processor.read_wav_header(input_filename)
+
+    # 7. キャンセルとタイムアウトは await した側に例外として届く
+    print("\n--- Step 7: GUI からのキャンセル・タイムアウト ---")
+    outcome = []
+
+    async def long_job():
+        try:
+            await bridge.run(asyncio.sleep(10))
+        except asyncio.CancelledError:
+            outcome.append("cancelled")
+        try:
+            await bridge.run(asyncio.sleep(10), timeout=0.2)
+        except asyncio.TimeoutError:
+            outcome.append("timeout")
+
+    task = bridge.start(long_job())
+    bridge.cancel_all()
+    while not task.done():
+        calls.get(timeout=5)()
+    print(f"結果: {outcome}, 実行中 {bridge.pending_count()}件")
+    ok = ok and outcome == ["cancelled", "timeout"] and bridge.pending_count() == 0
+
+    # 8. await の後で起きた例外は握りつぶさず、受け取る処理がなければトレースバックを出す
+    print("\n--- Step 8: GUI からの処理の例外 ---")
+
+    async def failing_job(message):
+        await bridge.run(asyncio.sleep(0.01))
+        raise ValueError(message)
+
+    stderr = io.StringIO()
+    with contextlib.redirect_stderr(stderr):
+        unhandled = bridge.slot(failing_job)("誰も受け取らない例外")
+        handled = bridge.start(failing_job("受け取る例外"))
+        received = []
+        handled.add_done_callback(lambda task: received.append(task_error(task)))
+        while not (unhandled.done() and handled.done()):
+            calls.get(timeout=5)()
+    report = stderr.getvalue()
+    print(report.rstrip())
+    print(f"受け取った例外: {received}, 実行中 {bridge.pending_count()}件")
+    ok = ok and "Traceback" in report and "ValueError: 誰も受け取らない例外" in report
+    ok = ok and "ValueError: 受け取る例外" not in report
+    ok = ok and received == ["受け取る例外"] and bridge.pending_count() == 0
+    return ok
+
+def task_error(task):
+    try:
+        task.result()
+    except ValueError as e:
+        return str(e)
+    return None
+
+async def check_convert(input_filename, folder):
+    # 9. ffmpeg での変換 (ffmpeg がなければ省略)
+    print("\n--- Step 9: 変換 ---")
+    if shutil.which("ffmpeg") is None:
+        print("⚠️ ffmpeg が見つからないため省略します")
+        return True
+    output = os.path.join(folder, "converted.wav")
+    progress = []
+    ok = await aio.convert_audio(input_filename, output, sample_rate=8000, timeout=30, on_progress=progress.append)
+    header = audio_processor.read_wav_header(output) if ok else None
+    print(f"結果 {ok}, {header}, 進捗 {len(progress)}回")
+    return ok and header is not None and bool(progress)
+
+def main():
+    input_filename = sys.argv[1] if len(sys.argv) > 1 else "output.wav"
+    print("=== asyncio 版テスト開始 ===")
+    folder = tempfile.mkdtemp(prefix="aio-")
+    try:
+        ok = asyncio.run(check_process())
+        ok = asyncio.run(check_executor(input_filename, folder)) and ok
+        ok = check_bridge(input_filename) and ok
+        ok = asyncio.run(check_convert(input_filename, folder)) and ok
+    finally:
+        aio.shutdown()
+        shutil.rmtree(folder)
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
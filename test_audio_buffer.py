@@ -0,0 +1,110 @@
+# AudioBuffer (int16 のまま扱う音声バッファ) のテスト
+# 読み込み・切り出し・VAD・リサンプリングがコピーや float32 の配列を作らずに動き、
+# これまでの float32 の処理と同じ結果になるかを確かめる
+import os
+import sys
+import shutil
+import tempfile
+import tracemalloc
+import numpy as np
+
+import audio_processor
+import process_engine
+import resampler
+
+def legacy_load(path):
+    """AudioBuffer を使う前の読み込み (全体を float32 にしてからリサンプリングする)"""
+    audio, rate = audio_processor.load_wav(path)
+    return resampler.resample(audio, rate, 16000)
+
+def peak_allocated(func, *args):
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main():
+    input_filename = sys.argv[1] if len(sys.argv) > 1 else "output.wav"
+    print("=== AudioBuffer テスト開始 ===")
+    ok = True
+    folder = tempfile.mkdtemp(prefix="audiobuffer-")
+    try:
+        # 1. 16bit の WAV はメモリマップのまま使い、切り出しもビューになる
+        print("\n--- Step 1: 読み込みと切り出し ---")
+        pcm, rate, scale = audio_processor.read_pcm(input_filename)
+        buffer = audio_processor.AudioBuffer.from_pcm(pcm, rate, scale)
+        part = buffer[rate:rate * 2]
+        print(f"{buffer}, 切り出し {part}")
+        ok = ok and buffer.pcm.dtype == np.int16 and np.shares_memory(buffer.pcm, pcm)
+        ok = ok and np.shares_memory(part.pcm, buffer.pcm) and len(part) == min(rate, max(0, len(buffer) - rate))
+
+        # 2. 44.1kHz ステレオの合成音声: ダウンミックスとリサンプリングの結果が float32 の処理とほぼ同じ
+        print("\n--- Step 2: ダウンミックスとリサンプリング ---")
+        rng = np.random.default_rng(0)
+        stereo = np.clip(rng.normal(0, 3000, (44100 * 180, 2)), -32768, 32767).astype('<i2')
+        stereo[44100 * 60:44100 * 90] //= 100   # 途中に無音に近い区間
+        path = os.path.join(folder, "stereo.wav")
+        audio_processor.write_wav_pcm(path, stereo, 44100)
+        del stereo
+        legacy, legacy_peak = peak_allocated(legacy_load, path)
+        (compact, _), compact_peak = peak_allocated(audio_processor.load_audio_for_model, path)
+        diff = np.max(np.abs(compact.to_float32() - legacy)) * 32768
+        print(f"{compact}, float32 との差 {diff:.2f} LSB")
+        print(f"作業メモリのピーク: float32 {legacy_peak / 2**20:.1f}MB → int16 {compact_peak / 2**20:.1f}MB")
+        ok = ok and compact.rate == 16000 and compact.channels == 1 and len(compact) == len(legacy)
+        ok = ok and diff <= 1.5 and compact_peak < legacy_peak / 3
+
+        # 3. VAD は int16 のままでも float32 と同じ区間を返す
+        print("\n--- Step 3: VAD ---")
+        regions = audio_processor.detect_speech(compact, 16000)
+        print(f"発話区間: {[(a / 16000, b / 16000) for a, b in regions]}")
+        ok = ok and regions == audio_processor.detect_speech(legacy, 16000) and len(regions) == 2
+
+        # 4. モデルには float32 で渡り、結果は float32 の処理と同じ
+        print("\n--- Step 4: 文字起こし ---")
+        engine = audio_processor.TranscriptionEngine(audio_processor.FakeBackend(segment_sec=10.0))
+        for vad in (False, True):
+            expected = audio_processor.transcribe_array(legacy, "fake-model", engine, vad=vad, cascade=False)
+            result = audio_processor.transcribe_array(compact, "fake-model", engine, vad=vad, cascade=False)
+            print(f"VAD {vad}: セグメント {len(result['segments'])}件, 同じ結果: {result == expected}")
+            ok = ok and result == expected
+        result = audio_processor.transcribe_array(compact, "fake-model", engine, vad=False, chunked=True,
+                                                  cascade=False)
+        ok = ok and result['chunks'] == 6
+
+        # 5. キャッシュのキーは int16 の PCM から作り、read_pcm() の配列と同じになる
+        print("\n--- Step 5: キャッシュのキー ---")
+        key = audio_processor.TranscriptCache.make_key(buffer, rate, "fake-model")
+        ok = ok and key == audio_processor.TranscriptCache.make_key(pcm, rate, "fake-model")
+
+        # 6. 別プロセスの推論には int16 のまま共有メモリで渡す
+        print("\n--- Step 6: 別プロセスの推論 ---")
+        clips = [compact[:16000 * 5], compact[16000 * 5:16000 * 12]]
+        isolated = process_engine.ProcessEngine(backend="fake")
+        try:
+            results = isolated.transcribe_batch(clips, "fake-model")
+        finally:
+            isolated.close()
+        expected = engine.transcribe_batch(clips, "fake-model")
+        print(results[1]['text'])
+        ok = ok and [r['text'] for r in results] == [r['text'] for r in expected]
+
+        # 7. 8bit / float の WAV も int16 に変換して扱える
+        print("\n--- Step 7: 16bit 以外の WAV ---")
+        wave = np.sin(np.arange(16000) / 16000 * 2 * np.pi * 440).astype(np.float32) * 0.5
+        float_path = os.path.join(folder, "float.wav")
+        audio_processor.write_wav_pcm(float_path, wave, 16000)
+        converted = audio_processor.AudioBuffer.load(float_path)
+        print(f"{converted}, 最大値 {converted.pcm.max()}")
+        ok = ok and converted.pcm.dtype == np.int16 and abs(int(converted.pcm.max()) - 16384) <= 1
+    finally:
+        shutil.rmtree(folder)
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import time
+
 # 作成したモジュールをインポート
 import audio_processor
 
@@ -27,17 +29,24 @@ def main():
     # 3. 文字起こしテスト
     print("\n--- Step 3: 文字起こし ---")
     
-    # 全体の文字起こし
-    text_full = audio_processor.transcribe_audio(input_filename, model)
-    print(f"\n[全体]: {text_full}")
-
-    # 前半の文字起こし
-    text_before = audio_processor.transcribe_audio(file_before, model)
-    print(f"\n[前半]: {text_before}")
-
-    # 後半の文字起こし
-    text_after = audio_processor.transcribe_audio(file_after, model)
-    print(f"\n[後半]: {text_after}")
+    # 全体・前半・後半をまとめて文字起こし (読み込みと推論を並行して行う)
+    labels = {input_filename: "全体", file_before: "前半", file_after: "後半"}
+    for path, text, timings in audio_processor.transcribe_many(list(labels), model):
+        print(f"\n[{labels[path]}]: {text}")
+        if timings:
+            print(f"  (読み込み {timings['decode']:.2f}秒, リサンプリング {timings['resample']:.2f}秒, 推論 {timings['inference']:.2f}秒)")
+
+    # 4. まとめて推論するテスト (3つの音声を1回のモデル呼び出しで文字起こし)
+    # まとめて推論するのは設定で有効にしたときだけなので、ここではエンジンを直接呼ぶ
+    print("\n--- Step 4: まとめて文字起こし ---")
+    clips = [audio_processor.load_audio_for_model(path)[0] for path in labels]
+    start = time.perf_counter()
+    results = audio_processor.get_engine().transcribe_batch(clips, model)
+    print(f"{len(clips)}件を {time.perf_counter() - start:.2f}秒で推論しました")
+    for path, result in zip(labels, results):
+        print(f"\n[{labels[path]}]: {result['text'].strip()}")
+        for seg in result['segments']:
+            print(f"  {seg['start']:.2f}-{seg['end']:.2f}秒: {seg['text'].strip()}")
 
     print("\n=== テスト終了 ===")
 
@@ -0,0 +1,79 @@
+# モデルのカスケードのテスト
+# FakeBackend の確信度の台本を使い、確信度の低いセグメントだけが大きいモデルでやり直されるかを確かめる
+import sys
+import numpy as np
+
+import audio_processor
+
+SMALL, MEDIUM, LARGE = "fake-tiny", "fake-base", "fake-large"
+
+def main():
+    print("=== カスケードテスト開始 ===")
+    ok = True
+    thresholds = {'min_avg_logprob': -1.0, 'max_no_speech_prob': 0.6, 'max_compression_ratio': 2.4}
+    audio = np.random.default_rng(0).normal(0, 0.1, 16000 * 10).astype(np.float32)
+
+    # 1. 確信度の低いセグメントだけを次のモデルでやり直す
+    print("\n--- Step 1: 2段のカスケード ---")
+    backend = audio_processor.FakeBackend(segment_sec=2.0, confidences={SMALL: [
+        -0.3,                                            # 確か
+        -1.4,                                            # 平均対数確率が低い ─┐ 続いているので
+        {'avg_logprob': -0.5, 'compression_ratio': 3.0}, # 繰り返しが多い     ─┘ 1つにまとめてやり直す
+        -0.2,                                            # 確か
+        {'avg_logprob': -1.5, 'no_speech_prob': 0.9},    # 無音 (やり直さない)
+    ]})
+    engine = audio_processor.TranscriptionEngine(backend)
+    results, report = audio_processor.transcribe_cascade([audio], [SMALL, LARGE], engine, thresholds)
+    models = [seg['model'] for seg in results[0]['segments']]
+    print(f"セグメントのモデル: {models}")
+    print(audio_processor.describe_cascade(report))
+    ok = ok and models == [SMALL, LARGE, LARGE, SMALL, SMALL]
+    ok = ok and report['escalated'] == {LARGE: 2} and abs(report['escalation_rate'] - 0.4) < 1e-9
+    # やり直した区間 (2〜6秒) のセグメントの時刻は元の音声での位置になっている
+    spans = [(seg['start'], seg['end']) for seg in results[0]['segments'][1:3]]
+    ok = ok and spans == [(2.0, 4.0), (4.0, 6.0)] and LARGE in results[0]['text']
+
+    # 2. 3段: 2番目のモデルでも確信度が低いものだけが3番目に進む
+    print("\n--- Step 2: 3段のカスケード ---")
+    backend = audio_processor.FakeBackend(segment_sec=2.0, confidences={
+        SMALL: [-1.2, -1.2, -0.1, -1.2, -0.1],
+        MEDIUM: [-0.1, -1.3],   # 最初の区間 (0〜4秒) の後半だけがまだ低い
+    })
+    engine = audio_processor.TranscriptionEngine(backend)
+    results, report = audio_processor.transcribe_cascade([audio], [SMALL, MEDIUM, LARGE], engine, thresholds)
+    models = [seg['model'] for seg in results[0]['segments']]
+    print(f"セグメントのモデル: {models}")
+    print(audio_processor.describe_cascade(report))
+    ok = ok and models == [MEDIUM, LARGE, SMALL, MEDIUM, SMALL]
+    ok = ok and report['escalated'] == {MEDIUM: 3, LARGE: 1} and abs(report['escalation_rate'] - 0.6) < 1e-9
+
+    # 3. やり直しが少なければ、大きいモデルだけで推論するより速い
+    print("\n--- Step 3: 短縮できた時間 ---")
+    # モデルの速さはモデル名ごとに覚えるので、ここでは別の名前を使う
+    fast, slow = "fake-fast", "fake-slow"
+    backend = audio_processor.FakeBackend(segment_sec=2.0, realtime_factor={fast: 0.005, slow: 0.05},
+                                          confidences={fast: [-0.2, -0.2, -1.8, -0.2, -0.2]})
+    engine = audio_processor.TranscriptionEngine(backend)
+    # 大きいモデルの速さを覚えさせるため、まず1回全体を大きいモデルで推論する
+    audio_processor.transcribe_cascade([audio], [slow, slow], engine, thresholds)
+    _, report = audio_processor.transcribe_cascade([audio], [fast, slow], engine, thresholds)
+    print(audio_processor.describe_cascade(report))
+    # 大きいモデルだけなら約0.5秒、カスケードなら約0.05 + 0.1秒
+    ok = ok and report['time_saved_sec'] is not None and report['time_saved_sec'] > 0.2
+
+    # 4. transcribe_array にモデルのリストを渡すとカスケードを使い、False なら使わない
+    print("\n--- Step 4: transcribe_array ---")
+    backend = audio_processor.FakeBackend(segment_sec=2.0, confidences={SMALL: [-0.2, -2.0]})
+    engine = audio_processor.TranscriptionEngine(backend)
+    result = audio_processor.transcribe_array(audio, "unused", engine, vad=False, cascade=[SMALL, LARGE])
+    print(audio_processor.describe_cascade(result['cascade']))
+    ok = ok and result['cascade']['escalated'] == {LARGE: 1}
+    plain = audio_processor.transcribe_array(audio, SMALL, engine, vad=False, cascade=False)
+    ok = ok and 'cascade' not in plain
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# カタログ (SQLite + FTS5) のテスト
+# 数千件の録音を登録し、発言の検索が速く正しいか、見つかった区間を切り出せるかを確かめる
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+import audio_processor
+import catalog
+
+WORDS = ["会議", "予算", "来週", "資料", "確認", "担当者", "スケジュール", "お客様", "見積もり", "議事録",
+         "開発", "テスト", "リリース", "問題", "対応", "共有", "提案", "検討", "締め切り", "打ち合わせ"]
+
+def fake_result(rng, n_segments=10):
+    segments = []
+    for k in range(n_segments):
+        text = "".join(rng.choice(WORDS) + rng.choice(["を", "の", "は", "について"]) for _ in range(4))
+        segments.append({'start': k * 5.0, 'end': k * 5.0 + 5.0, 'text': text})
+    return {'text': "".join(s['text'] for s in segments), 'segments': segments, 'timings': {'inference': 0.1}}
+
+def main():
+    input_filename = sys.argv[1] if len(sys.argv) > 1 else "output.wav"
+    print("=== カタログテスト開始 ===")
+    ok = True
+    rng = random.Random(0)
+    folder = tempfile.mkdtemp(prefix="catalog-")
+    try:
+        db = catalog.Catalog(os.path.join(folder, "catalog.db"))
+
+        # 1. 書き込み用のスレッドがまとめて書き込む
+        print("\n--- Step 1: 登録 ---")
+        n_recordings = 3000
+        start = time.perf_counter()
+        for k in range(n_recordings):
+            result = fake_result(rng)
+            if k == 1234:
+                result['segments'][3]['text'] = "来月の合宿の宿泊先について相談"
+            db.add_async(os.path.join(folder, f"rec{k:05d}.wav"), result, "fake-model")
+        db.flush()
+        stats = db.stats()
+        print(f"{stats['recordings']}件 / セグメント {stats['segments']}件を {time.perf_counter() - start:.2f}秒で登録")
+        ok = ok and stats == {'recordings': n_recordings, 'segments': n_recordings * 10, 'audio_seconds': 0}
+
+        # 2. 部分一致で検索でき、数千件あっても数ミリ秒で返る
+        print("\n--- Step 2: 検索 ---")
+        for query, expected in (("合宿の宿泊", 1), ("宿泊先 相談", 1), ("存在しない言葉", 0)):
+            start = time.perf_counter()
+            hits = db.search(query)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"「{query}」: {len(hits)}件 ({elapsed:.2f}ms) {hits[0]['snippet'] if hits else ''}")
+            ok = ok and len(hits) == expected and elapsed < 50
+        hit = db.search("合宿の宿泊")[0]
+        ok = ok and hit['path'].endswith("rec01234.wav") and (hit['start'], hit['end']) == (15.0, 20.0)
+        start = time.perf_counter()
+        hits = db.search("スケジュール", limit=50)
+        print(f"よく出る語: {len(hits)}件 ({(time.perf_counter() - start) * 1000:.2f}ms)")
+        ok = ok and len(hits) == 50
+
+        # 3. 2文字以下の語は索引を使わずに探す
+        hits = db.search("合宿")
+        print(f"短い語: {len(hits)}件")
+        ok = ok and len(hits) == 1
+
+        # 4. 同じ録音をもう一度登録すると置き換わる
+        print("\n--- Step 3: 置き換え ---")
+        db.add(os.path.join(folder, "rec01234.wav"), {'text': "やり直した結果", 'segments': []}, "fake-model")
+        print(f"置き換え後: {db.search('合宿の宿泊')}, {db.recording(os.path.join(folder, 'rec01234.wav'))['text']}")
+        ok = ok and db.search("合宿の宿泊") == [] and len(db.search("やり直した")) == 1
+        ok = ok and db.stats()['segments'] == (n_recordings - 1) * 10 + 1
+
+        # 5. 実際の文字起こし結果を登録し、見つかった区間を切り出す
+        print("\n--- Step 4: 切り出し ---")
+        path = os.path.join(folder, "real.wav")
+        shutil.copy(input_filename, path)
+        engine = audio_processor.TranscriptionEngine(audio_processor.FakeBackend(segment_sec=2.0))
+        result = audio_processor.transcribe_file(path, "fake-model", engine, use_cache=False, vad=False)
+        db.add(path, result, "fake-model")
+        hit = db.search("fake-model")[1]
+        for as_refs in (True, False):
+            output = audio_processor.slice_range(hit['path'], hit['start'] * 1000, hit['end'] * 1000,
+                                                 as_refs=as_refs)
+            pcm, rate, _ = audio_processor.read_pcm(output)
+            print(f"{os.path.basename(output)}: {len(pcm) / rate:.2f}秒")
+            ok = ok and abs(len(pcm) / rate - (hit['end'] - hit['start'])) < 0.01
+            if as_refs:
+                clip = output
+
+        # 6. 元の録音が上書きされたら、参照 (.clip) は別の音声を読まずにエラーになる
+        print("\n--- Step 5: 上書きされた録音の参照 ---")
+        original, rate, _ = audio_processor.read_pcm(path)
+        audio_processor.write_wav_pcm(path, original[:len(original) // 2].copy(), rate)
+        try:
+            audio_processor.read_pcm(clip)
+            ok = False
+        except ValueError as e:
+            print(f"エラー: {e}")
+        db.close()
+
+        # 7. 共有カタログは audio_processor の設定に従う (既定では無効で、ファイルを作らない)
+        print("\n--- Step 6: 共有カタログ ---")
+        shared_path = os.path.join(folder, "shared.db")
+        audio_processor.set_settings({})
+        catalog.set_catalog(None)
+        ok = ok and catalog.get_catalog() is None
+        audio_processor.set_settings({'catalog_enabled': True, 'catalog_path': shared_path})
+        try:
+            catalog.record_result(path, result, "fake-model")
+            shared = catalog.get_catalog()
+            catalog.close_catalog()
+            print(f"共有カタログ: {shared.path}, {shared.stats()}")
+            ok = ok and shared.path == shared_path and shared.stats()['recordings'] == 1
+        finally:
+            catalog.close_catalog()
+            audio_processor.set_settings(None)
+    finally:
+        shutil.rmtree(folder)
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
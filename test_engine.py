@@ -0,0 +1,157 @@
+# TranscriptionEngine (常駐モデルのプール) のテスト
+# モデルは1度だけ読み込んで使い回すこと、上限を超えたら最も長く使われていないモデルを解放すること、
+# 事前読み込み (preload) したモデルがそのまま文字起こしに使われること、
+# 大きなモデルの読み込み中も読み込み済みのモデルは待たずに使えることを FakeBackend で確かめる
+import sys
+import time
+import threading
+
+import numpy as np
+
+import audio_processor
+
+def check_reuse():
+    # 1. 同じモデルは何度使っても1度だけ読み込む (複数スレッドから同時に使っても同じ)
+    print("\n--- Step 1: モデルの使い回し ---")
+    backend = audio_processor.FakeBackend(load_delay=0.1)
+    engine = audio_processor.TranscriptionEngine(backend, max_models=2)
+    audio = np.zeros(16000, dtype=np.float32)
+    results = [engine.transcribe(audio, "model-a") for _ in range(3)]
+    threads = [threading.Thread(target=engine.transcribe, args=(audio, "model-a")) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"読み込み回数 {backend.load_counts}, 推論回数 {backend.infer_count}")
+    return (backend.load_counts == {"model-a": 1} and backend.infer_count == 7
+            and all(result == results[0] for result in results))
+
+def check_eviction():
+    # 2. 上限を超えたら最も長く使われていないモデルを解放する
+    print("\n--- Step 2: LRU での解放 ---")
+    backend = audio_processor.FakeBackend()
+    engine = audio_processor.TranscriptionEngine(backend, max_models=2)
+    ok = True
+    engine.get_model("model-a")
+    engine.get_model("model-b")
+    ok = ok and engine.loaded_models() == ["model-a", "model-b"]
+    # model-a を使うと model-b の方が古くなる
+    engine.get_model("model-a")
+    ok = ok and engine.loaded_models() == ["model-b", "model-a"]
+    engine.get_model("model-c")
+    print(f"読み込み済み {engine.loaded_models()}")
+    ok = ok and engine.loaded_models() == ["model-a", "model-c"] and not engine.is_loaded("model-b")
+    # 解放したモデルをもう一度使うと読み込み直す (残っているモデルは読み込まない)
+    engine.get_model("model-b")
+    engine.get_model("model-c")
+    print(f"読み込み済み {engine.loaded_models()}, 読み込み回数 {backend.load_counts}")
+    ok = ok and engine.loaded_models() == ["model-b", "model-c"]
+    ok = ok and backend.load_counts == {"model-a": 1, "model-b": 2, "model-c": 1}
+    # unload で外したモデルも次に使うときに読み込み直す
+    engine.unload("model-c")
+    engine.get_model("model-c")
+    ok = ok and backend.load_counts["model-c"] == 2
+    engine.unload()
+    ok = ok and engine.loaded_models() == []
+    return ok
+
+def check_preload():
+    # 3. 事前読み込みしたモデルは文字起こしでそのまま使われる
+    print("\n--- Step 3: 事前読み込み ---")
+    backend = audio_processor.FakeBackend(load_delay=0.1)
+    engine = audio_processor.TranscriptionEngine(backend, max_models=2)
+    ok = engine.preload("model-a")
+    engine.preload_async("model-b").join()
+    ok = ok and engine.loaded_models() == ["model-a", "model-b"]
+
+    # 共有エンジンに差し替えると、エンジンを指定しない呼び出しも同じモデルを使う
+    audio = np.zeros(16000 * 2, dtype=np.float32)
+    audio_processor.set_engine(engine)
+    try:
+        ok = ok and audio_processor.get_engine() is engine
+        result = audio_processor.transcribe_array(audio, "model-b", vad=False, cascade=False)
+    finally:
+        audio_processor.set_engine(None)
+    print(f"読み込み回数 {backend.load_counts}, 結果 {result['text']!r}")
+    ok = ok and backend.load_counts == {"model-a": 1, "model-b": 1} and backend.infer_count == 1
+    # 最後に使った model-b が新しい方になる
+    ok = ok and engine.loaded_models() == ["model-a", "model-b"]
+
+    # 読み込みに失敗しても例外にはならず False を返し、プールにも入らない
+    class BrokenBackend(audio_processor.FakeBackend):
+        def load_model(self, model_name):
+            raise RuntimeError("読み込み失敗")
+
+    broken = audio_processor.TranscriptionEngine(BrokenBackend(), max_models=2)
+    ok = ok and broken.preload("model-a") is False and broken.loaded_models() == []
+    return ok
+
+class SlowLoadBackend(audio_processor.FakeBackend):
+    """model-big だけ読み込みに時間がかかるバックエンド"""
+
+    def load_model(self, model_name):
+        if model_name == "model-big":
+            time.sleep(1.0)
+        return super().load_model(model_name)
+
+def check_concurrent_load():
+    # 4. 大きなモデルの読み込み中も、読み込み済みのモデルは待たずに使え、同じモデルは1度だけ読み込む
+    print("\n--- Step 4: 読み込み中の利用 ---")
+    backend = SlowLoadBackend()
+    engine = audio_processor.TranscriptionEngine(backend, max_models=2)
+    engine.preload("model-a")
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(engine.get_model("model-big"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    engine.transcribe(np.zeros(16000, dtype=np.float32), "model-a")
+    elapsed = time.perf_counter() - start
+    for thread in threads:
+        thread.join()
+    print(f"読み込み中の model-a の推論 {elapsed:.2f}秒, 読み込み回数 {backend.load_counts}")
+    ok = elapsed < 0.5 and backend.load_counts == {"model-a": 1, "model-big": 1}
+    ok = ok and len(models) == 3 and all(model is models[0] for model in models)
+    ok = ok and engine.loaded_models() == ["model-a", "model-big"]
+
+    # 読み込みに失敗したら、待っていたスレッドにも同じ例外が届き、次の呼び出しで読み込み直す
+    class FlakyBackend(audio_processor.FakeBackend):
+        def load_model(self, model_name):
+            time.sleep(0.2)
+            if not self.load_counts:
+                self.load_counts[model_name] = 0
+                raise RuntimeError("読み込み失敗")
+            return super().load_model(model_name)
+
+    flaky = audio_processor.TranscriptionEngine(FlakyBackend(), max_models=2)
+    errors = []
+
+    def load():
+        try:
+            flaky.get_model("model-a")
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=load) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"失敗を受け取ったスレッド {len(errors)}件, 読み込み直し {flaky.preload('model-a')}")
+    ok = ok and errors == ["読み込み失敗"] * 2 and flaky.loaded_models() == ["model-a"]
+    return ok
+
+def main():
+    print("=== TranscriptionEngine テスト開始 ===")
+    ok = check_reuse()
+    ok = check_eviction() and ok
+    ok = check_preload() and ok
+    ok = check_concurrent_load() and ok
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# フォルダ監視のテスト
+# 一時フォルダに WAV を少しずつ書き込み、書き込みが終わってから1回だけ文字起こしされるか確かめる
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+
+import audio_processor
+import folder_watcher
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+class BrokenBackend(audio_processor.FakeBackend):
+    """推論が必ず失敗するバックエンド"""
+
+    def transcribe(self, model_name, model, audio, **options):
+        raise RuntimeError("推論に失敗しました (テスト)")
+
+    def transcribe_batch(self, model_name, model, audios, **options):
+        raise RuntimeError("推論に失敗しました (テスト)")
+
+def run(mode, input_filename):
+    print(f"\n--- {mode} ---")
+    folder = tempfile.mkdtemp(prefix="watch-")
+    engine = audio_processor.TranscriptionEngine(audio_processor.FakeBackend())
+    options = dict(model_name="fake-model", settle_sec=0.5, poll_sec=0.1, engine=engine,
+                   use_inotify=(mode == "inotify"))
+    ok = True
+    try:
+        # 監視を始める前からあるファイル
+        shutil.copy(input_filename, os.path.join(folder, "before.wav"))
+        ingest = folder_watcher.FolderIngest(folder, **options)
+        ingest.start()
+        print(f"監視方法: {ingest.watcher.mode}")
+
+        # 書き込み途中のファイル (ffmpeg の録音のように少しずつ増える)
+        with open(input_filename, 'rb') as src:
+            data = src.read()
+        target = os.path.join(folder, "growing.wav")
+        with open(target, 'wb') as f:
+            for start in range(0, len(data), len(data) // 5):
+                f.write(data[start:start + len(data) // 5])
+                f.flush()
+                time.sleep(0.2)
+                ok = ok and not os.path.exists(folder_watcher.transcript_path(target))
+
+        ok = wait_until(lambda: ingest.stats()['done'] == 2) and ok
+        stats = ingest.stats()
+        ingest.stop()
+        print(stats)
+        ok = ok and stats['failed'] == 0 and os.path.exists(folder_watcher.transcript_path(target))
+
+        # 再起動しても処理済みのファイルはもう一度処理しない
+        ingest = folder_watcher.FolderIngest(folder, **options)
+        ingest.start()
+        ok = wait_until(lambda: ingest.stats()['skipped'] == 2, timeout=3.0) and ok
+        ok = ok and ingest.stats()['done'] == 0
+        ingest.stop()
+
+        # 失敗したファイルは、再起動したらやり直す
+        failing = os.path.join(folder, "failing.wav")
+        broken = audio_processor.TranscriptionEngine(BrokenBackend())
+        ingest = folder_watcher.FolderIngest(folder, **dict(options, engine=broken))
+        ingest.start()
+        # 文字起こしのキャッシュに当たらないよう、他と違う音声にする
+        noise = np.random.default_rng(["polling", "inotify"].index(mode)).normal(0, 3000, 16000 * 3).astype("<i2")
+        audio_processor.write_wav_pcm(failing, noise, 16000)
+        ok = wait_until(lambda: ingest.stats()['failed'] == 1) and ok
+        ingest.stop()
+        ingest = folder_watcher.FolderIngest(folder, **options)
+        ingest.start()
+        ok = wait_until(lambda: ingest.stats()['done'] == 1) and ok
+        stats = ingest.stats()
+        ingest.stop()
+        print(f"失敗したファイルのやり直し: {stats}")
+        ok = ok and stats['skipped'] == 2 and os.path.exists(folder_watcher.transcript_path(failing))
+
+        # 止めたときに待機中だったファイルは、次に start() したときに受け付ける
+        ingest = folder_watcher.FolderIngest(folder, **options)
+        st = os.stat(target)
+        ingest._on_ready(target + ".pending", st)
+        ingest.stop()
+        ingest._on_ready(target + ".pending", st)
+        ok = ok and ingest.stats()['queued'] == 1
+    finally:
+        shutil.rmtree(folder)
+    print("✅ 成功" if ok else "❌ 失敗")
+    return ok
+
+def main():
+    input_filename = sys.argv[1] if len(sys.argv) > 1 else "output.wav"
+    print("=== フォルダ監視テスト開始 ===")
+    ok = run("polling", input_filename)
+    if sys.platform.startswith('linux'):
+        ok = run("inotify", input_filename) and ok
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# 起動時の import 時間のテスト
+# python -X importtime で各モジュールの読み込み時間を測り、
+# 重いライブラリが起動時に読み込まれていないこと、合計時間が予算内であることを確認する
+import sys
+import subprocess
+
+# GUIの起動時 (ウィンドウ表示前) に読み込まれてはいけないライブラリ
+HEAVY_MODULES = ["numpy", "ffmpeg", "pydub", "mlx", "mlx_whisper"]
+
+# モジュールごとの import 時間の予算（ミリ秒）。PyQt6 自体の時間は含まない
+# numpy だけでも 100ms 前後かかるので、重いライブラリを読み込めばすぐに予算を超える
+BUDGETS_MS = {
+    "config_manager": 50,
+    "profiler": 50,
+    "audio_processor": 150,
+}
+
+def measure_imports(module_name):
+    """
+    別プロセスで module_name を import し、-X importtime の出力を解析する
+    :return: {モジュール名: 累積時間（マイクロ秒）}
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        # 形式: "import time:       self [us] |   cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+def main():
+    print("=== import時間テスト開始 ===")
+    ok = True
+
+    # 遅いマシンでは python test_import_time.py 1.5 のように予算を倍率で緩められる
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    for module_name, budget_ms in BUDGETS_MS.items():
+        budget_ms *= scale
+        imported = measure_imports(module_name)
+        elapsed_ms = imported.get(module_name, 0) / 1000
+        heavy = sorted({name.split('.')[0] for name in imported} & set(HEAVY_MODULES))
+
+        passed = elapsed_ms <= budget_ms and not heavy
+        ok = ok and passed
+        mark = "✅" if passed else "❌"
+        print(f"{mark} {module_name}: {elapsed_ms:.1f}ms (予算 {budget_ms:.0f}ms)")
+        if heavy:
+            print(f"   起動時に重いライブラリが読み込まれています: {', '.join(heavy)}")
+
+    # async_worker は PyQt6 を含むので、重いライブラリを読み込んでいないかだけ確認する
+    try:
+        imported = measure_imports("async_worker")
+        heavy = sorted({name.split('.')[0] for name in imported} & set(HEAVY_MODULES))
+        passed = not heavy
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} async_worker: 重いライブラリ {', '.join(heavy) or 'なし'}")
+    except RuntimeError as e:
+        print(f"ℹ️ async_worker の確認を省略します ({e})")
+
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# 複数入力の同時録音のテスト
+# マイクの代わりに ffmpeg の lavfi (sine / anoisesrc) を入力にして、1つの ffmpeg で録音できるかを確かめる
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+
+import audio_processor
+
+def dominant_frequency(audio, rate=16000):
+    spectrum = np.abs(np.fft.rfft(audio * np.hanning(len(audio))))
+    return np.argmax(spectrum) * rate / len(audio)
+
+def sine(freq):
+    return (f"sine=frequency={freq}:sample_rate=48000", "lavfi")
+
+def main():
+    print("=== 複数入力録音テスト開始 ===")
+    ok = True
+
+    # ffmpeg を何回起動したかを数える
+    launched = []
+    original_popen = subprocess.Popen
+    def counting_popen(args, *a, **k):
+        launched.append(args)
+        return original_popen(args, *a, **k)
+    subprocess.Popen = counting_popen
+
+    folder = tempfile.mkdtemp(prefix="multi-")
+    try:
+        # 1. 3つの入力を1回の ffmpeg で録音し、入力ごとの配列に分ける
+        print("\n--- Step 1: メモリ上に録音 ---")
+        sources = [sine(440), sine(1000), ("anoisesrc=color=pink:amplitude=0.3", "lavfi")]
+        launched.clear()
+        audios, _ = audio_processor.record_sources(sources, duration=2, format=None)
+        freqs = [dominant_frequency(audio.to_float32()) for audio in audios[:2]]
+        print(f"ffmpeg 起動 {len(launched)}回, 長さ {[len(a) for a in audios]}, 周波数 {[f'{f:.0f}Hz' for f in freqs]}")
+        ok = ok and len(launched) == 1 and len({len(a) for a in audios}) == 1
+        ok = ok and abs(len(audios[0]) - 32000) <= 160
+        ok = ok and abs(freqs[0] - 440) < 5 and abs(freqs[1] - 1000) < 5 and np.std(audios[2].to_float32()) > 0.01
+        # record_to_array と同じく 16bit のまま持ち、float32 にするのはモデルに渡すときだけ
+        ok = ok and all(isinstance(audio, audio_processor.AudioBuffer) and audio.pcm.dtype == np.int16
+                        for audio in audios)
+
+        # 2. 同じ信号を2つ入力すると、最初のサンプルからそろっている
+        print("\n--- Step 2: 開始位置 ---")
+        audios, _ = audio_processor.record_sources([sine(440), sine(440)], duration=1, format=None)
+        diff = int(np.max(np.abs(audios[0].pcm.astype(np.int32) - audios[1].pcm)))
+        print(f"2つの入力の差: {diff}")
+        ok = ok and diff <= 3
+
+        # 3. record_audio にリストを渡すと入力ごとの WAV に保存する
+        print("\n--- Step 3: ファイルに録音 ---")
+        output = os.path.join(folder, "room.wav")
+        launched.clear()
+        success = audio_processor.record_audio(output, duration=2, format=None, audio_device=sources)
+        paths = audio_processor.source_output_files(output, len(sources))
+        lengths = [len(audio_processor.read_wav_pcm(path)[0]) for path in paths if os.path.exists(path)]
+        print(f"成功: {success}, ファイル {[os.path.basename(p) for p in paths]}, 長さ {lengths}")
+        ok = ok and success and len(launched) == 1 and len(lengths) == 3 and len(set(lengths)) == 1
+
+        # 4. 入力を増やしても起動する ffmpeg は1つだけ (起動にかかる時間は増えない)
+        print("\n--- Step 4: 入力の数と時間 ---")
+        for count in (1, 2, 4, 8):
+            launched.clear()
+            start = time.perf_counter()
+            audios, _ = audio_processor.record_sources([sine(200 + 100 * k) for k in range(count)],
+                                                       duration=5, format=None)
+            print(f"{count}入力: {time.perf_counter() - start:.2f}秒, ffmpeg 起動 {len(launched)}回")
+            ok = ok and audios is not None and len(audios) == count and len(launched) == 1
+
+        # 5. メモリ上の音声をそのまままとめて文字起こしする
+        print("\n--- Step 5: 文字起こし ---")
+        engine = audio_processor.TranscriptionEngine(audio_processor.FakeBackend())
+        results = audio_processor.transcribe_clips(audios[:3], "fake-model", engine=engine)
+        for result in results:
+            print(result['text'])
+        ok = ok and len(results) == 3
+    finally:
+        subprocess.Popen = original_popen
+        shutil.rmtree(folder)
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
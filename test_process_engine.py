@@ -0,0 +1,97 @@
+# 別プロセスでの推論 (ProcessEngine) のテスト
+# MLX がなくても動くよう、子プロセスでは FakeBackend を使う。推論中に子プロセスを強制終了し、自動で復帰するか確かめる
+import os
+import sys
+import time
+import signal
+import threading
+import numpy as np
+
+import audio_processor
+import process_engine
+from process_engine import ProcessEngine, WorkerCrashedError
+
+def main():
+    print("=== 別プロセス推論テスト開始 ===")
+    ok = True
+    events = []
+    engine = ProcessEngine("fake", {'infer_delay': 1.0}, on_event=lambda kind, detail: events.append(kind))
+    audio = np.random.default_rng(0).normal(0, 0.1, 16000 * 3).astype(np.float32)
+    expected = audio_processor.TranscriptionEngine(audio_processor.FakeBackend()).transcribe(audio, "fake-model")
+
+    # 1. 共有メモリ経由の推論が同じプロセスでの推論と同じ結果になる
+    print("\n--- Step 1: 推論 ---")
+    result = engine.transcribe(audio, "fake-model")
+    print(result['text'])
+    ok = ok and result == expected
+
+    # 2. 推論中に子プロセスが落ちても、依頼がエラーになるだけでアプリは続けられる
+    print("\n--- Step 2: 異常終了 ---")
+    threading.Timer(0.5, lambda: os.kill(engine.pid, signal.SIGKILL)).start()
+    try:
+        engine.transcribe(audio, "fake-model")
+        print("❌ エラーになりませんでした")
+        ok = False
+    except WorkerCrashedError as e:
+        print(f"期待どおりのエラー: {e}")
+
+    # 3. 自動で再起動し、読み込んでいたモデルも読み込み直される
+    print("\n--- Step 3: 再起動 ---")
+    for _ in range(50):
+        if engine.is_loaded("fake-model"):
+            break
+        time.sleep(0.1)
+    result = engine.transcribe(audio, "fake-model")
+    print(f"再起動 {engine.restarts}回, 読み込み済み {engine.loaded_models()}")
+    ok = ok and result == expected and engine.restarts == 1 and 'restarted' in events
+
+    engine.close()
+
+    # 4. 1つずつしか推論できないバックエンドでも、チャンクは子プロセスのプールで並列に推論される
+    print("\n--- Step 4: チャンクの並列推論 ---")
+    long_audio = np.random.default_rng(1).normal(0, 0.1, 16000 * 120).astype(np.float32)
+    serial = audio_processor.TranscriptionEngine(
+        audio_processor.FakeBackend(segment_sec=5.0, realtime_factor=0.04, thread_safe=False))
+    elapsed = {}
+    results = {}
+    for workers in (1, 4):
+        if workers > 1:
+            # 子プロセスの起動とモデルの読み込みは計測に含めない
+            process_engine.get_pool(workers, *serial.backend_args(), max_models=serial.max_models).preload("fake-model")
+        start = time.perf_counter()
+        results[workers] = audio_processor.transcribe_chunked(long_audio, "fake-model", serial, workers=workers)
+        elapsed[workers] = time.perf_counter() - start
+        print(f"workers={workers}: {elapsed[workers]:.2f}秒 ({results[workers]['chunks']}チャンク)")
+    ok = ok and results[1] == results[4] and results[4]['chunks'] >= 4
+    ok = ok and elapsed[4] < elapsed[1] / 2
+
+    # 5. 推論の途中で別のスレッドが違う設定のプールを求めても、使っているプールは終わるまで閉じない
+    print("\n--- Step 5: 使用中のプールの作り直し ---")
+    in_use = process_engine.get_pool(4, *serial.backend_args(), max_models=serial.max_models)
+    outcome = {}
+
+    def chunked():
+        try:
+            outcome['result'] = audio_processor.transcribe_chunked(long_audio, "fake-model", serial, workers=4)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=chunked)
+    thread.start()
+    time.sleep(0.3)
+    replaced = process_engine.get_pool(2, *serial.backend_args(), max_models=serial.max_models)
+    closed_early = all(engine._closed for engine in in_use.engines)
+    thread.join()
+    print(f"作り直し: {replaced is not in_use}, 推論中に閉じられた: {closed_early}, "
+          f"結果: {'エラー ' + str(outcome['error']) if 'error' in outcome else '成功'}")
+    ok = ok and replaced is not in_use and not closed_early and outcome.get('result') == results[1]
+    # 最後に使っていた処理が終わったら古いプールは閉じる
+    ok = ok and all(engine._closed for engine in in_use.engines)
+    process_engine.close_pool()
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
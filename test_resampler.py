@@ -0,0 +1,91 @@
+# リサンプラーの精度テストと速度計測
+import sys
+import time
+import numpy as np
+
+import audio_processor
+import resampler
+
+SAMPLE_FILES = ["output.wav", "test_record.wav", "async_test.wav"]
+
+def reference_resample(x, src_rate, dst_rate):
+    """ゼロ挿入 → 畳み込み → 間引き を愚直に行う参照実装（遅いが正確）"""
+    up, down, half_len, _ = resampler.get_filter_bank(src_rate, dst_rate)
+    n_taps = 2 * half_len + 1
+    m = np.arange(n_taps) - half_len
+    cutoff = 1.0 / max(up, down)
+    h = cutoff * np.sinc(cutoff * m) * np.kaiser(n_taps, 5.0)
+    h *= up / h.sum()
+
+    upsampled = np.zeros(len(x) * up)
+    upsampled[::up] = x
+    filtered = np.convolve(upsampled, h)
+    n_out = -(-len(x) * up // down)
+    return filtered[np.arange(n_out) * down + half_len]
+
+def check_accuracy():
+    print("\n--- 精度テスト ---")
+    rng = np.random.default_rng(0)
+    ok = True
+    for src_rate, dst_rate in [(44100, 16000), (48000, 16000), (22050, 16000), (8000, 16000)]:
+        x = rng.standard_normal(4000).astype(np.float32)
+        expected = reference_resample(x.astype(np.float64), src_rate, dst_rate)
+
+        # 一括処理
+        actual = resampler.resample(x, src_rate, dst_rate, block_size=100)
+        error = np.max(np.abs(actual - expected))
+
+        # ばらばらの長さで少しずつ渡すストリーミング処理
+        r = resampler.PolyphaseResampler(src_rate, dst_rate, block_size=64)
+        pieces, pos = [], 0
+        while pos < len(x):
+            step = int(rng.integers(1, 500))
+            pieces.append(r.process(x[pos:pos + step]))
+            pos += step
+        pieces.append(r.flush())
+        stream_error = np.max(np.abs(np.concatenate(pieces) - expected))
+
+        passed = len(actual) == len(expected) and error < 1e-5 and stream_error < 1e-5
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {src_rate}→{dst_rate}Hz: 最大誤差 {error:.2e} (ストリーミング {stream_error:.2e})")
+
+    # 外部の実装があれば比較する
+    try:
+        from scipy.signal import resample_poly
+        x = rng.standard_normal(44100).astype(np.float64)
+        error = np.max(np.abs(resampler.resample(x, 44100, 16000) - resample_poly(x, 160, 441)))
+        passed = error < 1e-4
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} scipy.signal.resample_poly との最大誤差 {error:.2e}")
+    except ImportError:
+        print("ℹ️ scipy がないため resample_poly との比較は省略します")
+
+    # 1kHz の正弦波はリサンプリング後も 1kHz の正弦波になるはず
+    t = np.arange(44100) / 44100
+    y = resampler.resample(np.sin(2 * np.pi * 1000 * t).astype(np.float32), 44100, 16000)
+    expected = np.sin(2 * np.pi * 1000 * np.arange(len(y)) / 16000)
+    error = np.max(np.abs(y - expected)[200:-200])   # 両端はフィルタの立ち上がりなので除く
+    passed = error < 5e-3   # カイザー窓 (beta=5) の通過域リップル程度は許容する
+    ok = ok and passed
+    print(f"{'✅' if passed else '❌'} 1kHz正弦波の最大誤差 {error:.2e}")
+    return ok
+
+def benchmark():
+    print("\n--- 速度計測 ---")
+    for file_path in SAMPLE_FILES:
+        audio, rate = audio_processor.load_wav(file_path)
+        start = time.perf_counter()
+        out = resampler.resample(audio, rate, 16000)
+        elapsed = time.perf_counter() - start
+        seconds = len(audio) / rate
+        print(f"{file_path}: {seconds:.1f}秒 → {len(out)}サンプル, {elapsed * 1000:.1f}ms ({seconds / elapsed:.0f}倍速)")
+
+def main():
+    print("=== リサンプラーテスト開始 ===")
+    ok = check_accuracy()
+    benchmark()
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
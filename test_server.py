@@ -0,0 +1,115 @@
+# 文字起こしサーバーのテスト
+# MLX がなくても動くよう、FakeBackend を使うサーバーを同じプロセスの別スレッドで起動する
+import sys
+import threading
+import numpy as np
+
+import audio_processor
+from transcribe_server import TranscriptionServer
+from transcribe_client import TranscriptionClient, ServerError
+
+def main():
+    input_filename = sys.argv[1] if len(sys.argv) > 1 else "output.wav"
+    ok = True
+
+    print("=== サーバーテスト開始 ===")
+    backend = audio_processor.FakeBackend(infer_delay=0.5)
+    engine = audio_processor.TranscriptionEngine(backend)
+    server = TranscriptionServer(port=0, max_jobs=2, engine=engine)
+    server.start()
+    client = TranscriptionClient(server.url)
+
+    # 1. モデルの事前読み込み
+    print("\n--- Step 1: モデル読み込み ---")
+    client.preload("fake-model")
+    status = client.health()
+    print(status)
+    ok = ok and status['models'] == ["fake-model"]
+
+    # 2. ファイルのパスを送る
+    print("\n--- Step 2: ファイル ---")
+    result = client.transcribe_file(input_filename, "fake-model", vad=False)
+    expected = audio_processor.transcribe_file(input_filename, "fake-model", engine, use_cache=False, vad=False)
+    print(result['text'])
+    ok = ok and result['text'] == expected['text']
+
+    # 3. 音声データを送る
+    print("\n--- Step 3: PCMアップロード ---")
+    # 録音と同じく 16bit のまま送る (サーバーも int16 のままリサンプリングする)
+    audio = audio_processor.AudioBuffer.load(input_filename)
+    result = client.transcribe_pcm(audio, "fake-model", vad=False)
+    print(result['text'])
+    ok = ok and result['text'] == expected['text']
+
+    # 4. 同時実行数の上限を超えたリクエストは少し待って順に処理され、待たない設定なら断られる
+    print("\n--- Step 4: 同時実行 ---")
+    outcomes = []
+
+    def request():
+        try:
+            client.transcribe_pcm(np.zeros(16000, dtype=np.float32), "fake-model", vad=False)
+            outcomes.append("ok")
+        except ServerError:
+            outcomes.append("busy")
+
+    def burst():
+        outcomes.clear()
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"成功 {outcomes.count('ok')}件, 混雑で拒否 {outcomes.count('busy')}件")
+
+    burst()
+    ok = ok and outcomes.count('ok') == 4
+    server.queue_timeout = 0
+    burst()
+    ok = ok and outcomes.count('ok') >= 2 and outcomes.count('busy') >= 1
+
+    # 5. 存在しないファイルや、指定できないオプションはエラーになる
+    print("\n--- Step 5: 不正なリクエスト ---")
+    for kwargs in ({'file_path': "no-such-file.wav"},
+                   {'file_path': input_filename, 'use_cache': False},
+                   {'file_path': input_filename, 'no_such_option': 1}):
+        try:
+            client.transcribe_file(model_name="fake-model", **kwargs)
+            ok = False
+        except ServerError as e:
+            print(f"期待どおりのエラー: {e}")
+            ok = ok and "予期せぬエラー" not in str(e)
+
+    # 6. 上限を超える大きさの本文は読まずに断る
+    print("\n--- Step 6: 本文の大きさの上限 ---")
+    server.max_body_bytes = 16000 * 4
+    for samples, expected_ok in ((16000, True), (16001, False)):
+        try:
+            client.transcribe_pcm(np.zeros(samples, dtype=np.float32), "fake-model", vad=False)
+            accepted = True
+        except ServerError as e:
+            print(f"期待どおりのエラー: {e}")
+            accepted = False
+        ok = ok and accepted == expected_ok
+
+    # 7. サンプリングレートが不正なら 400 を返し、失敗した仕事は完了とは別に数える
+    print("\n--- Step 7: 不正なサンプリングレート ---")
+    server.queue_timeout = 10.0
+    before = client.health()
+    for rate in (0, -16000, 10 ** 9):
+        try:
+            client.transcribe_pcm(np.zeros(1600, dtype=np.float32), "fake-model", rate=rate, vad=False)
+            ok = False
+        except ServerError as e:
+            print(f"期待どおりのエラー: {e}")
+            ok = ok and "予期せぬエラー" not in str(e)
+    status = client.health()
+    print(status)
+    ok = ok and status['failed'] - before['failed'] == 3 and status['completed'] == before['completed']
+
+    server.shutdown()
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# ストリーミング文字起こしのテスト
+# マイクの代わりに WAV ファイルを ffmpeg のファイル入力として流し込む
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import audio_processor
+
+def main():
+    input_filename = sys.argv[1] if len(sys.argv) > 1 else "output.wav"
+
+    print("=== ストリーミングテスト開始 ===")
+
+    # MLX がなくても動くよう、決定的な FakeBackend を使う
+    engine = audio_processor.TranscriptionEngine(audio_processor.FakeBackend())
+
+    windows = 0
+    last_end = 0.0
+    full_text = ""
+    new_parts = []
+    # 録音ファイル (と波形のピーク) は一時フォルダに書き、カレントディレクトリを汚さない
+    with tempfile.TemporaryDirectory(prefix="stream-") as folder:
+        for partial in audio_processor.stream_transcribe(
+            input_filename, "fake-model", format=None, window_sec=5.0, overlap_sec=1.0,
+            output_file=os.path.join(folder, "stream_test.wav"), engine=engine
+        ):
+            windows += 1
+            last_end = partial['end']
+            full_text = partial['full_text']
+            new_parts.append((partial['new_start'], partial['end'], partial['new_text']))
+            mark = " (最後)" if partial['is_final'] else ""
+            print(f"[{partial['start']:6.2f}s - {partial['end']:6.2f}s]{mark} {partial['text']}")
+
+    audio, rate = audio_processor.load_wav(input_filename)
+    expected_seconds = len(audio) / rate
+    print(f"\n窓の数: {windows}, 最後の窓の終わり: {last_end:.2f}秒 (元の長さ {expected_seconds:.2f}秒)")
+
+    ok = windows > 0 and abs(last_end - expected_seconds) < 0.1
+    # 新しく加わった部分は前の窓と重ならず、つなぐと全体の文字列になる
+    print(f"新しく加わった区間: {[(round(start, 2), round(end, 2)) for start, end, _ in new_parts]}")
+    ok = ok and all(new_parts[k][0] == new_parts[k - 1][1] for k in range(1, len(new_parts)))
+    ok = ok and "".join(text for _, _, text in new_parts).replace(" ", "") == full_text.replace(" ", "")
+
+    # 入力が窓の区切りちょうどで終わっても、最後の窓 (長さ0) で終わりが分かる
+    window, hop = 5 * 16000, 4 * 16000
+    for total in (window + hop, window + hop + 1600):
+        chunks = (np.zeros(1600, dtype=np.float32) for _ in range(0, total, 1600))
+        parts = [(start, len(part), is_final) for start, part, is_final in
+                 audio_processor.iter_windows(chunks, window, hop)]
+        print(f"{total / 16000:.2f}秒の入力: {parts}")
+        ok = ok and [is_final for _, _, is_final in parts] == [False] * (len(parts) - 1) + [True]
+        ok = ok and parts[-1][0] + parts[-1][1] == total
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
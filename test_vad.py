@@ -0,0 +1,64 @@
+# 発話区間の検出 (簡易VAD) のテスト
+# 静かな録音と雑音の大きい録音の合成音声で、発話区間だけが見つかることを確かめる
+import sys
+import numpy as np
+
+import audio_processor
+import config_manager
+
+RATE = 16000
+# 発話を置く区間（秒）
+SPEECH = [(3.0, 5.0), (9.0, 10.0), (14.0, 17.0)]
+
+def synthesize(noise_db, speech_db, seconds=20.0, seed=0):
+    """noise_db の白色雑音に、speech_db の音量の声 (倍音のある 150Hz の音) を SPEECH の区間だけ重ねる"""
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0.0, 10 ** (noise_db / 20), int(seconds * RATE)).astype(np.float32)
+    t = np.arange(int(seconds * RATE)) / RATE
+    voice = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 6))
+    voice *= 10 ** (speech_db / 20) / np.sqrt(np.mean(voice ** 2))
+    for start, end in SPEECH:
+        audio[int(start * RATE):int(end * RATE)] += voice[int(start * RATE):int(end * RATE)].astype(np.float32)
+    return audio
+
+def matches(regions, tolerance=0.3):
+    """見つかった区間が SPEECH と (前後の余白を除いて) 一致するか"""
+    if len(regions) != len(SPEECH):
+        return False
+    return all(abs(a / RATE - start) <= tolerance and abs(b / RATE - end) <= tolerance
+               for (a, b), (start, end) in zip(regions, SPEECH))
+
+def main():
+    ok = True
+    print("=== VAD テスト開始 ===")
+
+    # 1. 静かな録音 (-60dBFS の雑音) の中の小さな声
+    print("\n--- Step 1: 静かな録音 ---")
+    regions = audio_processor.detect_speech(synthesize(-60, -35), RATE)
+    print(f"発話区間: {[(a / RATE, b / RATE) for a, b in regions]}")
+    ok = ok and matches(regions)
+
+    # 2. 雑音の大きい録音 (-25dBFS)。閾値は雑音に合わせて上がり、雑音を発話とみなさない
+    print("\n--- Step 2: 雑音の大きい録音 ---")
+    regions = audio_processor.detect_speech(synthesize(-25, -13, seed=1), RATE)
+    print(f"発話区間: {[(a / RATE, b / RATE) for a, b in regions]}")
+    ok = ok and matches(regions)
+
+    # 3. 発話がなく雑音だけなら、何も見つからない
+    print("\n--- Step 3: 雑音だけ ---")
+    rng = np.random.default_rng(2)
+    regions = audio_processor.detect_speech(rng.normal(0.0, 10 ** (-25 / 20), 10 * RATE).astype(np.float32), RATE)
+    print(f"発話区間: {regions}")
+    ok = ok and regions == []
+
+    # 4. VAD は設定で有効にしたときだけ使う (既定では音声全体を推論する)
+    print("\n--- Step 4: 既定の設定 ---")
+    print(f"vad_enabled: {config_manager.DEFAULT_CONFIG['vad_enabled']}")
+    ok = ok and config_manager.DEFAULT_CONFIG['vad_enabled'] is False
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
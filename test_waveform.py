@@ -0,0 +1,88 @@
+# 波形のピラミッドのテスト
+# 少しずつ作ったものとまとめて作ったものが一致するか、表示する列が元の音声の最小値・最大値と一致するか、
+# 長いファイルでも1回の描画にかかる時間が変わらないかを確かめる
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+
+import audio_processor
+import waveform
+
+def brute_columns(pcm, start, end, width):
+    """元の音声を全部見て列ごとの最小値・最大値を求める (比較用)"""
+    edges = start + (np.arange(width + 1) * (end - start)) // width
+    lo = np.array([pcm[a:max(b, a + 1)].min() for a, b in zip(edges[:-1], edges[1:])])
+    hi = np.array([pcm[a:max(b, a + 1)].max() for a, b in zip(edges[:-1], edges[1:])])
+    return lo / 32768.0, hi / 32768.0
+
+def main():
+    input_filename = sys.argv[1] if len(sys.argv) > 1 else "output.wav"
+    print("=== 波形ピラミッドテスト開始 ===")
+    ok = True
+    pcm, rate, _ = audio_processor.read_wav_pcm(input_filename)
+    mono = np.asarray(pcm[:, 0])
+
+    # 1. 録音しながら少しずつ作っても、まとめて作ったものと同じになる
+    print("\n--- Step 1: 少しずつ作る ---")
+    whole = waveform.PeakPyramid.from_pcm(pcm, rate)
+    builder = waveform.PeakBuilder(rate)
+    for start in range(0, len(mono), 1000):
+        builder.append(mono[start:start + 1000])
+    partial = builder.finish()
+    same = all(np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+               for a, b in zip(whole.levels, partial.levels))
+    print(f"段数 {len(whole.levels)}, 最下段 {len(whole.levels[0][0])}個, 一致: {same}")
+    ok = ok and same and partial.frames == len(mono)
+
+    # 2. 段の区切りにそろった範囲なら、元の音声から求めた最小値・最大値と一致する
+    print("\n--- Step 2: 表示する列 ---")
+    for width, size in ((100, 64), (100, 1024), (50, 16384)):
+        start, end = 3 * size, 3 * size + width * size
+        if end > len(mono):
+            continue
+        lo, hi = whole.columns(start, end, width)
+        expected_lo, expected_hi = brute_columns(mono, start, end, width)
+        match = np.allclose(lo, expected_lo) and np.allclose(hi, expected_hi)
+        print(f"{size}フレーム/列: 段 {whole.level_for(size)}, 一致: {match}")
+        ok = ok and match
+
+    # 3. サイドカーに保存して読み直す。元のファイルが変わったら作り直す
+    print("\n--- Step 3: サイドカー ---")
+    folder = tempfile.mkdtemp(prefix="peaks-")
+    try:
+        path = os.path.join(folder, "a.wav")
+        shutil.copy(input_filename, path)
+        first = waveform.load_peaks(path)
+        loaded = waveform.PeakPyramid.load(waveform.sidecar_path(path), source=path)
+        ok = ok and loaded is not None and np.array_equal(loaded.levels[-1][0], first.levels[-1][0])
+        audio_processor.write_wav_pcm(path, pcm[:rate], rate)
+        stale = waveform.PeakPyramid.load(waveform.sidecar_path(path), source=path)
+        rebuilt = waveform.load_peaks(path)
+        print(f"保存: {loaded is not None}, 変更後は作り直し: {stale is None and rebuilt.frames == rate}")
+        ok = ok and stale is None and rebuilt.frames == rate
+    finally:
+        shutil.rmtree(folder)
+
+    # 4. 1時間の音声でも1回の描画 (800列) の時間は短い音声と変わらない
+    print("\n--- Step 4: 描画時間 ---")
+    long_pcm = np.tile(mono, int(3600 * rate / len(mono)) + 1)
+    start = time.perf_counter()
+    long_pyramid = waveform.PeakPyramid.from_pcm(long_pcm, rate)
+    print(f"{len(long_pcm) / rate / 60:.0f}分の音声のピラミッドを {time.perf_counter() - start:.2f}秒で作成")
+    for name, pyramid in (("短い", whole), ("1時間", long_pyramid)):
+        start = time.perf_counter()
+        for _ in range(100):
+            pyramid.columns(0, pyramid.frames, 800)
+        per_call = (time.perf_counter() - start) / 100
+        print(f"{name}音声の全体表示: {per_call * 1000:.3f}ms")
+        ok = ok and per_call < 0.005
+
+    print("✅ 成功" if ok else "❌ 失敗")
+    print("\n=== テスト終了 ===")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# 文字起こしサーバー (transcribe_server.py) のクライアント
+# 使い方:
+#   python transcribe_client.py output.wav                    # ファイルのパスを送って文字起こし
+#   python transcribe_client.py output.wav --upload           # 音声データを送って文字起こし (別のマシンのサーバー向け)
+#   python transcribe_client.py --health
+# 標準ライブラリだけで動くので、GUIから使っても起動は遅くならない
+import os
+import sys
+import json
+import argparse
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+import config_manager
+
+
+class ServerError(Exception):
+    """サーバーに接続できない、またはサーバーがエラーを返したとき"""
+
+
+def server_url(config=None):
+    """設定の server_host / server_port からサーバーのURLを作る"""
+    if config is None:
+        config = config_manager.read_config()
+    return f"http://{config.get('server_host', '127.0.0.1')}:{config.get('server_port', 8765)}"
+
+
+class TranscriptionClient:
+    def __init__(self, url=None, timeout=600):
+        """
+        :param url: サーバーのURL (省略時は設定から作る)
+        :param timeout: 1回のリクエストを待つ最大時間（秒）
+        """
+        self.url = (url or server_url()).rstrip('/')
+        self.timeout = timeout
+
+    def health(self):
+        """サーバーの状態の辞書を返す。つながらなければ None"""
+        try:
+            return self._request('GET', '/health', timeout=2)
+        except ServerError:
+            return None
+
+    def preload(self, model_name):
+        return self._request('POST', '/preload', {'model': model_name})
+
+    def transcribe_file(self, file_path, model_name, chunked=False, vad=None, **options):
+        """
+        サーバーから読めるファイルを文字起こしする
+        :return: audio_processor.transcribe_file と同じ形式の辞書
+        :raises ServerError: 失敗したとき (メッセージはサーバーのエラー)
+        """
+        request = {'path': os.path.abspath(file_path), 'model': model_name, 'chunked': chunked, 'options': options}
+        if vad is not None:
+            request['vad'] = vad
+        return self._request('POST', '/transcribe', request)
+
+    def transcribe_pcm(self, audio, model_name, rate=16000, vad=None):
+        """
+        音声データを送って文字起こしする
+        :param audio: モノラル float32 の Numpy配列、16bit 整数の Numpy配列、または AudioBuffer
+        :param rate: サンプリングレート (AudioBuffer なら AudioBuffer のレートを使う)
+        """
+        import audio_processor
+
+        if isinstance(audio, audio_processor.AudioBuffer):
+            audio, rate = audio.mono().pcm, audio.rate
+        pcm_format = 's16le' if audio.dtype.kind == 'i' else 'f32le'
+        query = {'model': model_name, 'rate': rate, 'format': pcm_format}
+        if vad is not None:
+            query['vad'] = int(bool(vad))
+        body = audio.astype('<i2' if pcm_format == 's16le' else '<f4', copy=False).tobytes()
+        return self._request('POST', '/transcribe/pcm?' + urlencode(query), body=body)
+
+    def _request(self, method, path, payload=None, body=None, timeout=None):
+        headers = {}
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif body is not None:
+            headers['Content-Type'] = 'application/octet-stream'
+        request = urllib.request.Request(self.url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', str(e))
+            except ValueError:
+                message = str(e)
+            raise ServerError(message) from None
+        except (urllib.error.URLError, OSError) as e:
+            raise ServerError(f"サーバーに接続できません ({self.url}): {e}") from None
+
+
+def main(argv=None):
+    config = config_manager.load_config()
+    parser = argparse.ArgumentParser(description="文字起こしサーバーのクライアント")
+    parser.add_argument('files', nargs='*', help="文字起こしするWAVファイル")
+    parser.add_argument('--url', default=server_url(config), help="サーバーのURL")
+    parser.add_argument('--model', default=config.get('model_name', 'mlx-community/whisper-base-mlx'))
+    parser.add_argument('--upload', action='store_true', help="パスではなく音声データを送る")
+    parser.add_argument('--health', action='store_true', help="サーバーの状態を表示する")
+    args = parser.parse_args(argv)
+
+    client = TranscriptionClient(args.url)
+    if args.health or not args.files:
+        status = client.health()
+        if status is None:
+            print(f"❌ サーバーに接続できません: {args.url}")
+            return 1
+        print(json.dumps(status, indent=4, ensure_ascii=False))
+        return 0
+
+    failed = 0
+    for file_path in args.files:
+        try:
+            if args.upload:
+                # 音声の読み込みにだけ Numpy を使う
+                import audio_processor
+                audio, rate = audio_processor.load_wav(file_path)
+                result = client.transcribe_pcm(audio, args.model, rate=rate)
+            else:
+                result = client.transcribe_file(file_path, args.model)
+        except ServerError as e:
+            print(f"❌ {file_path}: {e}")
+            failed += 1
+            continue
+        mark = " (キャッシュ)" if result.get('cache') == 'hit' else ""
+        print(f"✅ {file_path}{mark}: {result.get('text', '')}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
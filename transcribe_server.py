@@ -0,0 +1,306 @@
+# 文字起こしサーバー (GUIなしで常駐し、モデルを読み込んだまま待ち受ける)
+# 使い方:
+#   python transcribe_server.py                   # 設定の server_host / server_port で起動
+#   python transcribe_server.py --port 9000 --max-jobs 4
+#
+# エンドポイント (結果はすべて JSON):
+#   GET  /health                     状態 (読み込み済みモデル, 実行中の仕事の数)
+#   POST /preload        {"model"}   モデルを事前に読み込む
+#   POST /transcribe     {"path", "model", "chunked", "vad", "options"}   サーバーから見えるファイルを文字起こし
+#   POST /transcribe/pcm?model=...&rate=16000&format=f32le     本文の生PCM (モノラル) を文字起こし
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+import audio_processor
+import config_manager
+import resampler
+
+DEFAULT_MODEL = "mlx-community/whisper-base-mlx"
+# アップロードできる PCM の形式 -> (Numpyのdtype, float32に変換するときの倍率)
+PCM_FORMATS = {
+    'f32le': ('<f4', 1.0),
+    's16le': ('<i2', 1.0 / 32768.0),
+}
+# /transcribe の "options" で指定できるデコードオプション (それ以外は 400)
+DECODE_OPTIONS = {
+    'language', 'task', 'temperature', 'initial_prompt', 'word_timestamps', 'condition_on_previous_text',
+    'compression_ratio_threshold', 'logprob_threshold', 'no_speech_threshold', 'best_of', 'beam_size', 'patience',
+}
+# /transcribe/pcm で受け付けるサンプリングレートの上限 (Hz)
+MAX_PCM_RATE = 384000
+
+
+class RequestError(Exception):
+    """クライアントにそのまま返すエラー (HTTPステータス付き)"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class TranscriptionServer:
+    """
+    audio_processor の共有エンジンを使って、HTTP で文字起こしを受け付けるサーバー
+    リクエストはスレッドごとに処理し、同時に実行する仕事の数は max_jobs までに制限する
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, max_jobs=2, engine=None, queue_timeout=10.0,
+                 max_body_bytes=256 * 1024 * 1024):
+        """
+        :param host: 待ち受けるアドレス (外部に公開しないよう既定は localhost)
+        :param port: ポート番号 (0 なら空いているポートを使う)
+        :param max_jobs: 同時に実行する文字起こしの数の上限
+        :param engine: 使用する TranscriptionEngine (省略時は共有エンジン)
+        :param queue_timeout: 上限に達しているとき空きを待つ秒数。待っても空かなければ 503 を返す
+                              (0 なら待たずにすぐ 503。少し待つので、短時間に集中したリクエストは順に処理される)
+        :param max_body_bytes: 受け付ける本文の大きさの上限 (超えたら読まずに 413 を返す)
+        """
+        self.engine = engine if engine is not None else audio_processor.get_engine()
+        self.max_jobs = max(1, int(max_jobs))
+        self.queue_timeout = queue_timeout
+        self.max_body_bytes = max_body_bytes
+        self._slots = threading.BoundedSemaphore(self.max_jobs)
+        self._in_flight = 0
+        self._count_lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.app = self
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        print(f"🚀 文字起こしサーバーを起動しました: {self.url} (同時実行 {self.max_jobs}件まで)")
+        self.httpd.serve_forever()
+
+    def start(self):
+        """別スレッドで待ち受けを始める (テスト用)。開始したスレッドを返す"""
+        thread = threading.Thread(target=self.httpd.serve_forever, name="transcribe-server", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def health(self):
+        with self._count_lock:
+            in_flight = self._in_flight
+        return {
+            'status': 'ok',
+            'models': self.engine.loaded_models(),
+            'in_flight': in_flight,
+            'max_jobs': self.max_jobs,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+    @contextmanager
+    def job_slot(self):
+        """
+        同時実行数の枠を1つ確保する。枠が空かなければ RequestError(503)
+        本文を読み込む前に確保するので、混み合っているときは大きな本文も読まずに断れる
+        """
+        if self.queue_timeout:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._count_lock:
+                self.rejected += 1
+            raise RequestError(503, "サーバーが混み合っています。しばらく待ってから再実行してください")
+        with self._count_lock:
+            self._in_flight += 1
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            with self._count_lock:
+                self._in_flight -= 1
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            self._slots.release()
+
+    # ---- 各エンドポイントの処理 (呼び出し側で枠を確保してから呼ぶ) ----
+    def preload(self, request):
+        model = request.get('model', DEFAULT_MODEL)
+        if not self.engine.preload(model):
+            raise RequestError(500, f"モデルの読み込みに失敗しました: {model}")
+        return {'model': model, 'models': self.engine.loaded_models()}
+
+    def transcribe_path(self, request):
+        path = request.get('path')
+        if not path:
+            raise RequestError(400, "path を指定してください")
+        if not os.path.exists(path):
+            raise RequestError(404, f"ファイルが見つかりません: {path}")
+        model = request.get('model', DEFAULT_MODEL)
+        options = request.get('options') or {}
+        if not isinstance(options, dict):
+            raise RequestError(400, "options は JSON オブジェクトで指定してください")
+        unknown = sorted(set(options) - DECODE_OPTIONS)
+        if unknown:
+            raise RequestError(400, f"指定できないオプションです: {', '.join(unknown)}")
+        return audio_processor.transcribe_file(
+            path, model, self.engine, chunked=bool(request.get('chunked', False)), vad=request.get('vad'), **options
+        )
+
+    def transcribe_pcm(self, query, body):
+        model = query.get('model', DEFAULT_MODEL)
+        pcm_format = query.get('format', 'f32le')
+        if pcm_format not in PCM_FORMATS:
+            raise RequestError(400, f"対応していない形式です: {pcm_format}")
+        try:
+            rate = int(query.get('rate', 16000))
+        except ValueError:
+            raise RequestError(400, "rate は整数で指定してください")
+        if not 0 < rate <= MAX_PCM_RATE:
+            raise RequestError(400, f"rate は 1〜{MAX_PCM_RATE} の範囲で指定してください: {rate}")
+        dtype, scale = PCM_FORMATS[pcm_format]
+        if len(body) % np.dtype(dtype).itemsize:
+            raise RequestError(400, "PCM のバイト数がサンプルの大きさで割り切れません")
+        vad = query.get('vad')
+        vad = None if vad is None else vad not in ('0', 'false', 'False')
+
+        timings = {}
+        start = time.perf_counter()
+        if np.dtype(dtype) == np.int16:
+            # 16bit はコピーせずに int16 のまま扱い、float32 にするのはモデルに渡すときだけ
+            arr = audio_processor.AudioBuffer(np.frombuffer(body, dtype=dtype), rate).resample(16000)
+        else:
+            arr = np.frombuffer(body, dtype=dtype).astype(np.float32)
+            if scale != 1.0:
+                arr *= np.float32(scale)
+            if rate != 16000:
+                arr = resampler.resample(arr, rate, 16000)
+        timings['decode'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = audio_processor.transcribe_array(arr, model, self.engine, vad=vad)
+        timings['inference'] = time.perf_counter() - start
+        result['text'] = result.get('text', '').strip()
+        result.update(cache='off', timings=timings)
+        return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "TranscribeServer/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self._send(200, self.server.app.health())
+        else:
+            self._send(404, {'error': f"不明なパスです: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        app = self.server.app
+        start = time.perf_counter()
+        try:
+            if url.path not in ('/preload', '/transcribe', '/transcribe/pcm'):
+                raise RequestError(404, f"不明なパスです: {url.path}")
+            # 大きさを確かめ、枠を確保してから本文を読む
+            length = self._content_length(app.max_body_bytes)
+            with app.job_slot():
+                body = self.rfile.read(length)
+                if url.path == '/preload':
+                    result = app.preload(self._parse_json(body))
+                elif url.path == '/transcribe':
+                    result = app.transcribe_path(self._parse_json(body))
+                else:
+                    query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                    result = app.transcribe_pcm(query, body)
+        except RequestError as e:
+            self._send(e.status, {'error': str(e)})
+            return
+        except Exception as e:
+            print(f"❌ サーバーエラー: {url.path}: {e}")
+            self._send(500, {'error': f"予期せぬエラー: {e}"})
+            return
+        print(f"✅ {url.path} ({time.perf_counter() - start:.2f}秒)")
+        self._send(200, result)
+
+    def _content_length(self, max_bytes):
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(411, "Content-Length を指定してください")
+        try:
+            length = int(length)
+        except ValueError:
+            raise RequestError(400, "Content-Length が数値ではありません")
+        if length < 0:
+            raise RequestError(400, "Content-Length が負の値です")
+        if length > max_bytes:
+            raise RequestError(413, f"本文が大きすぎます ({length}バイト, 上限 {max_bytes}バイト)")
+        return length
+
+    def _parse_json(self, body):
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise RequestError(400, "JSON として読めません")
+        if not isinstance(request, dict):
+            raise RequestError(400, "JSON オブジェクトを送ってください")
+        return request
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False, default=audio_processor._json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # アクセスログは標準エラーに出さず、処理結果だけを表示する
+        pass
+
+
+def main(argv=None):
+    config = config_manager.load_config()
+    parser = argparse.ArgumentParser(description="文字起こしサーバー")
+    parser.add_argument('--host', default=config.get('server_host', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=config.get('server_port', 8765))
+    parser.add_argument('--max-jobs', type=int, default=config.get('server_max_jobs', 2), help="同時に実行する仕事の数")
+    parser.add_argument('--queue-sec', type=float, default=config.get('server_queue_sec', 10.0),
+                        help="同時実行数の上限に達しているとき空きを待つ秒数 (過ぎたら 503)")
+    parser.add_argument('--max-body-mb', type=float, default=config.get('server_max_body_mb', 256),
+                        help="受け付ける本文の大きさの上限 (MB)")
+    parser.add_argument('--model', default=config.get('model_name', DEFAULT_MODEL), help="起動時に読み込むモデル")
+    parser.add_argument('--no-preload', action='store_true', help="起動時にモデルを読み込まない")
+    args = parser.parse_args(argv)
+
+    server = TranscriptionServer(args.host, args.port, args.max_jobs, queue_timeout=args.queue_sec,
+                                 max_body_bytes=int(args.max_body_mb * 1024 * 1024))
+    if not args.no_preload:
+        audio_processor.warm_up()
+        server.engine.preload(args.model)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 サーバーを停止します")
+    finally:
+        server.httpd.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
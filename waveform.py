@@ -0,0 +1,204 @@
+import os
+import json
+
+import numpy as np
+
+# ==========================================
+# 波形表示用のピークのピラミッド
+# ==========================================
+# 音声を BLOCK_FRAMES フレームごとの (最小値, 最大値) にまとめたものを最下段とし、
+# その上に FACTOR 個ずつまとめた段を重ねる。表示するときは「1画素あたりのフレーム数」を
+# 超えない一番粗い段を使うので、ファイルの長さに関係なく画素数に比例した量しか読まない。
+# 値は int16 の範囲 (-32768..32767) で持つ。
+BLOCK_FRAMES = 64
+FACTOR = 4
+SIDECAR_EXT = ".peaks"
+
+
+def _to_int16_extremes(pcm):
+    """(フレーム数,) または (フレーム数, チャンネル数) の PCM を、フレームごとの (最小値, 最大値) にする"""
+    if pcm.dtype.kind == 'f':
+        pcm = np.clip(np.rint(np.asarray(pcm) * 32768.0), -32768, 32767).astype(np.int16)
+    elif pcm.dtype.kind == 'u':
+        pcm = ((pcm.astype(np.int16) - 128) << 8).astype(np.int16)
+    elif pcm.dtype.itemsize > 2:
+        pcm = (pcm >> (pcm.dtype.itemsize * 8 - 16)).astype(np.int16)
+    if pcm.ndim == 2:
+        if pcm.shape[1] == 1:
+            pcm = pcm[:, 0]
+        else:
+            return pcm.min(axis=1), pcm.max(axis=1)
+    return pcm, pcm
+
+def _reduce(lo, hi, size):
+    """size 個ずつまとめた (最小値, 最大値) を返す (端数は最後の1個にまとめる)"""
+    if len(lo) == 0:
+        return lo[:0], hi[:0]
+    starts = np.arange(0, len(lo), size)
+    return np.minimum.reduceat(lo, starts), np.maximum.reduceat(hi, starts)
+
+
+class PeakPyramid:
+    """複数の解像度の (最小値, 最大値) を持ち、任意の表示範囲の波形を一定の手間で返す"""
+
+    def __init__(self, rate, frames, base, block_frames=BLOCK_FRAMES, factor=FACTOR):
+        """
+        :param base: 最下段の (最小値の配列, 最大値の配列)
+        """
+        self.rate = rate
+        self.frames = frames
+        self.block_frames = block_frames
+        self.factor = factor
+        self.levels = [base]
+        while len(self.levels[-1][0]) > 1:
+            self.levels.append(_reduce(*self.levels[-1], factor))
+
+    @classmethod
+    def from_pcm(cls, pcm, rate, block_frames=BLOCK_FRAMES, factor=FACTOR, chunk_frames=1 << 20):
+        """PCM 全体から作る。長いファイルでも作業用のメモリが増えないよう、区切って処理する"""
+        builder = PeakBuilder(rate, block_frames, factor)
+        chunk_frames -= chunk_frames % block_frames
+        for start in range(0, len(pcm), chunk_frames):
+            builder.append(pcm[start:start + chunk_frames])
+        return builder.finish()
+
+    @property
+    def duration(self):
+        return self.frames / self.rate if self.rate else 0.0
+
+    def level_for(self, frames_per_column):
+        """1列あたりのフレーム数を超えない一番粗い段の番号を返す"""
+        level, size = 0, self.block_frames
+        while level + 1 < len(self.levels) and size * self.factor <= frames_per_column:
+            level += 1
+            size *= self.factor
+        return level
+
+    def columns(self, start, end, width):
+        """
+        フレーム [start, end) を width 列に分けたときの、列ごとの最小値と最大値を返す
+        :return: (最小値, 最大値) の float32 配列 (-1.0〜1.0)。範囲が空なら長さ 0
+        """
+        start, end = max(0, int(start)), min(self.frames, int(end))
+        if end <= start or width <= 0 or self.frames == 0:
+            empty = np.zeros(0, dtype=np.float32)
+            return empty, empty
+        level = self.level_for((end - start) / width)
+        size = self.block_frames * self.factor ** level
+        lo, hi = self.levels[level]
+        first = start // size
+        last = min(len(lo), -(-end // size))
+        edges = first + (np.arange(width) * (last - first)) // width
+        scale = np.float32(1.0 / 32768.0)
+        return (np.minimum.reduceat(lo[first:last], edges - first).astype(np.float32) * scale,
+                np.maximum.reduceat(hi[first:last], edges - first).astype(np.float32) * scale)
+
+    # ---- サイドカーファイル ----
+    def save(self, path, source=None):
+        """
+        最下段だけを保存する (上の段は読み込むときに作り直す)
+        :param source: 元の音声ファイル。指定すると、更新されたかを判定できるよう大きさと更新日時を記録する
+        """
+        meta = {'rate': self.rate, 'frames': self.frames,
+                'block_frames': self.block_frames, 'factor': self.factor}
+        if source is not None:
+            stat = os.stat(source)
+            meta['source_size'] = stat.st_size
+            meta['source_mtime_ns'] = stat.st_mtime_ns
+        lo, hi = self.levels[0]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), lo=lo, hi=hi)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, source=None):
+        """
+        保存したピラミッドを読み込む
+        :param source: 元の音声ファイル。保存したあとに変わっていれば None を返す
+        """
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes())
+            lo, hi = data['lo'], data['hi']
+        if source is not None:
+            stat = os.stat(source)
+            if (meta.get('source_size'), meta.get('source_mtime_ns')) != (stat.st_size, stat.st_mtime_ns):
+                return None
+        return cls(meta['rate'], meta['frames'], (lo, hi), meta['block_frames'], meta['factor'])
+
+
+class PeakBuilder:
+    """録音しながら少しずつ PCM を受け取り、最下段を作っていく"""
+
+    def __init__(self, rate, block_frames=BLOCK_FRAMES, factor=FACTOR):
+        self.rate = rate
+        self.block_frames = block_frames
+        self.factor = factor
+        self.frames = 0
+        self._lo, self._hi = [], []
+        self._tail_lo = self._tail_hi = np.zeros(0, dtype=np.int16)
+
+    def append(self, pcm):
+        """PCM の続きを追加する (float32 または int16、モノラルでも複数チャンネルでもよい)"""
+        lo, hi = _to_int16_extremes(pcm)
+        if len(lo) == 0:
+            return
+        self.frames += len(lo)
+        if len(self._tail_lo):
+            lo, hi = np.concatenate((self._tail_lo, lo)), np.concatenate((self._tail_hi, hi))
+        full = len(lo) - len(lo) % self.block_frames
+        if full:
+            block_lo, block_hi = _reduce(lo[:full], hi[:full], self.block_frames)
+            self._lo.append(block_lo)
+            self._hi.append(block_hi)
+        # 端数はコピーして持っておく (受け取った配列は呼び出し側で使い回されることがある)
+        self._tail_lo, self._tail_hi = lo[full:].copy(), hi[full:].copy()
+
+    def finish(self):
+        """ここまでの PCM のピラミッドを返す (続けて append してもよい)"""
+        lo = self._lo + [self._tail_lo.min(keepdims=True)] if len(self._tail_lo) else list(self._lo)
+        hi = self._hi + [self._tail_hi.max(keepdims=True)] if len(self._tail_hi) else list(self._hi)
+        empty = np.zeros(0, dtype=np.int16)
+        base = (np.concatenate(lo) if lo else empty, np.concatenate(hi) if hi else empty)
+        return PeakPyramid(self.rate, self.frames, base, self.block_frames, self.factor)
+
+
+# ==========================================
+# 音声ファイルのピラミッド
+# ==========================================
+def sidecar_path(path):
+    return path + SIDECAR_EXT
+
+def save_peaks(path, pyramid):
+    """音声ファイルの隣にピラミッドを保存する。保存できなくても処理は続ける"""
+    try:
+        return pyramid.save(sidecar_path(path), source=path)
+    except OSError as e:
+        print(f"⚠️ 波形データを保存できません: {e}")
+        return None
+
+def load_peaks(path):
+    """
+    音声ファイルのピラミッドを返す。サイドカーが新しければそれを使い、なければ作って保存する
+    :param path: WAV・アーカイブ (.apcm)・スライスの参照 (.clip)
+    :return: PeakPyramid。読み込めなければ None
+    """
+    import audio_processor
+
+    peaks_path = sidecar_path(path)
+    if os.path.exists(peaks_path):
+        try:
+            pyramid = PeakPyramid.load(peaks_path, source=path)
+            if pyramid is not None:
+                return pyramid
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ 波形データを読み込めません。作り直します: {e}")
+    try:
+        pcm, rate, _ = audio_processor.read_pcm(path)
+    except Exception as e:
+        print(f"❌ 音声を読み込めません: {e}")
+        return None
+    pyramid = PeakPyramid.from_pcm(pcm, rate)
+    save_peaks(path, pyramid)
+    return pyramid